@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+""" connections to the apiserver with one shared connection pool and with separate pools for watches and
+    short requests, and the time until a watch on a stalled apiserver connection fails
+
+    python3 -m benchmark.apiserver_pools --watches 20 --duration 20
+
+    the watches end every --watch-seconds seconds like the apiserver ends them after timeoutSeconds,
+    every new tcp connection to a real apiserver is a tls handshake
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from kubernetes import client, watch  # noqa: E402
+from urllib3.exceptions import MaxRetryError, ProtocolError, ReadTimeoutError  # noqa: E402
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from benchmark.fake_apiserver import FakeApiServer  # noqa: E402
+from k8s_zabbix_base.apiserver_pool import RequestTimeouts, create_api_client, get_keepalive_socket_options, \
+    get_watch_retries  # noqa: E402
+
+
+class DiscardCounter(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.discarded = 0
+
+    def emit(self, record):
+        if 'Connection pool is full' in record.getMessage():
+            self.discarded += 1
+
+
+def run(args, apiserver, api_client, watch_api_client, timeouts=None):
+    api = client.CoreV1Api(api_client)
+    watch_api = client.CoreV1Api(watch_api_client)
+    stop = threading.Event()
+    requests = [0]
+    pod = apiserver.cluster.list_objects('pods')[0][0]['metadata']
+
+    def watcher():
+        while not stop.is_set():
+            kwargs = dict(timeout_seconds=args.watch_seconds)
+            if timeouts:
+                kwargs['_request_timeout'] = timeouts.get_watch_timeout(args.watch_seconds)
+            for event in watch.Watch().stream(watch_api.list_node, **kwargs):
+                pass
+
+    def requester():
+        while not stop.is_set():
+            kwargs = dict(_request_timeout=timeouts.get_request_timeout()) if timeouts else dict()
+            api.read_namespaced_pod(pod['name'], pod['namespace'], **kwargs)
+            requests[0] += 1
+            time.sleep(0.05)
+
+    connections = apiserver.get_stats()['connections']
+    threads = [threading.Thread(target=watcher) for _ in range(args.watches)]
+    threads += [threading.Thread(target=requester) for _ in range(args.requesters)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return apiserver.get_stats()['connections'] - connections, requests[0]
+
+
+def stalled_watch(timeouts, socket_options):
+    """ seconds until a watch fails on a server which accepts the request and never answers """
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(5)
+    accepted = []
+    thread = threading.Thread(target=lambda: accepted.append(server.accept()))
+    thread.daemon = True
+    thread.start()
+
+    configuration = client.Configuration()
+    configuration.host = 'http://127.0.0.1:%i' % server.getsockname()[1]
+    api = client.CoreV1Api(create_api_client(configuration, 1, socket_options, retries=get_watch_retries()))
+    started = time.monotonic()
+    try:
+        for event in watch.Watch().stream(api.list_node, timeout_seconds=1,
+                                          _request_timeout=timeouts.get_watch_timeout(1)):
+            pass
+    except (ReadTimeoutError, ProtocolError, MaxRetryError):
+        pass
+    server.close()
+    return time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the apiserver connection pools')
+    parser.add_argument('--duration', type=int, default=20)
+    parser.add_argument('--watches', type=int, default=20, help='concurrent watch threads')
+    parser.add_argument('--requesters', type=int, default=4, help='threads doing short requests')
+    parser.add_argument('--watch-seconds', type=int, default=2, help='timeoutSeconds of the watches')
+    parser.add_argument('--shared-pool-size', type=int, default=client.Configuration().connection_pool_maxsize,
+                        help='pool size of the shared pool, the kubernetes client default is 5 per cpu')
+    args = parser.parse_args()
+
+    discards = DiscardCounter()
+    logging.getLogger('urllib3.connectionpool').addHandler(discards)
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.WARNING)
+
+    cluster = FakeCluster(nodes=20, pods=100, deployments=10, secrets=0, services=0, namespaces=5, churn=0)
+    apiserver = FakeApiServer(cluster)
+    apiserver.start()
+    configuration = client.Configuration()
+    configuration.host = apiserver.url
+    socket_options = get_keepalive_socket_options()
+    timeouts = RequestTimeouts(connect=5, read=10, watch_grace=3)
+
+    print('%d watches (%is timeout), %d request threads, %is' % (
+        args.watches, args.watch_seconds, args.requesters, args.duration))
+    shared = create_api_client(configuration, args.shared_pool_size)
+    connections, requests = run(args, apiserver, shared, shared)
+    print('  one shared pool (size %2i):  %5i connections, %5i discarded, %6i short requests' % (
+        args.shared_pool_size, connections, discards.discarded, requests))
+    discards.discarded = 0
+    connections, requests = run(args, apiserver, create_api_client(configuration, 10, socket_options),
+                                create_api_client(configuration, 50, socket_options, retries=get_watch_retries()),
+                                timeouts)
+    print('  separate pools (10 + 50):    %5i connections, %5i discarded, %6i short requests' % (
+        connections, discards.discarded, requests))
+    apiserver.stop()
+
+    print('stalled apiserver, watch with timeoutSeconds=1 and %is grace: failed after %.1fs '
+          '(without a read timeout the watch hangs until the connection is closed)' % (
+              timeouts.watch_grace, stalled_watch(timeouts, socket_options)))
+
+
+if __name__ == '__main__':
+    main()
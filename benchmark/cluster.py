@@ -0,0 +1,292 @@
+""" generated kubernetes cluster with configurable size and churn, objects are plain json dicts (camelCase) """
+import time
+import base64
+import random
+import datetime
+import threading
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+RESOURCES = ['nodes', 'pods', 'deployments', 'daemonsets', 'statefulsets', 'services', 'secrets', 'ingresses',
+             'events']
+
+# share of the churn events per resource
+CHURN_WEIGHTS = dict(pods=60, deployments=20, nodes=5, services=10, secrets=5)
+
+NODE_CONDITIONS = ['MemoryPressure', 'DiskPressure', 'PIDPressure', 'Ready']
+
+# (type, reason) -> share of the kubernetes events, most events are normal
+EVENT_REASONS = {
+    ('Normal', 'Scheduled'): 15, ('Normal', 'Pulled'): 20, ('Normal', 'Created'): 15, ('Normal', 'Started'): 15,
+    ('Warning', 'BackOff'): 20, ('Warning', 'Unhealthy'): 6, ('Warning', 'FailedScheduling'): 4,
+    ('Warning', 'FailedMount'): 3, ('Warning', 'OOMKilling'): 2,
+}
+# share of the events of the few crashlooping pods
+HOT_POD_EVENTS = 0.3
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def timestamp():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def generate_tls_crt():
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'benchmark.example.com')])
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(datetime.datetime.utcnow() - datetime.timedelta(days=1)) \
+        .not_valid_after(datetime.datetime.utcnow() + datetime.timedelta(days=90)) \
+        .sign(key, hashes.SHA256(), default_backend())
+    return base64.b64encode(cert.public_bytes(serialization.Encoding.PEM)).decode('ascii')
+
+
+class FakeCluster:
+    """ cluster state and change feed for the fake apiserver
+
+        deployments carry the creation time of each change in ms as status.observedGeneration,
+        the fake zabbix trapper uses it to measure the latency from event to zabbix receipt
+    """
+
+    def __init__(self, nodes=10, pods=300, deployments=100, secrets=20, services=50,
+                 daemonsets=5, statefulsets=5, ingresses=10, namespaces=10, churn=50, seed=42, events=0,
+                 max_events=5000):
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.resource_version = 1000
+        self.churn = float(churn)
+        self.namespaces = ['namespace-%02i' % i for i in range(namespaces)]
+        self.objects = dict((resource, dict()) for resource in RESOURCES)
+        self.subscribers = dict((resource, []) for resource in RESOURCES)
+        self.events_generated = dict((resource, 0) for resource in RESOURCES)
+        self.tls_crt = generate_tls_crt()
+        self.pod_counter = 0
+        # kubernetes events per second, repeated events increase the count of the existing event
+        self.events = float(events)
+        self.max_events = max_events
+        self.event_counter = 0
+
+        for i in range(nodes):
+            self.add('nodes', self.make_node('node-%04i' % i))
+        for i in range(deployments):
+            self.add('deployments', self.make_deployment(self.namespaces[i % namespaces], 'deployment-%04i' % i))
+        for i in range(pods):
+            self.add('pods', self.make_pod(i))
+        for i in range(secrets):
+            self.add('secrets', self.make_secret(self.namespaces[i % namespaces], 'secret-%04i' % i))
+        for i in range(services):
+            self.add('services', self.make_service(self.namespaces[i % namespaces], 'service-%04i' % i))
+        for i in range(daemonsets):
+            self.add('daemonsets', self.make_workload(self.namespaces[i % namespaces], 'daemonset-%04i' % i))
+        for i in range(statefulsets):
+            self.add('statefulsets', self.make_workload(self.namespaces[i % namespaces], 'statefulset-%04i' % i,
+                                                        service_name='service-%04i' % i))
+        for i in range(ingresses):
+            self.add('ingresses', self.make_ingress(self.namespaces[i % namespaces], 'ingress-%04i' % i))
+
+    def next_resource_version(self):
+        self.resource_version += 1
+        return str(self.resource_version)
+
+    def metadata(self, name, name_space=None):
+        metadata = dict(name=name, uid='uid-%s-%s' % (name_space, name),
+                        resourceVersion=self.next_resource_version(),
+                        creationTimestamp=timestamp(), labels=dict(app=name))
+        if name_space:
+            metadata['namespace'] = name_space
+        return metadata
+
+    def make_node(self, name):
+        resources = dict(cpu='8', memory='32856024Ki', pods='110')
+        resources['ephemeral-storage'] = '101445540Ki'
+        return dict(kind='Node', apiVersion='v1', metadata=self.metadata(name),
+                    spec=dict(podCIDR='10.0.0.0/24'),
+                    status=dict(allocatable=dict(resources), capacity=dict(resources),
+                                conditions=[dict(type=c, status='True' if c == 'Ready' else 'False',
+                                                 lastHeartbeatTime=timestamp()) for c in NODE_CONDITIONS]))
+
+    @staticmethod
+    def pod_template(name):
+        return dict(metadata=dict(labels=dict(app=name)),
+                    spec=dict(containers=[dict(name=name, image='example/%s:1.0' % name)]))
+
+    def make_deployment(self, name_space, name):
+        return dict(kind='Deployment', apiVersion='apps/v1', metadata=self.metadata(name, name_space),
+                    spec=dict(replicas=3, selector=dict(matchLabels=dict(app=name)), template=self.pod_template(name)),
+                    status=dict(observedGeneration=now_ms(), replicas=3, updatedReplicas=3, readyReplicas=3,
+                                availableReplicas=3,
+                                conditions=[dict(type='Available', status='True', reason='MinimumReplicasAvailable'),
+                                            dict(type='Progressing', status='True', reason='NewReplicaSetAvailable')]))
+
+    def make_workload(self, name_space, name, service_name=None):
+        spec = dict(selector=dict(matchLabels=dict(app=name)), template=self.pod_template(name))
+        if service_name:
+            spec['serviceName'] = service_name
+        return dict(metadata=self.metadata(name, name_space), spec=spec, status=dict(
+            currentNumberScheduled=1, desiredNumberScheduled=1, numberMisscheduled=0, numberReady=1, replicas=1))
+
+    def make_pod(self, i):
+        self.pod_counter += 1
+        base_name = 'deployment-%04i' % (i % max(1, len(self.objects['deployments'])))
+        name_space = self.namespaces[i % len(self.namespaces)]
+        name = '%s-%08x' % (base_name, self.pod_counter)
+        return dict(kind='Pod', apiVersion='v1', metadata=self.metadata(name, name_space),
+                    spec=dict(containers=[dict(name=base_name, image='example/%s:1.0' % base_name,
+                                               resources=dict(requests=dict(cpu='250m', memory='256Mi'),
+                                                              limits=dict(cpu='1', memory='512Mi'))),
+                                          dict(name='sidecar', image='example/sidecar:1.0',
+                                               resources=dict(requests=dict(cpu='50m', memory='64Mi')))],
+                              nodeName='node-0000'),
+                    status=dict(phase='Running', containerStatuses=[
+                        self.container_status(base_name), self.container_status('sidecar')]))
+
+    @staticmethod
+    def container_status(name, restart_count=0, ready=True):
+        if ready:
+            state = dict(running=dict(startedAt=timestamp()))
+        else:
+            state = dict(waiting=dict(reason='CrashLoopBackOff'))
+        return dict(name=name, ready=ready, restartCount=restart_count, state=state,
+                    image='example/%s:1.0' % name, imageID='docker://sha256:%s' % ('0' * 64))
+
+    def make_secret(self, name_space, name):
+        return dict(kind='Secret', apiVersion='v1', metadata=self.metadata(name, name_space),
+                    type='kubernetes.io/tls', data={'tls.crt': self.tls_crt, 'tls.key': ''})
+
+    def make_service(self, name_space, name):
+        return dict(kind='Service', apiVersion='v1', metadata=self.metadata(name, name_space),
+                    spec=dict(type='ClusterIP', ports=[dict(port=80, protocol='TCP')]),
+                    status=dict(loadBalancer=dict()))
+
+    def make_ingress(self, name_space, name):
+        return dict(kind='Ingress', apiVersion='extensions/v1beta1', metadata=self.metadata(name, name_space),
+                    spec=dict(rules=[dict(host='%s.example.com' % name)]), status=dict(loadBalancer=dict()))
+
+    def add(self, resource, obj):
+        self.objects[resource][(obj['metadata'].get('namespace'), obj['metadata']['name'])] = obj
+
+    def subscribe(self, resource, subscriber):
+        """ returns a snapshot of the objects, all later changes are passed to subscriber.put() """
+        with self.lock:
+            self.subscribers[resource].append(subscriber)
+            return list(self.objects[resource].values())
+
+    def unsubscribe(self, resource, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers[resource]:
+                self.subscribers[resource].remove(subscriber)
+
+    def list_objects(self, resource):
+        with self.lock:
+            return list(self.objects[resource].values()), str(self.resource_version)
+
+    def publish(self, resource, event_type, obj):
+        self.events_generated[resource] += 1
+        for subscriber in self.subscribers[resource]:
+            subscriber.put((event_type, obj))
+
+    def churn_once(self):
+        resource = self.random.choices(list(CHURN_WEIGHTS), weights=list(CHURN_WEIGHTS.values()))[0]
+        with self.lock:
+            if not self.objects[resource]:
+                return
+            key = self.random.choice(list(self.objects[resource]))
+            old = self.objects[resource][key]
+
+            if resource == 'pods' and self.random.random() < 0.2:
+                # rescheduled pod: delete and create a new one
+                del self.objects[resource][key]
+                self.publish(resource, 'DELETED', old)
+                new = self.make_pod(self.pod_counter)
+                self.add(resource, new)
+                self.publish(resource, 'ADDED', new)
+                return
+
+            new = dict(old, metadata=dict(old['metadata'], resourceVersion=self.next_resource_version()))
+            if resource == 'pods':
+                restarts = old['status']['containerStatuses'][0]['restartCount'] + 1
+                ready = self.random.random() > 0.3
+                new['status'] = dict(old['status'], containerStatuses=[
+                    self.container_status(old['status']['containerStatuses'][0]['name'], restarts, ready),
+                    old['status']['containerStatuses'][1]])
+            elif resource == 'deployments':
+                ready = self.random.randint(1, 3)
+                new['status'] = dict(old['status'], observedGeneration=now_ms(), readyReplicas=ready,
+                                     availableReplicas=ready)
+            elif resource == 'nodes':
+                new['status'] = dict(old['status'], conditions=[
+                    dict(c, lastHeartbeatTime=timestamp()) for c in old['status']['conditions']])
+            else:
+                new['metadata']['annotations'] = dict(changed=timestamp())
+            self.objects[resource][key] = new
+            self.publish(resource, 'MODIFIED', new)
+
+    def make_event(self, event_type, reason, pod):
+        self.event_counter += 1
+        name_space = pod['metadata']['namespace']
+        return dict(kind='Event', apiVersion='v1',
+                    metadata=self.metadata('%s.%08x' % (pod['metadata']['name'], self.event_counter), name_space),
+                    type=event_type, reason=reason, message='%s of %s' % (reason, pod['metadata']['name']),
+                    count=1, firstTimestamp=timestamp(), lastTimestamp=timestamp(),
+                    involvedObject=dict(kind='Pod', namespace=name_space, name=pod['metadata']['name'],
+                                        uid=pod['metadata']['uid']),
+                    source=dict(component='kubelet', host=pod['spec']['nodeName']))
+
+    def event_once(self):
+        """ a new event or a repetition of a existing one, the oldest events expire like with the event ttl """
+        event_type, reason = self.random.choices(list(EVENT_REASONS), weights=list(EVENT_REASONS.values()))[0]
+        with self.lock:
+            pods = list(self.objects['pods'].values())
+            if not pods:
+                return
+            if self.random.random() < HOT_POD_EVENTS:
+                pod = pods[self.random.randrange(min(5, len(pods)))]
+            else:
+                pod = self.random.choice(pods)
+            key = (pod['metadata']['namespace'], '%s.%s' % (pod['metadata']['name'], reason))
+            old = self.objects['events'].get(key)
+            if old is None:
+                new = self.make_event(event_type, reason, pod)
+                self.objects['events'][key] = new
+                self.publish('events', 'ADDED', new)
+                if len(self.objects['events']) > self.max_events:
+                    expired_key = next(iter(self.objects['events']))
+                    self.publish('events', 'DELETED', self.objects['events'].pop(expired_key))
+            else:
+                new = dict(old, count=old['count'] + 1, lastTimestamp=timestamp(),
+                           metadata=dict(old['metadata'], resourceVersion=self.next_resource_version()))
+                self.objects['events'][key] = new
+                self.publish('events', 'MODIFIED', new)
+
+    def run_events(self, stop_event):
+        """ generates self.events kubernetes events per second until stop_event is set """
+        if self.events <= 0:
+            return
+        interval = 1.0 / self.events
+        next_event = time.monotonic()
+        while not stop_event.is_set():
+            self.event_once()
+            next_event += interval
+            delay = next_event - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+
+    def run_churn(self, stop_event):
+        """ generates self.churn events per second until stop_event is set """
+        if self.churn <= 0:
+            return
+        interval = 1.0 / self.churn
+        next_event = time.monotonic()
+        while not stop_event.is_set():
+            self.churn_once()
+            next_event += interval
+            delay = next_event - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
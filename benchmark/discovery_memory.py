@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" peak allocation and duration of the discovery serialization and size of the web api payloads,
+    the former list + json.dumps / form encoding against the streaming json writer
+
+    python3 -m benchmark.discovery_memory --pods 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from requests.models import RequestEncodingMixin  # noqa: E402
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from k8sobjects.k8sobject import K8sResourceManager  # noqa: E402
+from k8sobjects.json_stream import get_writer, encode_document  # noqa: E402
+
+
+def list_discovery(objects):
+    """ send_zabbix_discovery before the streaming writer """
+    data = list()
+    for obj in objects:
+        data += obj.get_zabbix_discovery_data()
+    return json.dumps({'data': data})
+
+
+def streaming_discovery(objects, unique=True):
+    return get_writer().write_discovery((row for obj in objects for row in obj.get_zabbix_discovery_data()),
+                                        unique=unique)[0]
+
+
+def streaming_discovery_all_rows(objects):
+    return streaming_discovery(objects, unique=False)
+
+
+def form_payload(obj):
+    """ the web api payload before, nested values as json strings in a form encoded body """
+    data = dict(obj.resource_data, cluster='benchmark')
+    for key in ['containers', 'container_status', 'pod_data']:
+        data[key] = json.dumps(data[key])
+    return RequestEncodingMixin._encode_params(data).encode('utf-8')
+
+
+def json_payload(obj):
+    return encode_document(dict(obj.resource_data, cluster='benchmark'))
+
+
+def measure(func, *args):
+    """ duration without and peak allocation with tracemalloc, it slows down the allocations """
+    started = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the discovery and web api serialization')
+    parser.add_argument('--pods', type=int, default=20000)
+    parser.add_argument('--deployments', type=int, default=500)
+    args = parser.parse_args()
+
+    cluster = FakeCluster(nodes=10, pods=args.pods, deployments=args.deployments, secrets=0, services=0,
+                          namespaces=20, churn=0)
+    manager = K8sResourceManager('pods', zabbix_host='benchmark')
+    for obj in cluster.objects['pods'].values():
+        manager.add_obj(obj)
+    objects = list(manager.objects.values())
+
+    print('%i pods' % len(objects))
+    for title, func in [('list + json.dumps', list_discovery),
+                        ('streaming, all rows', streaming_discovery_all_rows),
+                        ('streaming, unique rows', streaming_discovery)]:
+        document, seconds, peak = measure(func, objects)
+        rows = len(json.loads(document)['data'])
+        print('  discovery %-24s %8.1f ms  peak %8.1f KiB  %8i rows  %8.1f KiB' % (
+            title, seconds * 1000, peak / 1024.0, rows, len(document) / 1024.0))
+
+    for title, func in [('form encoded', form_payload), ('json', json_payload)]:
+        started = time.perf_counter()
+        size = sum(len(func(obj)) for obj in objects)
+        seconds = time.perf_counter() - started
+        print('  web api   %-24s %8.1f ms  %8.0f bytes/object' % (title, seconds * 1000, size / float(len(objects))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+""" detection and repair of drift between the watched objects and the apiserver, and the transferred bytes
+    of the reconciliation against listing the complete objects again
+
+    python3 -m benchmark.drift_reconcile --pods 5000 --drift 50
+
+    after the initial watch events the fake cluster creates, changes and deletes --drift pods each without
+    sending watch events (missed events), one reconciliation run has to find and fix exactly these
+"""
+import os
+import sys
+import time
+import types
+import logging
+import argparse
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from benchmark.fake_apiserver import FakeApiServer  # noqa: E402
+from benchmark.run_benchmark import build_config  # noqa: E402
+
+
+def inject_drift(cluster, count):
+    """ missing, stale and vanished pods which are not sent to the watches """
+    with cluster.lock:
+        keys = sorted(cluster.objects['pods'])
+        for key in keys[:count]:
+            del cluster.objects['pods'][key]
+        for key in keys[count:2 * count]:
+            old = cluster.objects['pods'][key]
+            cluster.objects['pods'][key] = dict(old, metadata=dict(old['metadata'],
+                                                                  resourceVersion=cluster.next_resource_version()),
+                                                status=dict(old['status'], phase='Failed'))
+        for i in range(count):
+            cluster.add('pods', cluster.make_pod(i))
+
+
+def get_differences(cluster, manager):
+    """ pods whose resource version differs between the fake cluster and the resource manager """
+    with cluster.lock:
+        expected = dict((key, obj['metadata']['resourceVersion']) for key, obj in cluster.objects['pods'].items())
+    return len(set(expected.items()) ^ set(manager.resource_versions.items()))
+
+
+def measure_bytes(apiserver, func):
+    before = apiserver.get_stats()['bytes_sent']
+    started = time.perf_counter()
+    func()
+    return apiserver.get_stats()['bytes_sent'] - before, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the drift reconciliation')
+    parser.add_argument('--pods', type=int, default=5000)
+    parser.add_argument('--drift', type=int, default=50, help='missing, stale and vanished pods each')
+    parser.add_argument('--set', action='append', metavar='KEY=JSON', help='override a config value')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    cluster = FakeCluster(nodes=10, pods=args.pods, deployments=100, secrets=0, services=0, namespaces=20, churn=0)
+    apiserver = FakeApiServer(cluster)
+    apiserver.start()
+    # the fake cluster does not change while reconciling, no watch events are in flight
+    config = build_config(types.SimpleNamespace(web_api=False, discovery_interval=3600, resend_interval=3600,
+                                                set=['zabbix_dry_run=true', 'reconcile_settle_seconds=0'] +
+                                                (args.set or [])),
+                          dict(apiserver=apiserver.url, zabbix_port=1, web_api='http://127.0.0.1:1'))
+
+    from k8s_zabbix_base.daemon_thread import CheckKubernetesDaemon
+    from k8s_zabbix_base.stats import STATS
+    daemon = CheckKubernetesDaemon(config, 'benchmark', ['pods'], [], [], [], 3600, 3600)
+    daemon.init_resource_manager('pods')
+    manager = daemon.data['pods']
+    # a single long watch, the world is not listed again by a new watch
+    thread = threading.Thread(target=daemon.watch_data, args=('pods', 3600))
+    thread.daemon = True
+    thread.start()
+    while manager.count_objects() < args.pods:
+        time.sleep(0.1)
+
+    inject_drift(cluster, args.drift)
+    before = get_differences(cluster, manager)
+    reconcile_bytes, reconcile_seconds = measure_bytes(apiserver, lambda: daemon.reconcile('pods'))
+    after = get_differences(cluster, manager)
+    relist_bytes, relist_seconds = measure_bytes(
+        apiserver, lambda: daemon.get_api_for_resource('pods').list_pod_for_all_namespaces(
+            _preload_content=False).data)
+
+    drift = dict((kind, STATS.get_counter('reconcile_drift_total', kind=kind))
+                 for kind in ['missing', 'stale', 'vanished'])
+    print('%i pods, %i missing, %i stale and %i vanished pods injected' % (
+        args.pods, args.drift, args.drift, args.drift))
+    print('drift found: %s, objects differing before %i, after %i' % (drift, before, after))
+    print('%-36s %10.2f MB %8.2fs' % ('reconciliation (metadata list)', reconcile_bytes / 1e6, reconcile_seconds))
+    print('%-36s %10.2f MB %8.2fs' % ('list of the complete objects', relist_bytes / 1e6, relist_seconds))
+    # the watcher thread of the daemon does not terminate
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
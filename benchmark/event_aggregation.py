@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+""" cpu, memory and accuracy of the kubernetes event aggregation against exact counting per object
+
+    python3 -m benchmark.event_aggregation --events 500000 --objects 50000
+
+    the events are generated with a simulated clock, repeated events of a object increase the count of
+    its event like the apiserver does, the involved objects follow a zipf distribution (few objects with
+    many events), the exact counting keeps a counter for every object and reason within the window
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from k8sobjects.events import EventAggregates  # noqa: E402
+
+REASONS = ['BackOff', 'Unhealthy', 'FailedScheduling', 'FailedMount', 'OOMKilling', 'FailedCreatePodSandBox']
+
+
+def generate(args):
+    """ (time, event type, event) """
+    rng = random.Random(42)
+    weights = [1.0 / (rank + 1) ** args.zipf for rank in range(args.objects)]
+    objects = rng.choices(range(args.objects), weights=weights, k=args.events)
+    counts = dict()
+    for idx, obj in enumerate(objects):
+        reason = REASONS[obj % len(REASONS)]
+        key = (obj, reason)
+        counts[key] = counts.get(key, 0) + 1
+        event = dict(
+            type='Warning', reason=reason, count=counts[key],
+            metadata=dict(uid='event-%i-%s' % key, namespace='namespace-%02i' % (obj % args.namespaces)),
+            involvedObject=dict(kind='Pod', namespace='namespace-%02i' % (obj % args.namespaces),
+                                name='pod-%06i' % obj))
+        yield idx * args.duration / float(args.events), 'ADDED' if counts[key] == 1 else 'MODIFIED', event
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_aggregates(args, events, clock):
+    aggregates = EventAggregates(windows=args.windows, bucket_seconds=args.bucket_seconds, max_keys=args.max_keys,
+                                 top_capacity=args.top_capacity, max_tracked=args.max_tracked, clock=clock)
+    for now, event_type, event in events:
+        clock.now = now
+        aggregates.handle(event_type, event)
+    return aggregates
+
+
+def run_exact(args, events):
+    """ every event of the longest window with a counter per object and reason """
+    window = deque()
+    counts = Counter()
+    for now, event_type, event in events:
+        key = (event['involvedObject']['namespace'], event['involvedObject']['kind'], event['involvedObject']['name'],
+               event['reason'])
+        window.append((now, key))
+        counts[key] += 1
+        while window[0][0] <= now - max(args.windows):
+            counts[window.popleft()[1]] -= 1
+    return counts
+
+
+def measure(func):
+    """ cpu seconds and peak memory, tracemalloc slows down the code and is only used for a second run """
+    started = time.process_time()
+    result = func()
+    seconds = time.process_time() - started
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the kubernetes event aggregation')
+    parser.add_argument('--events', type=int, default=500000)
+    parser.add_argument('--objects', type=int, default=50000, help='distinct involved objects')
+    parser.add_argument('--namespaces', type=int, default=40)
+    parser.add_argument('--zipf', type=float, default=1.1, help='skew of the events per object')
+    parser.add_argument('--duration', type=float, default=3600, help='simulated seconds')
+    parser.add_argument('--windows', type=int, nargs='+', default=[300, 3600])
+    parser.add_argument('--bucket-seconds', type=int, default=60)
+    parser.add_argument('--max-keys', type=int, default=50)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--top-capacity', type=int, default=100)
+    parser.add_argument('--max-tracked', type=int, default=20000)
+    args = parser.parse_args()
+
+    events = list(generate(args))
+    clock = Clock()
+    aggregates, seconds, peak = measure(lambda: run_aggregates(args, events, clock))
+    exact, exact_seconds, exact_peak = measure(lambda: run_exact(args, events))
+
+    window = max(args.windows)
+    top = aggregates.get_top(window, args.top)
+    exact_top = exact.most_common(args.top)
+    found = set((t['namespace'], t['kind'], t['name'], t['reason']) for t in top)
+    errors = [abs(dict(((t['namespace'], t['kind'], t['name'], t['reason']), t['count'])
+                       for t in top).get(key, 0) - count) / float(count) for key, count in exact_top]
+    totals = aggregates.get_totals()[window]
+    items = len(aggregates.windows) * (2 + sum(len(totals[dimension]) for dimension in ['reason', 'namespace', 'kind']))
+
+    print('%i events of %i objects, %i reasons, %i namespaces, %is simulated' % (
+        args.events, args.objects, len(REASONS), args.namespaces, args.duration))
+    print('%-28s %12s %12s' % ('', 'aggregates', 'exact'))
+    print('%-28s %12.2f %12.2f' % ('cpu us/event', seconds / args.events * 1e6, exact_seconds / args.events * 1e6))
+    print('%-28s %12.1f %12.1f' % ('peak memory MB', peak / 1024.0 / 1024.0, exact_peak / 1024.0 / 1024.0))
+    print('%-28s %12i %12i' % ('zabbix items per interval', items, len([c for c in exact.values() if c])))
+    print('top %i of the %is window: %i of %i found, max count error %.1f%%' % (
+        args.top, window, len(found & set(key for key, count in exact_top)), len(exact_top),
+        max(errors) * 100 if errors else 0.0))
+    print(json.dumps(top[:3]))
+
+
+if __name__ == '__main__':
+    main()
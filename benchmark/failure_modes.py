@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+""" behaviour of the daemon if zabbix, the web api or an ingestion worker fail, every scenario checks that no
+    data is lost or sent twice and that no thread dies, exits with 1 if a scenario failed
+
+    python3 -m benchmark.failure_modes
+"""
+import os
+import sys
+import json
+import types
+import signal
+import socket
+import logging
+import argparse
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from benchmark.fake_zabbix import FakeZabbixTrapper  # noqa: E402
+from benchmark.run_benchmark import build_config  # noqa: E402
+from k8s_zabbix_base.event_recorder import to_watch_event  # noqa: E402
+from k8s_zabbix_base.ingest_pool import IngestPool  # noqa: E402
+from k8s_zabbix_base.zabbix_pool import ZabbixEndpoint, ZabbixSenderPool, ZabbixSendError  # noqa: E402
+from k8sobjects.k8sobject import ZabbixValue, project_object  # noqa: E402
+
+
+def make_values(count):
+    return [ZabbixValue('benchmark', 'check_kubernetesd[get,pods,ns,pod-%i,ready]' % i, 1, None) for i in range(count)]
+
+
+def reject_request(number):
+    """ fake_response which rejects the nth request of a trapper like a zabbix server receiving invalid json """
+    requests = []
+
+    def fake_response(items):
+        requests.append(len(items))
+        if len(requests) == number:
+            return dict(response='failed', info='invalid JSON')
+        return None
+    return fake_response
+
+
+def zabbix_rejected_chunk_fails_over():
+    """ the second chunk is rejected by the first endpoint and accepted by the second one """
+    first, second = FakeZabbixTrapper(), FakeZabbixTrapper()
+    first.fake_response = reject_request(2)
+    for trapper in (first, second):
+        trapper.start()
+    endpoints = [ZabbixEndpoint('127.0.0.1', trapper.port) for trapper in (first, second)]
+    result = ZabbixSenderPool(endpoints, chunk_size=10).send(make_values(30))
+    assert result.processed == 30, 'processed %i of 30 items' % result.processed
+    assert endpoints[0].failures == 1, 'rejecting endpoint has %i failures' % endpoints[0].failures
+    # the rejected chunk is counted by the first trapper too, it did not accept it
+    assert first.items - 10 + second.items == 30, 'zabbix accepted %i items' % (first.items - 10 + second.items)
+
+
+def zabbix_rejected_chunk_is_undelivered():
+    """ all endpoints reject the second chunk, only the values from this chunk on are undelivered """
+    trapper = FakeZabbixTrapper()
+    trapper.fake_response = reject_request(2)
+    trapper.start()
+    values = make_values(30)
+    try:
+        ZabbixSenderPool([ZabbixEndpoint('127.0.0.1', trapper.port)], chunk_size=10).send(values)
+    except ZabbixSendError as e:
+        assert e.result.processed == 10, 'processed %i items before the rejected chunk' % e.result.processed
+        assert e.undelivered == values[10:], '%i undelivered items' % len(e.undelivered)
+    else:
+        raise AssertionError('the rejected chunk was not reported')
+
+
+def get_refused_port():
+    """ a local port nobody listens on """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def web_api_refused_keeps_objects_dirty():
+    """ the web api refuses connections, the sends fail without exceptions and the object stays dirty """
+    from kubernetes import client
+    from k8s_zabbix_base.daemon_thread import CheckKubernetesDaemon
+    from k8s_zabbix_base.stats import STATS
+
+    url = 'http://127.0.0.1:%i' % get_refused_port()
+    config = build_config(types.SimpleNamespace(web_api=True, discovery_interval=3600, resend_interval=3600,
+                                                set=['zabbix_dry_run=true', 'debounce_seconds=0']),
+                          dict(apiserver=url, zabbix_port=1, web_api=url + '/api/v1/k8s'))
+    daemon = CheckKubernetesDaemon(config, 'benchmark', ['pods'], [], [], [], 3600, 3600)
+    daemon.init_resource_manager('pods')
+    pod = FakeCluster(nodes=1, pods=1, deployments=1, secrets=0, services=0, namespaces=1, churn=0).make_pod(0)
+    event = to_watch_event(client.ApiClient(), dict(type='ADDED', object=pod, kind='V1Pod'))
+    with daemon.thread_lock:
+        # the notification is not delivered, the object is sent below
+        obj = daemon.data['pods'].add_obj(project_object(event['object'].to_dict()), notifications=[])
+
+    failed = STATS.get_counter('web_api_failed_total', resource='pods')
+    daemon.send_object_now('pods', obj, 'ADDED', send_zabbix_data=True, send_web=True)
+    assert not obj.is_dirty_zabbix, 'the zabbix metrics were not sent'
+    assert obj.is_dirty_web, 'the object is not dirty after the failed web api send'
+    daemon.resend_data('pods')
+    assert obj.is_dirty_web, 'the object is not dirty after the failed resend'
+    failed = STATS.get_counter('web_api_failed_total', resource='pods') - failed
+    assert failed == 2, '%i failed web api requests counted' % failed
+
+
+def ingest_worker_crash_resubmits():
+    """ the worker process is killed with events in flight, all events are applied once and in order """
+    cluster = FakeCluster(nodes=1, pods=200, deployments=1, secrets=0, services=0, namespaces=1, churn=0)
+    lines = [json.dumps(dict(type='ADDED', object=obj)) for obj in cluster.objects['pods'].values()]
+    applied = []
+    done = threading.Event()
+
+    def callback(resource, event_type, obj, checksum, metrics, error):
+        applied.append(obj['metadata']['name'] if obj else error)
+        if len(applied) >= len(lines):
+            done.set()
+
+    pool = IngestPool(1, 'benchmark', batch_size=20)
+    try:
+        pool.submit('pods', 'V1Pod', lines[0], callback)
+        while not applied:
+            done.wait(0.1)
+        for line in lines[1:]:
+            pool.submit('pods', 'V1Pod', line, callback)
+        for pid in list(pool.executors[0]._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert done.wait(60), 'applied %i of %i events' % (len(applied), len(lines))
+        expected = [json.loads(line)['object']['metadata']['name'] for line in lines]
+        assert applied == expected, 'events lost, duplicated or reordered'
+    finally:
+        pool.shutdown()
+
+
+SCENARIOS = [
+    zabbix_rejected_chunk_fails_over,
+    zabbix_rejected_chunk_is_undelivered,
+    web_api_refused_keeps_objects_dirty,
+    ingest_worker_crash_resubmits,
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Failure scenarios of the zabbix and web api senders')
+    parser.add_argument('scenarios', nargs='*', help='names of the scenarios to run, all by default')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    failed = 0
+    for scenario in SCENARIOS:
+        if args.scenarios and scenario.__name__ not in args.scenarios:
+            continue
+        try:
+            scenario()
+            print('%-50s ok' % scenario.__name__)
+        except Exception as e:
+            failed += 1
+            print('%-50s FAILED: %r' % (scenario.__name__, e))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+""" minimal kubernetes apiserver serving list/watch requests from a FakeCluster """
+import re
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmark.protobuf_encoder import RESOURCE_KINDS, encode_watch_frame
+
+logger = logging.getLogger(__name__)
+
+PATH_PATTERN = re.compile(r'^/(?:api/v1|apis/apps/v1|apis/extensions/v1beta1)'
+                          r'(?:/namespaces/(?P<namespace>[^/]+))?/(?P<plural>[a-z]+)(?:/(?P<name>[^/]+))?$')
+
+LIST_KINDS = dict(nodes='NodeList', pods='PodList', deployments='DeploymentList', daemonsets='DaemonSetList',
+                  statefulsets='StatefulSetList', services='ServiceList', secrets='SecretList',
+                  ingresses='IngressList', events='EventList')
+
+COMPONENT_STATUSES = dict(kind='ComponentStatusList', apiVersion='v1', metadata=dict(), items=[
+    dict(metadata=dict(name=name), conditions=[dict(type='Healthy', status='True', message='ok')])
+    for name in ['scheduler', 'controller-manager', 'etcd-0']])
+
+
+def field_selector_matches(obj, field_selector):
+    """ supports the selectors used by k8s-zabbix: metadata.namespace and type with = and != """
+    if not field_selector:
+        return True
+    for selector in field_selector.split(','):
+        match = re.match(r'^([\w.]+)(!=|==|=)(.*)$', selector)
+        if not match:
+            continue
+        field, operator, value = match.groups()
+        current = obj
+        for part in field.split('.'):
+            current = current.get(part) if isinstance(current, dict) else None
+        if (operator == '!=') == (current == value):
+            return False
+    return True
+
+
+def as_metadata(obj):
+    return dict(kind='PartialObjectMetadata', apiVersion='meta.k8s.io/v1', metadata=obj['metadata'])
+
+
+class FakeApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    cluster = None
+    stop_event = None
+    stats = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def setup(self):
+        # called once per tcp connection, a keep alive connection serves many requests
+        BaseHTTPRequestHandler.setup(self)
+        # headers and body are separate writes, with nagle every short response of a kept connection would
+        # wait for the delayed ack of the client (40ms)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.stats['lock']:
+            self.stats['connections'] += 1
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # counted before the client can read the response
+        self.count_bytes(len(body))
+        self.wfile.write(body)
+
+    def count_bytes(self, count):
+        with self.stats['lock']:
+            self.stats['bytes_sent'] += count
+
+    def write_chunk(self, data):
+        self.count_bytes(len(data))
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        if url.path == '/api/v1/componentstatuses':
+            return self.send_json(200, COMPONENT_STATUSES)
+
+        match = PATH_PATTERN.match(url.path)
+        if not match or match.group('plural') not in self.cluster.objects:
+            return self.send_json(404, dict(kind='Status', status='Failure', reason='NotFound', code=404))
+
+        resource = match.group('plural')
+        metadata_only = 'as=PartialObjectMetadata' in self.headers.get('Accept', '')
+        name_space = match.group('namespace')
+
+        def selected(obj):
+            if name_space and obj['metadata'].get('namespace') != name_space:
+                return False
+            return field_selector_matches(obj, query.get('fieldSelector'))
+
+        def transform(obj):
+            return as_metadata(obj) if metadata_only else obj
+
+        if match.group('name'):
+            with self.cluster.lock:
+                obj = self.cluster.objects[resource].get((name_space, match.group('name')))
+            if obj is not None and selected(obj):
+                return self.send_json(200, transform(obj))
+            return self.send_json(404, dict(kind='Status', status='Failure', reason='NotFound', code=404))
+
+        if query.get('watch', '').lower() not in ['true', '1']:
+            objects, resource_version = self.cluster.list_objects(resource)
+            objects = [obj for obj in objects if selected(obj)]
+            metadata = dict(resourceVersion=resource_version)
+            if query.get('limit'):
+                # the continue token is the offset of the next page
+                offset = int(query.get('continue', 0))
+                if offset + int(query['limit']) < len(objects):
+                    metadata['continue'] = str(offset + int(query['limit']))
+                objects = objects[offset:offset + int(query['limit'])]
+            return self.send_json(200, dict(kind=LIST_KINDS[resource], apiVersion='v1', metadata=metadata,
+                                            items=[transform(obj) for obj in objects]))
+
+        # like the apiserver, types without protobuf support are answered with json
+        protobuf = 'application/vnd.kubernetes.protobuf' in self.headers.get('Accept', '') and \
+            resource in RESOURCE_KINDS and not metadata_only
+
+        def encode(event_type, obj):
+            if protobuf:
+                return encode_watch_frame(event_type, obj, RESOURCE_KINDS[resource])
+            return json.dumps(dict(type=event_type, object=transform(obj))).encode('utf-8') + b'\n'
+
+        with self.stats['lock']:
+            self.stats['watches'] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.kubernetes.protobuf;stream=watch' if protobuf
+                         else 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        events = queue.Queue()
+        deadline = time.monotonic() + int(query.get('timeoutSeconds', 240))
+        # a watch from a resource version continues without listing the current objects
+        replay = query.get('resourceVersion', '0') == '0'
+        try:
+            for obj in self.cluster.subscribe(resource, events):
+                if replay and selected(obj):
+                    self.write_chunk(encode('ADDED', obj))
+            while not self.stop_event.is_set() and time.monotonic() < deadline:
+                try:
+                    event_type, obj = events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if selected(obj):
+                    self.write_chunk(encode(event_type, obj))
+            self.wfile.write(b'0\r\n\r\n')
+            # like the apiserver, the connection can be used for further requests after the watch ended
+            self.close_connection = self.stop_event.is_set()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.cluster.unsubscribe(resource, events)
+
+
+class FakeApiServer:
+    def __init__(self, cluster, address='127.0.0.1', port=0):
+        self.cluster = cluster
+        self.stop_event = threading.Event()
+        self.stats = dict(lock=threading.Lock(), bytes_sent=0, watches=0, connections=0)
+        handler = type('BoundFakeApiRequestHandler', (FakeApiRequestHandler,),
+                       dict(cluster=cluster, stop_event=self.stop_event, stats=self.stats))
+        self.server = ThreadingHTTPServer((address, port), handler)
+        self.server.daemon_threads = True
+        self.threads = []
+
+    @property
+    def url(self):
+        return 'http://%s:%i' % self.server.server_address[:2]
+
+    def start(self):
+        for target, args in ((self.server.serve_forever, ()), (self.cluster.run_churn, (self.stop_event,)),
+                             (self.cluster.run_events, (self.stop_event,))):
+            thread = threading.Thread(target=target, args=args)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        self.server.shutdown()
+
+    def get_stats(self):
+        with self.stats['lock']:
+            return dict(bytes_sent=self.stats['bytes_sent'], watches=self.stats['watches'],
+                        connections=self.stats['connections'],
+                        events_generated=dict(self.cluster.events_generated))
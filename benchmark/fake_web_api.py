@@ -0,0 +1,96 @@
+""" stub of the inventory web api, counts requests, bytes and invalid json bodies and keeps the documents,
+    merge patches and deletes of unknown objects are answered with 404
+"""
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from k8s_zabbix_base.merge_patch import apply_merge_patch
+
+logger = logging.getLogger(__name__)
+
+
+class FakeWebApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    web_api = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        valid = True
+        document = None
+        if body and self.headers.get('Content-Type') in ['application/json', 'application/merge-patch+json']:
+            try:
+                document = json.loads(body.decode('utf-8'))
+            except ValueError:
+                valid = False
+        self.web_api.record(self.command, len(body), valid)
+        status = self.web_api.store(self.command, self.path, document) if valid else 400
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+
+class FakeWebApi:
+    def __init__(self, address='127.0.0.1', port=0):
+        self.lock = threading.Lock()
+        self.requests = dict()
+        self.bytes_received = 0
+        self.invalid_json = 0
+        # (object type, cluster, namespace, name) -> document
+        self.documents = dict()
+        handler = type('BoundFakeWebApiRequestHandler', (FakeWebApiRequestHandler,), dict(web_api=self))
+        self.server = ThreadingHTTPServer((address, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return 'http://%s:%i/api/v1/k8s' % self.server.server_address[:2]
+
+    def record(self, method, size, valid=True):
+        with self.lock:
+            if not valid:
+                self.invalid_json += 1
+            self.requests[method] = self.requests.get(method, 0) + 1
+            self.bytes_received += size
+
+    def store(self, method, path, document):
+        """ returns the http status """
+        parts = [part for part in path.split('?')[0][len('/api/v1/k8s/'):].split('/') if part]
+        if method in ['POST', 'PUT']:
+            if not document:
+                return 400
+            key = (parts[0], document.get('cluster'), document.get('name_space') or None, document.get('name'))
+            with self.lock:
+                self.documents[key] = document
+            return 200
+        if method in ['PATCH', 'DELETE'] and len(parts) in [3, 4]:
+            key = (parts[0], parts[1], parts[2] if len(parts) == 4 else None, parts[-1])
+            with self.lock:
+                if key not in self.documents:
+                    return 404
+                if method == 'DELETE':
+                    del self.documents[key]
+                else:
+                    self.documents[key] = apply_merge_patch(self.documents[key], document)
+            return 200
+        return 200
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(requests=dict(self.requests), bytes_received=self.bytes_received,
+                        invalid_json=self.invalid_json, documents=len(self.documents))
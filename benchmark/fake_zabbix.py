@@ -0,0 +1,120 @@
+""" zabbix trapper speaking the ZBXD protocol, counts received items and measures event latency """
+import re
+import json
+import time
+import struct
+import logging
+import threading
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+ZBXD_HEADER = b'ZBXD\x01'
+LATENCY_KEY = re.compile(r'^check_kubernetesd\[get,deployments,[^,]+,[^,]+,observed_generation\]$')
+
+
+def receive(sock, count):
+    buf = b''
+    while len(buf) < count:
+        chunk = sock.recv(count - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def zbxd_packet(data):
+    body = json.dumps(data).encode('utf-8')
+    return ZBXD_HEADER + struct.pack('<Q', len(body)) + body
+
+
+class FakeZabbixRequestHandler(socketserver.BaseRequestHandler):
+    trapper = None
+
+    def handle(self):
+        # the connection may be reused for more than one request
+        while True:
+            header = receive(self.request, 13)
+            if len(header) != 13 or not header.startswith(ZBXD_HEADER):
+                return
+            body = receive(self.request, struct.unpack('<Q', header[5:])[0])
+            received = time.time()
+            try:
+                data = json.loads(body.decode('utf-8'))
+            except ValueError:
+                return
+            items = data.get('data', [])
+            self.trapper.record(items, received, len(header) + len(body))
+            if self.trapper.seconds_per_item:
+                # a busy zabbix server or proxy
+                time.sleep(len(items) * self.trapper.seconds_per_item)
+            response = self.trapper.fake_response(items) if self.trapper.fake_response else None
+            if response is None:
+                failed = self.trapper.failed_items(items)
+                response = dict(response='success', info='processed: %i; failed: %i; total: %i; seconds spent: 0.000100' % (
+                    len(items) - failed, failed, len(items)))
+            self.request.sendall(zbxd_packet(response))
+
+
+class FakeZabbixTrapper:
+    """ fake_failures can be set to a function(items) returning the number of failed items,
+        fake_response to a function(items) returning the complete response (None for the normal response),
+        seconds_per_item delays the responses
+    """
+
+    def __init__(self, address='127.0.0.1', port=0, seconds_per_item=0.0):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.items = 0
+        self.bytes_received = 0
+        self.keys = dict()
+        self.latencies = []
+        self.items_per_second = dict()
+        self.fake_failures = None
+        self.fake_response = None
+        self.seconds_per_item = seconds_per_item
+        handler = type('BoundFakeZabbixRequestHandler', (FakeZabbixRequestHandler,), dict(trapper=self))
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((address, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def failed_items(self, items):
+        if self.fake_failures:
+            return self.fake_failures(items)
+        return 0
+
+    def record(self, items, received, size):
+        with self.lock:
+            self.requests += 1
+            self.items += len(items)
+            self.bytes_received += size
+            second = int(received)
+            self.items_per_second[second] = self.items_per_second.get(second, 0) + len(items)
+            for item in items:
+                key = item.get('key', '')
+                self.keys[key] = self.keys.get(key, 0) + 1
+                if LATENCY_KEY.match(key):
+                    try:
+                        self.latencies.append(received - int(item['value']) / 1000.0)
+                    except (KeyError, ValueError):
+                        pass
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(requests=self.requests, items=self.items, bytes_received=self.bytes_received,
+                        distinct_keys=len(self.keys), latencies=list(self.latencies),
+                        items_per_second=[self.items_per_second.get(second, 0) for second in
+                                          range(min(self.items_per_second), max(self.items_per_second) + 1)]
+                        if self.items_per_second else [])
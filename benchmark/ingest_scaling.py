@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+""" throughput of the watch event ingestion in the daemon process and with 1..N ingestion worker processes
+
+    python3 -m benchmark.ingest_scaling --pods 5000 --workers 1,2,4,8
+
+    the raw watch lines are generated like the apiserver sends them, the applied results are only counted,
+    so the numbers show the decoding part which moves to the workers.
+    "daemon cpu" is the cpu time of the daemon process alone, with enough cores for the workers
+    it limits the throughput to "events / daemon cpu"
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from kubernetes import client  # noqa: E402
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from k8s_zabbix_base.event_recorder import to_watch_event  # noqa: E402
+from k8s_zabbix_base.ingest_pool import IngestPool  # noqa: E402
+from k8sobjects.k8sobject import K8sResourceManager, project_object  # noqa: E402
+
+
+def generate_lines(pods, rounds):
+    cluster = FakeCluster(nodes=10, pods=pods, deployments=max(1, pods // 20), secrets=0, services=0,
+                          namespaces=20, churn=0)
+    objects = list(cluster.objects['pods'].values())
+    lines = [json.dumps(dict(type='ADDED', object=obj)) for obj in objects]
+    for _ in range(rounds - 1):
+        lines += [json.dumps(dict(type='MODIFIED', object=obj)) for obj in objects]
+    return lines
+
+
+def run_in_process(lines):
+    """ what watch.Watch.stream and watch_event_handler do for every event """
+    api_client = client.ApiClient()
+    manager = K8sResourceManager('pods', zabbix_host='benchmark')
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for line in lines:
+        raw_event = json.loads(line)
+        event = to_watch_event(api_client, dict(type=raw_event['type'], object=raw_event['object'], kind='V1Pod'))
+        obj = project_object(event['object'].to_dict())
+        resourced_obj = manager.resource_class(obj, 'pods', manager=manager)
+        resourced_obj.get_zabbix_metrics()
+    return time.perf_counter() - started, time.process_time() - cpu_started
+
+
+def run_pool(lines, workers, batch_size):
+    done = threading.Event()
+    applied = dict(events=0)
+
+    def callback(resource, event_type, obj, checksum, metrics, error):
+        applied['events'] += 1
+        if applied['events'] == len(lines):
+            done.set()
+
+    pool = IngestPool(workers, 'benchmark', batch_size=batch_size, queue_size=len(lines) + 1)
+    # start the worker processes before measuring
+    warmup = threading.Event()
+    pool.submit('pods', 'V1Pod', lines[0], lambda *args: warmup.set())
+    warmup.wait()
+    for partition in range(1, workers):
+        pool.submit_batch(partition, []).result()
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for line in lines:
+        pool.submit('pods', 'V1Pod', line, callback)
+    done.wait()
+    seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+    pool.shutdown()
+    return seconds, cpu_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the ingestion worker processes')
+    parser.add_argument('--pods', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=2, help='events per pod (ADDED and MODIFIED events)')
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    lines = generate_lines(args.pods, args.rounds)
+    print('%i watch events, %i cpus' % (len(lines), os.cpu_count()))
+
+    def report(title, seconds, cpu_seconds):
+        print('  %-22s %8.2f s  %8.0f events/s  daemon cpu %6.1f us/event  (max %8.0f events/s)' % (
+            title, seconds, len(lines) / seconds, cpu_seconds / len(lines) * 1e6, len(lines) / cpu_seconds))
+
+    report('in process', *run_in_process(lines))
+    for workers in [int(x) for x in args.workers.split(',')]:
+        report('%i worker processes' % workers, *run_pool(lines, workers, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+""" bytes on the wire and decode cpu per watch event, json against protobuf
+
+    python3 -m benchmark.protobuf_decode --pods 2000
+
+    the json path is the one of kubernetes.watch.Watch: json.loads, deserialization to the models, to_dict()
+    and project_object(), the protobuf path is protobuf_watch.decode_watch_event(),
+    both have to result in the same zabbix metrics, discovery and web api data
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from kubernetes import client  # noqa: E402
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from benchmark.protobuf_encoder import RESOURCE_KINDS, encode_watch_frame  # noqa: E402
+from k8s_zabbix_base.event_recorder import to_watch_event  # noqa: E402
+from k8s_zabbix_base.protobuf_watch import RESOURCE_MESSAGES, decode_watch_event  # noqa: E402
+from k8sobjects.k8sobject import K8sResourceManager, project_object  # noqa: E402
+
+MODELS = dict(pods='V1Pod', nodes='V1Node')
+
+
+def decode_json(api_client, resource, lines):
+    for line in lines:
+        event = json.loads(line)
+        event = to_watch_event(api_client, dict(type=event['type'], object=event['object'], kind=MODELS[resource]))
+        yield project_object(event['object'].to_dict())
+
+
+def decode_protobuf(resource, frames):
+    message = RESOURCE_MESSAGES[resource]
+    for frame in frames:
+        # skip the length prefix, iter_watch_frames strips it from the stream
+        yield decode_watch_event(frame[4:], message)[1]
+
+
+def timed(func, rounds):
+    best = None
+    for i in range(rounds):
+        started = time.process_time()
+        result = list(func())
+        seconds = time.process_time() - started
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def get_outputs(resource, objs):
+    manager = K8sResourceManager(resource, zabbix_host='benchmark')
+    return [(sorted(repr(v) for v in o.get_zabbix_metrics()), o.get_zabbix_discovery_data(), o.resource_data)
+            for o in [manager.resource_class(obj, resource, manager=manager) for obj in objs]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the protobuf watch decoding')
+    parser.add_argument('--pods', type=int, default=2000)
+    parser.add_argument('--nodes', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    cluster = FakeCluster(nodes=args.nodes, pods=args.pods, deployments=max(1, args.pods // 10), secrets=0,
+                          services=0, namespaces=10, churn=0)
+    api_client = client.ApiClient()
+    print('%-6s %7s %12s %12s %14s %14s' % ('', 'events', 'json bytes', 'pb bytes', 'json us/event', 'pb us/event'))
+    for resource in ['pods', 'nodes']:
+        objs = list(cluster.objects[resource].values())
+        lines = [json.dumps(dict(type='MODIFIED', object=obj)).encode('utf-8') + b'\n' for obj in objs]
+        frames = [encode_watch_frame('MODIFIED', obj, RESOURCE_KINDS[resource]) for obj in objs]
+
+        json_seconds, json_objects = timed(lambda: decode_json(api_client, resource, lines), args.rounds)
+        protobuf_seconds, protobuf_objects = timed(lambda: decode_protobuf(resource, frames), args.rounds)
+        if get_outputs(resource, json_objects) != get_outputs(resource, protobuf_objects):
+            raise SystemExit('%s: the protobuf objects do not result in the same data as json' % resource)
+
+        print('%-6s %7i %12.0f %12.0f %14.1f %14.1f' % (
+            resource, len(objs), sum(map(len, lines)) / float(len(objs)), sum(map(len, frames)) / float(len(objs)),
+            json_seconds / len(objs) * 1e6, protobuf_seconds / len(objs) * 1e6))
+    print('(bytes and cpu per event, same zabbix metrics, discovery and web api data for both)')
+
+
+if __name__ == '__main__':
+    main()
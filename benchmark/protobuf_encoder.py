@@ -0,0 +1,96 @@
+""" protobuf encoding of the FakeCluster nodes and pods like the apiserver sends them,
+    covers all fields the fake cluster generates, not only the ones k8s-zabbix decodes
+"""
+import struct
+import calendar
+import datetime
+
+from k8s_zabbix_base.protobuf_watch import MAGIC
+
+STRING, BOOL, VARINT, MESSAGE, REPEATED_MESSAGE, MAP_STRING, MAP_QUANTITY, TIME = range(8)
+
+# json key -> (field number, kind, message), see k8s.io/api/core/v1/generated.proto
+OBJECT_META = dict(name=(1, STRING), namespace=(3, STRING), uid=(5, STRING), resourceVersion=(6, STRING),
+                   creationTimestamp=(8, TIME), labels=(11, MAP_STRING), annotations=(12, MAP_STRING))
+CONTAINER = dict(name=(1, STRING), image=(2, STRING),
+                 resources=(8, MESSAGE, dict(limits=(1, MAP_QUANTITY), requests=(2, MAP_QUANTITY))))
+CONTAINER_STATE = dict(waiting=(1, MESSAGE, dict(reason=(1, STRING), message=(2, STRING))),
+                       running=(2, MESSAGE, dict(startedAt=(1, TIME))),
+                       terminated=(3, MESSAGE, dict(exitCode=(1, VARINT), reason=(3, STRING))))
+CONTAINER_STATUS = dict(name=(1, STRING), state=(2, MESSAGE, CONTAINER_STATE), ready=(4, BOOL),
+                        restartCount=(5, VARINT), image=(6, STRING), imageID=(7, STRING))
+TYPES = dict(
+    Pod=dict(metadata=(1, MESSAGE, OBJECT_META),
+             spec=(2, MESSAGE, dict(containers=(2, REPEATED_MESSAGE, CONTAINER), nodeName=(10, STRING))),
+             status=(3, MESSAGE, dict(phase=(1, STRING), containerStatuses=(8, REPEATED_MESSAGE, CONTAINER_STATUS)))),
+    Node=dict(metadata=(1, MESSAGE, OBJECT_META),
+              spec=(2, MESSAGE, dict(podCIDR=(1, STRING))),
+              status=(3, MESSAGE, dict(capacity=(1, MAP_QUANTITY), allocatable=(2, MAP_QUANTITY),
+                                       conditions=(4, REPEATED_MESSAGE, dict(
+                                           type=(1, STRING), status=(2, STRING), lastHeartbeatTime=(3, TIME)))))),
+)
+RESOURCE_KINDS = dict(pods='Pod', nodes='Node')
+
+
+def encode_varint(value):
+    if value < 0:
+        value += 1 << 64
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+
+def encode_field(number, wire_type, payload):
+    if wire_type == 2:
+        return encode_varint(number << 3 | 2) + encode_varint(len(payload)) + payload
+    return encode_varint(number << 3) + encode_varint(payload)
+
+
+def encode_time(value):
+    seconds = calendar.timegm(datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').timetuple())
+    return encode_field(1, 0, seconds)
+
+
+def encode_message(obj, message):
+    result = b''
+    # the go encoder writes the fields ordered by number
+    for key, value in sorted(obj.items(), key=lambda item: message.get(item[0], (0,))[0]):
+        if key not in message or value is None:
+            continue
+        number, kind = message[key][:2]
+        if kind == STRING:
+            result += encode_field(number, 2, value.encode('utf-8'))
+        elif kind in [BOOL, VARINT]:
+            result += encode_field(number, 0, int(value))
+        elif kind == TIME:
+            result += encode_field(number, 2, encode_time(value))
+        elif kind == MESSAGE:
+            result += encode_field(number, 2, encode_message(value, message[key][2]))
+        elif kind == REPEATED_MESSAGE:
+            for item in value:
+                result += encode_field(number, 2, encode_message(item, message[key][2]))
+        else:
+            for map_key, map_value in sorted(value.items()):
+                if kind == MAP_QUANTITY:
+                    map_value = encode_field(1, 2, map_value.encode('utf-8'))
+                else:
+                    map_value = map_value.encode('utf-8')
+                result += encode_field(number, 2, encode_field(1, 2, map_key.encode('utf-8')) +
+                                       encode_field(2, 2, map_value))
+    return result
+
+
+def encode_object(obj, kind):
+    """ magic and runtime.Unknown(typeMeta=1, raw=2) """
+    type_meta = encode_field(1, 2, b'v1') + encode_field(2, 2, kind.encode('utf-8'))
+    return MAGIC + encode_field(1, 2, type_meta) + encode_field(2, 2, encode_message(obj, TYPES[kind]))
+
+
+def encode_watch_frame(event_type, obj, kind):
+    """ length prefixed metav1.WatchEvent(type=1, object=2 as runtime.RawExtension(raw=1)) """
+    event = encode_field(1, 2, event_type.encode('utf-8')) + \
+        encode_field(2, 2, encode_field(1, 2, encode_object(obj, kind)))
+    return struct.pack('>I', len(event)) + event
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" micro benchmark of the kubernetes quantity parsing against the former regex based transform_value
+
+    python3 -m benchmark.quantity_parser --nodes 500 --rounds 20
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmark.cluster import FakeCluster  # noqa: E402
+from k8sobjects.k8sobject import K8sResourceManager, transform_value  # noqa: E402
+from k8sobjects.node import Node  # noqa: E402
+
+
+def regex_transform_value(value):
+    """ transform_value before the quantity parser, only understands Ki """
+    if value is None:
+        return 0
+    m = re.match(r"^(\d+)Ki$", str(value))
+    if m:
+        return int(m.group(1)) * 1024
+    return value
+
+
+def measure(func, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the quantity parser')
+    parser.add_argument('--nodes', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    cluster = FakeCluster(nodes=args.nodes, pods=0, deployments=0, secrets=0, services=0, namespaces=1, churn=0)
+    manager = K8sResourceManager('nodes', zabbix_host='benchmark')
+    nodes = []
+    for idx, obj in enumerate(cluster.objects['nodes'].values()):
+        # a mix of node types and of the quantity formats reported by kubelets
+        if idx % 3 == 1:
+            obj['status']['allocatable'].update(cpu='7800m', memory='30Gi')
+        elif idx % 3 == 2:
+            obj['status']['allocatable'].update(cpu='15500m', memory='%iMi' % (62000 + idx % 8))
+        nodes.append(Node(obj, 'nodes', manager=manager))
+    raw_values = [value for node in nodes for value in node.get_raw_monitor_values()]
+
+    def regex_per_value():
+        return [regex_transform_value(value) for value in raw_values]
+
+    def parser_per_value():
+        return [transform_value(value) for value in raw_values]
+
+    def regex_per_node():
+        return [dict(zip(Node.MONITOR_VALUES, [regex_transform_value(value) for value in node.get_raw_monitor_values()]))
+                for node in nodes]
+
+    def parser_batched():
+        return Node.get_monitor_values(nodes)
+
+    not_converted = sum(1 for value in regex_per_value() if isinstance(value, str))
+    print('%i nodes, %i values, %i values left as string by the regex version' % (
+        len(nodes), len(raw_values), not_converted))
+    for title, func in [('regex transform_value', regex_per_value),
+                        ('transform_value (quantity parser)', parser_per_value),
+                        ('regex per node incl. lookup', regex_per_node),
+                        ('Node.get_monitor_values (batched)', parser_batched)]:
+        seconds = measure(func, args.rounds)
+        print('  %-36s %8.3f ms  %8.0f ns/value' % (title, seconds * 1000, seconds / len(raw_values) * 1e9))
+
+
+if __name__ == '__main__':
+    main()
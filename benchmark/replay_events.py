@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+""" replays recorded watch events (watch_record_file) into CheckKubernetesDaemon.watch_event_handler
+
+    python3 -m benchmark.replay_events events.ndjson.gz --speed 0 --metrics-output metrics.txt
+
+    speed: 1 = original timing, 10 = ten times faster, 0 = as fast as possible
+    the zabbix output is captured by a fake trapper and written to --metrics-output for diffing
+"""
+import os
+import sys
+import json
+import time
+import types
+import logging
+import threading
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmark.fake_zabbix import FakeZabbixTrapper  # noqa: E402
+from benchmark.run_benchmark import percentile  # noqa: E402
+
+
+class CapturingZabbixTrapper(FakeZabbixTrapper):
+    def __init__(self):
+        FakeZabbixTrapper.__init__(self)
+        self.received = []
+
+    def record(self, items, received, size):
+        FakeZabbixTrapper.record(self, items, received, size)
+        with self.lock:
+            self.received += [(item['key'], item['value']) for item in items]
+
+
+def build_config(trapper, args):
+    import config_default
+    config = types.SimpleNamespace(**dict((k, v) for k, v in vars(config_default).items() if not k.startswith('_')))
+    config.k8s_api_host = 'http://127.0.0.1:1'
+    config.zabbix_server = '127.0.0.1'
+    config.zabbix_port = trapper.port
+    config.zabbix_host = 'replay'
+    config.web_api_enable = False
+    for override in args.set or []:
+        key, value = override.split('=', 1)
+        setattr(config, key, json.loads(value))
+    return config
+
+
+def timing_report(title, timings):
+    lines = ['%s:' % title, '  %-40s %8s %10s %10s %10s %10s' % ('', 'events', 'total ms', 'avg ms', 'p95 ms', 'max ms')]
+    for key, values in sorted(timings.items()):
+        lines.append('  %-40s %8i %10.1f %10.3f %10.3f %10.3f' % (
+            key, len(values), sum(values) * 1000, sum(values) / len(values) * 1000,
+            percentile(values, 95) * 1000, max(values) * 1000))
+    return lines
+
+
+def replay(args):
+    from k8s_zabbix_base.daemon_thread import CheckKubernetesDaemon
+    from k8s_zabbix_base.event_recorder import read_events, to_watch_event
+    from k8s_zabbix_base.debounce import Debouncer
+    from k8sobjects.k8sobject import K8S_RESOURCES
+
+    trapper = CapturingZabbixTrapper()
+    trapper.start()
+    config = build_config(trapper, args)
+    resources = list(K8S_RESOURCES)
+    daemon = CheckKubernetesDaemon(config, 'replay', resources, [], resources, config.zabbix_resources_exclude, 3600, 3600)
+    for resource in resources:
+        daemon.init_resource_manager(resource)
+
+    # the debounce windows follow the recorded timestamps instead of the wall clock
+    replay_clock = dict(now=0.0)
+    if daemon.debounce_seconds > 0:
+        daemon.debouncer = Debouncer(daemon.debounce_seconds, threading.Event(), callback=daemon.send_debounced_object,
+                                     merge_func=daemon.merge_debounced_sends, clock=lambda: replay_clock['now'])
+
+    by_event_type = dict()
+    by_class = dict()
+    decode_times = []
+    first_recorded = None
+    started = time.time()
+    for recorded_event in read_events(args.events_file):
+        if args.speed > 0:
+            if first_recorded is None:
+                first_recorded = recorded_event['ts']
+            delay = (recorded_event['ts'] - first_recorded) / args.speed - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        replay_clock['now'] = recorded_event['ts']
+        if daemon.debouncer:
+            daemon.debouncer.run_expired()
+
+        resource = recorded_event['resource']
+        decode_started = time.perf_counter()
+        event = to_watch_event(daemon.api_client, recorded_event)
+        handler_started = time.perf_counter()
+        daemon.watch_event_handler(resource, event)
+        handler_finished = time.perf_counter()
+
+        decode_times.append(handler_started - decode_started)
+        by_event_type.setdefault('%s %s' % (resource, event['type']), []).append(handler_finished - handler_started)
+        resource_class = daemon.data[resource].resource_class
+        by_class.setdefault(resource_class.__name__ if resource_class else '<none>', []).append(
+            handler_finished - handler_started)
+    if daemon.debouncer:
+        daemon.debouncer.flush()
+    replay_duration = time.time() - started
+
+    if not args.no_flush:
+        # periodic tasks of the daemon, to include discovery and aggregated data in the output
+        for resource in resources:
+            daemon.send_zabbix_discovery(resource)
+        for resource in resources:
+            daemon.resend_data(resource)
+            daemon.report_global_data_zabbix(resource)
+
+    events = sum(len(x) for x in by_event_type.values())
+    report = ['replayed %i events from %s in %.1fs (%.1f events/s, decoding %.1f ms total)' % (
+        events, args.events_file, replay_duration, events / replay_duration if replay_duration else 0,
+        sum(decode_times) * 1000), '']
+    report += timing_report('watch_event_handler per resource and event type', by_event_type) + ['']
+    report += timing_report('watch_event_handler per k8sobjects class', by_class) + ['']
+    report.append('zabbix output: %i items in %i requests, %i distinct keys' % (
+        trapper.items, trapper.requests, len(trapper.keys)))
+    print('\n'.join(report))
+
+    if args.metrics_output:
+        with open(args.metrics_output, 'w') as fh:
+            for key, value in trapper.received:
+                if key == 'check_kubernetesd[discover,api]':
+                    continue
+                fh.write('%s\t%s\n' % (key, value))
+        print('zabbix metrics written to %s' % args.metrics_output)
+    trapper.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded watch events')
+    parser.add_argument('events_file')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='1 = original timing, >1 accelerated, 0 = as fast as possible (default)')
+    parser.add_argument('--metrics-output', help='write the zabbix metrics (key<TAB>value) to this file')
+    parser.add_argument('--no-flush', action='store_true', help='do not run discovery/resend after the replay')
+    parser.add_argument('--set', action='append', metavar='KEY=JSON', help='override a config value')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    replay(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+""" end to end benchmark of CheckKubernetesDaemon against a fake apiserver, zabbix trapper and web api
+
+    run:      python3 -m benchmark.run_benchmark run --pods 3000 --churn 200 --duration 120
+    compare:  python3 -m benchmark.run_benchmark compare [result files]
+"""
+import os
+import sys
+import json
+import time
+import types
+import logging
+import argparse
+import resource
+import subprocess
+import multiprocessing
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+BASE_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+sys.path.insert(0, BASE_DIR)
+
+# daemon layout of check_kubernetesd: resources, discovery interval, resend interval
+# the first daemon also watches the secrets of the tls check which are commented out in check_kubernetesd
+DAEMON_RESOURCES = [
+    (['nodes', 'secrets'], 'discovery_interval_slow', 'resend_data_interval_slow'),
+    (['components', 'services'], 'discovery_interval_slow', 'resend_data_interval_fast'),
+    (['deployments', 'statefulsets', 'daemonsets', 'pods', 'containers'], 'discovery_interval_slow', 'resend_data_interval_slow'),
+]
+
+COMPARE_COLUMNS = [
+    ('events/s', 'events_per_second', '%.1f'),
+    ('handler p95 ms', 'event_handler_p95_ms', '%.2f'),
+    ('e2e p50 ms', 'latency_p50_ms', '%.0f'),
+    ('e2e p95 ms', 'latency_p95_ms', '%.0f'),
+    ('cpu %', 'cpu_percent', '%.1f'),
+    ('rss MB', 'rss_mb', '%.1f'),
+    ('zbx req', 'zabbix_requests', '%i'),
+    ('zbx items', 'zabbix_items', '%i'),
+    ('zbx items/s max', 'zabbix_items_per_second_max', '%i'),
+    ('web req', 'web_api_requests', '%i'),
+    ('web MB/h', 'web_api_mb_per_hour', '%.1f'),
+    ('api MB', 'apiserver_mb', '%.1f'),
+]
+
+
+def get_subscriber_seconds(stats):
+    """ time spent in every subscriber of the resource managers """
+    with stats.lock:
+        names = set(dict(key).get('subscriber') for name, key in stats.histograms if name == 'subscriber_seconds')
+    return dict((name, stats.get_histogram('subscriber_seconds', subscriber=name).sum) for name in sorted(names))
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def get_rss_mb():
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def get_git_revision():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR).decode().strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], cwd=BASE_DIR) != 0
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_fakes(args, connection):
+    """ runs in a separate process, so the fakes do not distort the cpu measurement of the daemon """
+    from benchmark.cluster import FakeCluster
+    from benchmark.fake_apiserver import FakeApiServer
+    from benchmark.fake_zabbix import FakeZabbixTrapper
+    from benchmark.fake_web_api import FakeWebApi
+
+    cluster = FakeCluster(nodes=args.nodes, pods=args.pods, deployments=args.deployments, secrets=args.secrets,
+                          services=args.services, namespaces=args.namespaces, churn=args.churn, events=args.events)
+    apiserver = FakeApiServer(cluster)
+    trapper = FakeZabbixTrapper()
+    web_api = FakeWebApi()
+    for server in (apiserver, trapper, web_api):
+        server.start()
+    connection.send(dict(apiserver=apiserver.url, zabbix_port=trapper.port, web_api=web_api.url))
+
+    connection.recv()
+    connection.send(dict(apiserver=apiserver.get_stats(), zabbix=trapper.get_stats(), web_api=web_api.get_stats()))
+    for server in (apiserver, trapper, web_api):
+        server.stop()
+
+
+def build_config(args, endpoints):
+    import config_default
+    config = types.SimpleNamespace(**dict((k, v) for k, v in vars(config_default).items() if not k.startswith('_')))
+    config.k8s_api_host = endpoints['apiserver']
+    config.k8s_api_token = 'benchmark'
+    config.verify_ssl = False
+    config.zabbix_server = '127.0.0.1'
+    config.zabbix_port = endpoints['zabbix_port']
+    config.zabbix_host = 'benchmark'
+    config.web_api_enable = args.web_api
+    config.web_api_host = endpoints['web_api']
+    config.web_api_verify_ssl = False
+    config.discovery_interval_slow = args.discovery_interval
+    config.resend_data_interval_slow = args.resend_interval
+    config.resend_data_interval_fast = args.resend_interval
+    for override in args.set or []:
+        key, value = override.split('=', 1)
+        setattr(config, key, json.loads(value))
+    return config
+
+
+def run(args):
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(threadName)s : %(levelname)s : %(name)s - %(message)s')
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+    fakes = multiprocessing.Process(target=run_fakes, args=(args, child_connection), daemon=True)
+    fakes.start()
+    endpoints = parent_connection.recv()
+
+    from k8s_zabbix_base.daemon_thread import CheckKubernetesDaemon
+    from k8s_zabbix_base.stats import STATS
+
+    config = build_config(args, endpoints)
+    daemons = []
+    for resources, discovery_interval, resend_interval in DAEMON_RESOURCES:
+        daemons.append(CheckKubernetesDaemon(config, 'benchmark', resources,
+                                             [], config.web_api_resources_exclude, config.zabbix_resources_exclude,
+                                             getattr(config, discovery_interval), getattr(config, resend_interval)))
+
+    if config.watch_record_file:
+        from k8s_zabbix_base.event_recorder import EventRecorder
+        event_recorder = EventRecorder(config.watch_record_file)
+        for daemon in daemons:
+            daemon.event_recorder = event_recorder
+
+    started = time.time()
+    cpu_started = time.process_time()
+    for daemon in daemons:
+        daemon.run()
+
+    rss_samples = []
+    overload_levels = []
+    while time.time() - started < args.duration:
+        time.sleep(1)
+        rss_samples.append(get_rss_mb())
+        overload_levels.append(STATS.get_gauge('overload_level'))
+
+    duration = time.time() - started
+    cpu_seconds = time.process_time() - cpu_started
+    if config.watch_record_file:
+        event_recorder.close()
+    parent_connection.send('stop')
+    fake_stats = parent_connection.recv()
+
+    events_processed = STATS.get_counter('watch_events_total')
+    latencies = fake_stats['zabbix'].pop('latencies')
+    items_per_second = fake_stats['zabbix'].pop('items_per_second')
+    result = dict(
+        timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        git_revision=get_git_revision(),
+        label=args.label,
+        parameters=dict((k, v) for k, v in vars(args).items() if k not in ['func', 'verbose']),
+        results=dict(
+            duration=duration,
+            events_generated=sum(fake_stats['apiserver']['events_generated'].values()),
+            events_processed=events_processed,
+            events_per_second=events_processed / duration,
+            event_handler_p95_ms=STATS.get_histogram('watch_event_handler_seconds').percentile(95) * 1000,
+            lock_wait_p95_ms=STATS.get_histogram('lock_wait_seconds').percentile(95) * 1000,
+            latency_samples=len(latencies),
+            latency_p50_ms=percentile(latencies, 50) * 1000,
+            latency_p95_ms=percentile(latencies, 95) * 1000,
+            latency_p99_ms=percentile(latencies, 99) * 1000,
+            latency_max_ms=max(latencies) * 1000 if latencies else 0.0,
+            cpu_seconds=cpu_seconds,
+            cpu_percent=cpu_seconds / duration * 100,
+            rss_mb=rss_samples[-1] if rss_samples else get_rss_mb(),
+            max_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            zabbix_requests=fake_stats['zabbix']['requests'],
+            zabbix_items=fake_stats['zabbix']['items'],
+            zabbix_items_per_second_max=max(items_per_second) if items_per_second else 0,
+            zabbix_items_per_second_p95=percentile(items_per_second, 95),
+            zabbix_bytes=fake_stats['zabbix']['bytes_received'],
+            zabbix_distinct_keys=fake_stats['zabbix']['distinct_keys'],
+            web_api_requests=sum(fake_stats['web_api']['requests'].values()),
+            web_api_bytes=fake_stats['web_api']['bytes_received'],
+            web_api_mb_per_hour=fake_stats['web_api']['bytes_received'] / 1024.0 / 1024.0 * 3600 / duration,
+            web_api_methods=fake_stats['web_api']['requests'],
+            web_api_unchanged=STATS.get_counter('web_api_unchanged_total'),
+            web_api_invalid_json=fake_stats['web_api']['invalid_json'],
+            apiserver_mb=fake_stats['apiserver']['bytes_sent'] / 1024.0 / 1024.0,
+            apiserver_watches=fake_stats['apiserver']['watches'],
+            apiserver_connections=fake_stats['apiserver']['connections'],
+            overload_level_max=max(overload_levels) if overload_levels else 0,
+            overload_level_changes=STATS.get_counter('overload_level_changes_total'),
+            subscriber_seconds=get_subscriber_seconds(STATS),
+        ),
+        series=dict(zabbix_items_per_second=items_per_second, overload_level=overload_levels),
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    result_file = os.path.join(args.output_dir, '%s-%s%s.json' % (
+        time.strftime('%Y%m%d-%H%M%S'), result['git_revision'], '-' + args.label if args.label else ''))
+    with open(result_file, 'w') as fh:
+        json.dump(result, fh, indent=2, sort_keys=True)
+
+    print(json.dumps(result['results'], indent=2, sort_keys=True))
+    print('result written to %s' % result_file)
+    sys.stdout.flush()
+    # the watcher threads of the daemon do not terminate
+    os._exit(0)
+
+
+def compare(args):
+    files = args.files
+    if not files:
+        if not os.path.isdir(args.output_dir):
+            print('no results in %s' % args.output_dir)
+            return
+        files = sorted(os.path.join(args.output_dir, x) for x in os.listdir(args.output_dir) if x.endswith('.json'))
+        files = files[-args.last:]
+
+    rows = [['revision', 'label'] + [title for title, _, _ in COMPARE_COLUMNS]]
+    for result_file in files:
+        with open(result_file) as fh:
+            result = json.load(fh)
+        rows.append([result['git_revision'], result.get('label') or ''] +
+                     [fmt % result['results'].get(key, 0) for _, key, fmt in COMPARE_COLUMNS])
+
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(value.rjust(width) for value, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for k8s-zabbix')
+    parser.add_argument('--output-dir', default=RESULTS_DIR, help='directory for the result files')
+    subparsers = parser.add_subparsers()
+
+    run_parser = subparsers.add_parser('run', help='run the benchmark')
+    run_parser.set_defaults(func=run)
+    run_parser.add_argument('--nodes', type=int, default=20)
+    run_parser.add_argument('--pods', type=int, default=1000)
+    run_parser.add_argument('--deployments', type=int, default=300)
+    run_parser.add_argument('--secrets', type=int, default=50)
+    run_parser.add_argument('--services', type=int, default=300)
+    run_parser.add_argument('--namespaces', type=int, default=20)
+    run_parser.add_argument('--churn', type=float, default=100, help='change events per second')
+    run_parser.add_argument('--events', type=float, default=0, help='kubernetes events per second')
+    run_parser.add_argument('--duration', type=int, default=120, help='seconds')
+    run_parser.add_argument('--discovery-interval', type=int, default=60)
+    run_parser.add_argument('--resend-interval', type=int, default=60)
+    run_parser.add_argument('--web-api', action='store_true', help='enable the web api')
+    run_parser.add_argument('--set', action='append', metavar='KEY=JSON',
+                            help='override a config value, i.e. --set \'watch_metadata_only=["services"]\'')
+    run_parser.add_argument('--label', default='', help='label stored with the result')
+    run_parser.add_argument('--verbose', action='store_true')
+
+    compare_parser = subparsers.add_parser('compare', help='compare stored results')
+    compare_parser.set_defaults(func=compare)
+    compare_parser.add_argument('--last', type=int, default=10, help='number of latest results to compare')
+    compare_parser.add_argument('files', nargs='*')
+
+    args = parser.parse_args()
+    if not hasattr(args, 'func'):
+        parser.error('choose "run" or "compare"')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
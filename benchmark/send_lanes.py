@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" latency of heartbeat, object changes and bulk resends against a slow zabbix trapper,
+    with the priority lanes and with all sends in one lane
+
+    python3 -m benchmark.send_lanes --duration 20 --bulk-threads 6
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmark.fake_zabbix import FakeZabbixTrapper  # noqa: E402
+from k8s_zabbix_base.stats import Histogram  # noqa: E402
+from k8s_zabbix_base.zabbix_pool import ZabbixEndpoint, ZabbixSenderPool, LANES  # noqa: E402
+from k8sobjects.k8sobject import ZabbixValue, get_item_key  # noqa: E402
+
+
+def run(args, trapper, use_lanes):
+    pool = ZabbixSenderPool([ZabbixEndpoint('127.0.0.1', trapper.port, concurrency=args.concurrency)])
+    histograms = dict((lane, Histogram()) for lane in LANES)
+    stop = threading.Event()
+
+    def sender(lane, values, pause):
+        while not stop.is_set():
+            started = time.perf_counter()
+            pool.send(values, lane=lane if use_lanes else 'normal')
+            histograms[lane].observe(time.perf_counter() - started)
+            if pause:
+                time.sleep(pause)
+
+    bulk = [ZabbixValue('benchmark', get_item_key('get', 'pods', 'ns', 'pod-%i' % i, 'ready'), 1) for i in range(2500)]
+    change = [ZabbixValue('benchmark', get_item_key('get', 'deployments', 'ns', 'd', k), 1) for k in ['a', 'b', 'c']]
+    heartbeat = [ZabbixValue('benchmark', 'check_kubernetesd[discover,api]', 1)]
+
+    threads = [threading.Thread(target=sender, args=('bulk', bulk, 0)) for _ in range(args.bulk_threads)]
+    threads.append(threading.Thread(target=sender, args=('normal', change, 0.05)))
+    threads.append(threading.Thread(target=sender, args=('critical', heartbeat, 0.2)))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return histograms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the zabbix send lanes')
+    parser.add_argument('--duration', type=int, default=20)
+    parser.add_argument('--bulk-threads', type=int, default=6)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seconds-per-item', type=float, default=0.0002, help='response delay of the trapper')
+    args = parser.parse_args()
+
+    trapper = FakeZabbixTrapper(seconds_per_item=args.seconds_per_item)
+    trapper.start()
+    for title, use_lanes in [('one lane', False), ('priority lanes', True)]:
+        histograms = run(args, trapper, use_lanes)
+        print(title)
+        for lane in LANES:
+            histogram = histograms[lane]
+            print('  %-8s %6i sends  p50 %8.1f ms  p95 %8.1f ms  p99 %8.1f ms' % (
+                lane, histogram.count, histogram.percentile(50) * 1000, histogram.percentile(95) * 1000,
+                histogram.percentile(99) * 1000))
+    trapper.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+""" cold start of the daemon: time from starting the interpreter until the first watch event is handled,
+    against a local fake apiserver and zabbix trapper
+
+    python3 -m benchmark.startup --runs 10
+
+    every run starts a new interpreter with the daemon layout of check_kubernetesd, the phases are
+    "imports" (interpreter start and imports), "init" (construction of the daemons) and "first event"
+"""
+import time
+
+STARTED = time.time()
+
+import os  # noqa: E402
+import sys  # noqa: E402
+import json  # noqa: E402
+import argparse  # noqa: E402
+import subprocess  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def run_child(args):
+    """ runs in the started interpreter, prints the timestamps of the phases as json """
+    from k8s_zabbix_base.daemon_thread import CheckKubernetesDaemon
+    from k8s_zabbix_base.stats import STATS
+    from benchmark.run_benchmark import DAEMON_RESOURCES, build_config
+    imported = time.time()
+
+    config_args = argparse.Namespace(web_api=False, discovery_interval=3600, resend_interval=3600, set=args.set)
+    config = build_config(config_args, dict(apiserver=args.apiserver, zabbix_port=args.zabbix_port,
+                                            web_api='http://127.0.0.1:1'))
+    daemons = [CheckKubernetesDaemon(config, 'benchmark', resources,
+                                     [], config.web_api_resources_exclude, config.zabbix_resources_exclude,
+                                     getattr(config, discovery_interval), getattr(config, resend_interval))
+               for resources, discovery_interval, resend_interval in DAEMON_RESOURCES]
+    constructed = time.time()
+    for daemon in daemons:
+        daemon.run()
+    while STATS.get_counter('watch_events_total') == 0 and time.time() - STARTED < 60:
+        time.sleep(0.005)
+    first_event = time.time()
+    print(json.dumps(dict(started=STARTED, imported=imported, constructed=constructed, first_event=first_event,
+                          modules=len(sys.modules))))
+    sys.stdout.flush()
+    # the watcher threads of the daemon do not terminate
+    os._exit(0)
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the daemon startup')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--pods', type=int, default=100)
+    parser.add_argument('--set', action='append', metavar='KEY=JSON', help='override a config value')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--apiserver', help=argparse.SUPPRESS)
+    parser.add_argument('--zabbix-port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    from benchmark.cluster import FakeCluster
+    from benchmark.fake_apiserver import FakeApiServer
+    from benchmark.fake_zabbix import FakeZabbixTrapper
+
+    cluster = FakeCluster(nodes=5, pods=args.pods, deployments=max(1, args.pods // 10), secrets=5, services=10,
+                          namespaces=5, churn=0)
+    apiserver = FakeApiServer(cluster)
+    trapper = FakeZabbixTrapper()
+    apiserver.start()
+    trapper.start()
+
+    phases = dict(imports=[], init=[], first_event=[], total=[])
+    for run in range(args.runs):
+        command = [sys.executable, '-m', 'benchmark.startup', '--child', '--apiserver', apiserver.url,
+                   '--zabbix-port', str(trapper.port)]
+        for override in args.set or []:
+            command += ['--set', override]
+        started = time.time()
+        output = subprocess.check_output(command, cwd=BASE_DIR, stderr=subprocess.DEVNULL)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        phases['imports'].append(result['imported'] - started)
+        phases['init'].append(result['constructed'] - result['imported'])
+        phases['first_event'].append(result['first_event'] - result['constructed'])
+        phases['total'].append(result['first_event'] - started)
+        print('  run %2i: %7.1f ms to the first watch event, %i modules' % (
+            run + 1, phases['total'][-1] * 1000, result['modules']))
+
+    print('median of %i runs:' % args.runs)
+    for phase in ['imports', 'init', 'first_event', 'total']:
+        print('  %-12s %7.1f ms' % (phase, median(phases[phase]) * 1000))
+    apiserver.stop()
+    trapper.stop()
+
+
+if __name__ == '__main__':
+    main()
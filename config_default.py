@@ -1,20 +1,90 @@
 k8s_api_host = 'https://example.kube-apiserver.com'
 k8s_api_token = ''
 verify_ssl = True
+k8s_api_pool_size = 10
+k8s_watch_pool_size = 50
+k8s_api_connect_timeout = 10
+k8s_api_read_timeout = 60
+k8s_watch_timeout_grace = 30
+k8s_tcp_keepalive_idle = 30
+k8s_tcp_keepalive_interval = 10
+k8s_tcp_keepalive_count = 3
 debug = False
 debug_k8s_events = False
 resources_exclude = []
+watch_namespaces_include = {}
+watch_namespaces_exclude = {}
+watch_label_selectors = {}
+watch_field_selectors = {"secrets": "type=kubernetes.io/tls"}
+watch_per_namespace_max = 5
+watch_metadata_only = []
+watch_protobuf_resources = []
+watch_record_file = ''
+ingest_workers = 0
+ingest_batch_size = 100
 
 zabbix_server = 'example.zabbix-server.com'
+zabbix_port = 10051
+zabbix_send_mode = 'failover'
+zabbix_endpoint_concurrency = 4
+zabbix_endpoint_retry_seconds = 30
+zabbix_timeout = 10
 zabbix_resources_exclude = ["statefulsets", "daemonsets"]
 zabbix_host = 'k8s-example-host'
 zabbix_debug = False
 zabbix_single_debug = False
 zabbix_dry_run = False
 
+stats_http_enable = False
+stats_http_address = '127.0.0.1'
+stats_http_port = 9098
+stats_zabbix_enable = False
+
+profiling_output_dir = '/tmp'
+profiling_seconds = 30
+profiling_max_seconds = 300
+profiling_http_enable = False
+
+debounce_seconds = 10
+rollups_enable = True
+resend_slice_seconds = 5
+resend_max_metrics_per_second = 1000
+
+events_enable = False
+events_types = ["Warning"]
+events_windows = [300, 3600]
+events_bucket_seconds = 60
+events_max_keys = 50
+events_top = 10
+events_top_capacity = 100
+events_max_tracked = 20000
+
+reconcile_interval = 60 * 30
+reconcile_page_size = 500
+reconcile_max_fetches = 1000
+reconcile_settle_seconds = 5
+
+overload_control = True
+overload_check_seconds = 5
+overload_max_backlog = 5000
+overload_max_lag_seconds = 30
+overload_max_busy_ratio = 0.9
+overload_max_memory_mb = 0
+overload_debounce_factor = 6
+overload_max_deferred_discoveries = 3
+
+retry_buffer_max_items = 100000
+retry_buffer_spill_dir = ''
+retry_buffer_max_spill_mb = 100
+retry_replay_max_metrics_per_second = 500
+retry_replay_check_seconds = 10
+
 web_api_enable = False
 web_api_resources_exclude = ["daemonsets", "components", "services", "statefulsets"]
 web_api_verify_ssl = True
+web_api_delta_updates = True
+web_api_connect_timeout = 10
+web_api_read_timeout = 30
 web_api_host = "https://example.api.com/api/v1/k8s"
 web_api_token = ""
 web_api_cluster = 'k8s-test-cluster'
@@ -25,4 +95,11 @@ resend_data_interval_fast = 60 * 2
 discovery_interval_slow = 60 * 60 * 2
 resend_data_interval_slow = 60 * 30
 
+adaptive_intervals = False
+adaptive_intervals_check_seconds = 60
+resend_data_interval_min = 60
+resend_data_interval_max = 60 * 60
+discovery_interval_min = 60 * 5
+discovery_interval_max = 60 * 60 * 4
+
 
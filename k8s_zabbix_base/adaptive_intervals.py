@@ -0,0 +1,96 @@
+import time
+import logging
+
+from k8s_zabbix_base.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+
+def clamp(value, bounds):
+    return min(max(value, bounds[0]), bounds[1])
+
+
+class IntervalController:
+    """ adjusts the resend and discovery interval of a daemon within the configured bounds
+
+        every update compares the stats of the daemon since the last update and derives a pressure >= 1,
+        the intervals are the lower bound multiplied by the pressure:
+
+        * latency: average zabbix send time relative to target_send_seconds
+        * failures: failed or erroneous sends back off by factor 4
+        * budget: items/s relative to half of resend_max_metrics_per_second
+        * size: number of objects relative to objects_per_min_interval
+        * churn (resend only): objects which change within the minimal interval are sent anyway
+
+        backing off happens fast (doubling per update), tightening slowly (20% per update)
+    """
+
+    def __init__(self, resources, resend_interval, discovery_interval, resend_bounds, discovery_bounds,
+                 max_metrics_per_second=0, target_send_seconds=0.5, max_failed_ratio=0.05,
+                 objects_per_min_interval=1000):
+        self.resources = resources
+        self.resend_bounds = resend_bounds
+        self.discovery_bounds = discovery_bounds
+        self.resend_interval = clamp(resend_interval, resend_bounds)
+        self.discovery_interval = clamp(discovery_interval, discovery_bounds)
+        self.max_metrics_per_second = float(max_metrics_per_second)
+        self.target_send_seconds = target_send_seconds
+        self.max_failed_ratio = max_failed_ratio
+        self.objects_per_min_interval = objects_per_min_interval
+        self.pressure = 1.0
+        self.last_sample = None
+
+    def sample(self):
+        histogram = STATS.get_histogram('zabbix_send_seconds')
+        return dict(
+            time=time.monotonic(),
+            objects=sum(STATS.get_gauge('objects', resource=resource) for resource in self.resources),
+            events=sum(STATS.get_counter('watch_events_total', resource=resource) for resource in self.resources),
+            sends=histogram.count,
+            send_seconds=histogram.sum,
+            processed=STATS.get_counter('zabbix_send_processed_total'),
+            failed=STATS.get_counter('zabbix_send_failed_total'),
+            errors=STATS.get_counter('zabbix_send_errors_total'),
+            items=STATS.get_counter('zabbix_send_items_total'),
+        )
+
+    def get_pressures(self, current, last):
+        """ returns the pressure of resend and discovery """
+        delta = dict((k, current[k] - last[k]) for k in current if k != 'objects')
+        seconds = max(delta['time'], 1e-3)
+        objects = current['objects']
+
+        latency = delta['send_seconds'] / delta['sends'] / self.target_send_seconds if delta['sends'] else 0.0
+        sent = delta['processed'] + delta['failed']
+        failing = delta['errors'] > 0 or (sent and delta['failed'] / float(sent) > self.max_failed_ratio)
+        budget = 0.0
+        if self.max_metrics_per_second > 0:
+            budget = delta['items'] / seconds / (self.max_metrics_per_second / 2.0)
+        size = objects / float(self.objects_per_min_interval)
+        churn = 1.0 + (delta['events'] / float(objects) / seconds * self.resend_bounds[0] if objects else 0.0)
+
+        pressure = max(1.0, latency, 4.0 if failing else 1.0, budget, size)
+        return max(pressure, churn), pressure
+
+    @staticmethod
+    def approach(interval, target, bounds):
+        if target > interval:
+            interval = min(target, interval * 2)
+        else:
+            interval = max(target, interval * 0.8)
+        return int(clamp(interval, bounds))
+
+    def update(self):
+        """ returns the new (resend_interval, discovery_interval) """
+        current = self.sample()
+        if self.last_sample is not None:
+            resend_pressure, self.pressure = self.get_pressures(current, self.last_sample)
+            self.resend_interval = self.approach(self.resend_interval, self.resend_bounds[0] * resend_pressure,
+                                                 self.resend_bounds)
+            self.discovery_interval = self.approach(self.discovery_interval, self.discovery_bounds[0] * self.pressure,
+                                                    self.discovery_bounds)
+            logger.debug('%s: pressure %.2f (resend %.2f), resend interval %is, discovery interval %is' % (
+                ','.join(self.resources), self.pressure, resend_pressure, self.resend_interval,
+                self.discovery_interval))
+        self.last_sample = current
+        return self.resend_interval, self.discovery_interval
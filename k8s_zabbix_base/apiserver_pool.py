@@ -0,0 +1,75 @@
+import copy
+import socket
+import logging
+
+from kubernetes import client
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+def get_keepalive_socket_options(idle=30, interval=10, count=3):
+    """ tcp keepalive, a connection to a unreachable apiserver fails after idle + interval * count seconds
+
+        the per probe settings are only available on some platforms (i.e. linux), elsewhere the
+        keepalive timing of the operating system is used
+    """
+    options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in [('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)]:
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), int(value)))
+    return options
+
+
+def create_api_client(configuration, pool_size, socket_options=None, retries=None):
+    """ ApiClient with its own connection pool
+
+        pool_size is the number of connections kept for reuse, more connections are opened if needed
+        but closed after the request ("connection pool is full, discarding connection"),
+        retries is the urllib3 retry configuration of the requests (default 3 retries)
+    """
+    configuration = copy.copy(configuration)
+    configuration.connection_pool_maxsize = int(pool_size)
+    api_client = client.ApiClient(configuration)
+    if socket_options is not None:
+        # passed to every connection of the pools created by the pool manager
+        api_client.rest_client.pool_manager.connection_pool_kw['socket_options'] = socket_options
+    if retries is not None:
+        api_client.rest_client.pool_manager.connection_pool_kw['retries'] = retries
+    return api_client
+
+
+def get_watch_retries():
+    """ urllib3 repeats a request after a read error three times by default, for a stalled apiserver
+        that is four read timeouts, watches retry once (i.e. a kept connection closed by the apiserver),
+        afterwards the watch is restarted by the daemon
+    """
+    return Retry(total=3, read=1)
+
+
+class RequestTimeouts:
+    """ (connect, read) timeouts passed as _request_timeout to the kubernetes client
+
+        the apiserver closes a watch after timeout_seconds, a watch which did not end
+        watch_grace seconds later is dead
+    """
+
+    def __init__(self, connect=10, read=60, watch_grace=30):
+        self.connect = float(connect)
+        self.read = float(read)
+        self.watch_grace = float(watch_grace)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(connect=config.k8s_api_connect_timeout, read=config.k8s_api_read_timeout,
+                   watch_grace=config.k8s_watch_timeout_grace)
+
+    def get_request_timeout(self):
+        return self.connect, self.read
+
+    def get_watch_timeout(self, timeout_seconds):
+        if not timeout_seconds:
+            # no server side timeout, dead connections are only detected by tcp keepalive
+            return self.connect, None
+        return self.connect, timeout_seconds + self.watch_grace
@@ -1,24 +1,60 @@
 import sys
+import json
+import atexit
 import logging
 import signal
 import time
-import json
 import threading
 
-from pyzabbix import ZabbixAPI, ZabbixMetric, ZabbixSender, ZabbixResponse, ZabbixAPIException
-from kubernetes import client, config, watch
+from kubernetes import client, watch
 from kubernetes.client.rest import ApiException
+from kubernetes.watch.watch import iter_resp_lines
+from urllib3.exceptions import MaxRetryError, ProtocolError, ReadTimeoutError
 from datetime import datetime, timedelta
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
 
 from k8s_zabbix_base.timed_threads import TimedThread
 from k8s_zabbix_base.watcher_thread import WatcherThread
-from k8sobjects.k8sobject import K8sResourceManager, K8S_RESOURCES
+from k8s_zabbix_base.watch_selectors import WatchSelectors, to_list
+from k8s_zabbix_base.debounce import Debouncer
+from k8s_zabbix_base.send_budget import TokenBucket, get_phase, in_phase_window
+from k8s_zabbix_base.adaptive_intervals import IntervalController
+from k8s_zabbix_base.retry_buffer import RetryBuffer, to_metrics
+from k8s_zabbix_base.zabbix_pool import ZabbixSenderPool, ZabbixSendError, LANES
+from k8s_zabbix_base.overload import OverloadController, WEB_PAUSED, DEBOUNCE_WIDENED, CONTAINERS_AGGREGATED, \
+    DISCOVERY_DEFERRED
+from k8s_zabbix_base.stats import STATS, TimedLock
+from k8s_zabbix_base.apiserver_pool import RequestTimeouts, create_api_client, get_keepalive_socket_options, \
+    get_watch_retries
+from k8s_zabbix_base.metadata_watch import get_metadata_list_function, get_full_object_loader
+from k8s_zabbix_base.protobuf_watch import get_protobuf_watch_function, is_protobuf_response, iter_protobuf_events
+from k8s_zabbix_base.merge_patch import create_merge_patch, remove_nulls
+from k8s_zabbix_base.reconcile import list_metadata_pages, find_drift, is_newer, DRIFT_KINDS, MISSING, STALE, \
+    VANISHED
+from k8sobjects.k8sobject import K8sResourceManager, K8S_RESOURCES, ZabbixValue, get_item_key, project_object, \
+    get_resource_version, ADDED
+from k8sobjects.rollups import Rollups, CONTRIBUTIONS
+from k8sobjects.aggregates import ServiceTotals, ContainerTotals
+from k8sobjects.events import EventAggregates
+from k8sobjects.json_stream import get_writer, encode_discovery
 from k8sobjects.container import get_container_zabbix_metrics
 
 exit_flag = threading.Event()
 
+# health of the cluster, sent on the critical lane
+CRITICAL_RESOURCES = ['nodes', 'components']
+
+# resource -> (list function for all namespaces, list function for a single namespace)
+WATCH_FUNCTIONS = dict(
+    nodes=('list_node', None),
+    deployments=('list_deployment_for_all_namespaces', 'list_namespaced_deployment'),
+    daemonsets=('list_daemon_set_for_all_namespaces', 'list_namespaced_daemon_set'),
+    statefulsets=('list_stateful_set_for_all_namespaces', 'list_namespaced_stateful_set'),
+    ingresses=('list_ingress_for_all_namespaces', 'list_namespaced_ingress'),
+    secrets=('list_secret_for_all_namespaces', 'list_namespaced_secret'),
+    pods=('list_pod_for_all_namespaces', 'list_namespaced_pod'),
+    services=('list_service_for_all_namespaces', 'list_namespaced_service'),
+)
+
 class DryResult:
     pass
 
@@ -29,30 +65,70 @@ def get_data_timeout_datetime():
 def get_discovery_timeout_datetime():
     return datetime.now() - timedelta(hours=1)
 
+def get_event_namespace(event):
+    event_object = event['object']
+    if isinstance(event_object, dict):
+        # metadata only watches
+        return event_object.get('metadata', {}).get('namespace')
+    return getattr(event_object.metadata, 'namespace', None)
+
+
 def str2bool(v):
     if isinstance(v, bool):
         return v
     return v.lower() in ("yes", "true", "t", "1")
 
 class KubernetesApi:
-    __shared_state = dict(core_v1=None,
-                          apps_v1=None,
-                          extensions_v1=None)
+    """ the api objects are shared by all daemons and created when a resource needs them
 
-    def __init__(self, api_client):
-        self.__dict__ = self.__shared_state
+        watches hold their connection for minutes and use their own connection pool,
+        so they never take the connections of short requests (components, full objects) away
+    """
+    __shared_state = dict(api_client=None, watch_api_client=None)
 
-        if not getattr(self, 'core_v1', None):
-            self.core_v1 = client.CoreV1Api(api_client)
-        if not getattr(self, 'apps_v1', None):
-            self.apps_v1 = client.AppsV1Api(api_client)
-        if not getattr(self, 'exentsions_v1', None):
-            self.extensions_v1 = client.ExtensionsV1beta1Api(api_client)
+    def __init__(self, api_client=None, watch_api_client=None):
+        self.__dict__ = self.__shared_state
+        if self.api_client is None:
+            self.api_client = api_client
+            self.watch_api_client = watch_api_client or api_client
+
+    @classmethod
+    def from_config(cls, api_configuration, config):
+        if cls.__shared_state['api_client'] is not None:
+            return cls()
+        socket_options = get_keepalive_socket_options(idle=config.k8s_tcp_keepalive_idle,
+                                                      interval=config.k8s_tcp_keepalive_interval,
+                                                      count=config.k8s_tcp_keepalive_count)
+        return cls(create_api_client(api_configuration, config.k8s_api_pool_size, socket_options),
+                   create_api_client(api_configuration, config.k8s_watch_pool_size, socket_options,
+                                     retries=get_watch_retries()))
+
+    def get_api(self, api_class, watch=False):
+        name = '_%s%s' % (api_class, '_watch' if watch else '')
+        api = self.__shared_state.get(name)
+        if api is None:
+            api_client = self.watch_api_client if watch else self.api_client
+            api = self.__shared_state[name] = getattr(client, api_class)(api_client)
+        return api
 
 
 class CheckKubernetesDaemon:
     data = {'zabbix_discovery_sent': {}}
-    thread_lock = threading.Lock()
+    thread_lock = TimedLock('daemon')
+    # serializes the web api requests, they are sent outside of thread_lock
+    web_lock = TimedLock('web_api')
+    # shared by all daemons, the budget applies to the whole process
+    resend_budget = None
+    retry_buffer = None
+    retry_budget = None
+    retry_thread_started = False
+    zabbix_sender = None
+    ingest_pool = None
+    overload = None
+    overload_thread_started = False
+    rollups = Rollups()
+    service_totals = ServiceTotals()
+    container_totals = ContainerTotals()
 
     def __init__(self, config, config_name,
                  resources, resources_excluded, resources_excluded_web, resources_excluded_zabbix,
@@ -65,7 +141,65 @@ class CheckKubernetesDaemon:
         self.data_resend_interval = int(data_resend_interval)
 
         self.api_zabbix_interval = 60
-        self.rate_limit_seconds = 30
+        self.debounce_seconds = float(config.debounce_seconds)
+        self.debouncer = None
+        self.overload_debounce_factor = float(config.overload_debounce_factor)
+        self.overload_check_seconds = int(config.overload_check_seconds)
+        self.overload_max_deferred_discoveries = int(config.overload_max_deferred_discoveries)
+        # resource -> discoveries skipped in a row while overloaded
+        self.deferred_discoveries = dict()
+        if CheckKubernetesDaemon.overload is None and str2bool(config.overload_control):
+            CheckKubernetesDaemon.overload = OverloadController(
+                max_backlog=int(config.overload_max_backlog), max_lag_seconds=float(config.overload_max_lag_seconds),
+                max_busy_ratio=float(config.overload_max_busy_ratio),
+                max_memory_mb=float(config.overload_max_memory_mb))
+        self.resend_slice_seconds = float(config.resend_slice_seconds)
+        self.resend_positions = dict()
+        if CheckKubernetesDaemon.retry_buffer is None and int(config.retry_buffer_max_items) > 0:
+            CheckKubernetesDaemon.retry_buffer = RetryBuffer(
+                max_items=int(config.retry_buffer_max_items), spill_dir=config.retry_buffer_spill_dir,
+                max_spill_bytes=float(config.retry_buffer_max_spill_mb) * 1024 * 1024)
+            CheckKubernetesDaemon.retry_budget = TokenBucket(float(config.retry_replay_max_metrics_per_second),
+                                                             burst=min(250, max(1, float(config.retry_replay_max_metrics_per_second))))
+            self.retry_replay_check_seconds = int(config.retry_replay_check_seconds)
+            STATS.set_gauge('retry_buffer_items', CheckKubernetesDaemon.retry_buffer.__len__)
+            atexit.register(CheckKubernetesDaemon.retry_buffer.close)
+        self.rollups_enable = str2bool(config.rollups_enable)
+        self.rollups_namespaces_sent = None
+        self.rollups_discovery_sent = datetime.now()
+        self.events_enable = str2bool(config.events_enable)
+        self.events_top = int(config.events_top)
+        self.event_aggregates = None
+        if self.events_enable and 'nodes' in resources:
+            # one events watcher per process
+            self.event_aggregates = EventAggregates(
+                windows=[int(window) for window in to_list(config.events_windows)],
+                bucket_seconds=int(config.events_bucket_seconds), max_keys=int(config.events_max_keys),
+                top_capacity=int(config.events_top_capacity), max_tracked=int(config.events_max_tracked),
+                types=to_list(config.events_types))
+        self.events_values_sent = None
+        self.events_discovery_sent = datetime.now()
+        self.reconcile_interval = int(config.reconcile_interval)
+        self.reconcile_page_size = int(config.reconcile_page_size)
+        self.reconcile_max_fetches = int(config.reconcile_max_fetches)
+        self.reconcile_settle_seconds = float(config.reconcile_settle_seconds)
+        self.discovery_threads = []
+        self.resend_threads = []
+        self.interval_controller = None
+        if str2bool(config.adaptive_intervals):
+            self.interval_controller = IntervalController(
+                resources, self.data_resend_interval, self.discovery_interval,
+                (int(config.resend_data_interval_min), int(config.resend_data_interval_max)),
+                (int(config.discovery_interval_min), int(config.discovery_interval_max)),
+                max_metrics_per_second=float(config.resend_max_metrics_per_second))
+            self.adaptive_intervals_check_seconds = int(config.adaptive_intervals_check_seconds)
+            self.data_resend_interval = self.interval_controller.resend_interval
+            self.discovery_interval = self.interval_controller.discovery_interval
+        if CheckKubernetesDaemon.resend_budget is None:
+            max_metrics_per_second = float(config.resend_max_metrics_per_second)
+            # one zabbix request (250 items) per burst at most
+            CheckKubernetesDaemon.resend_budget = TokenBucket(max_metrics_per_second,
+                                                              burst=min(250, max(1, max_metrics_per_second)))
         self.api_configuration = client.Configuration()
         self.api_configuration.host = config.k8s_api_host
         self.api_configuration.verify_ssl = str2bool(config.verify_ssl)
@@ -73,17 +207,27 @@ class CheckKubernetesDaemon:
 
         # K8S API
         self.debug_k8s_events = False
-        self.api_client = client.ApiClient(self.api_configuration)
-        self.core_v1 = KubernetesApi(self.api_client).core_v1
-        self.apps_v1 = KubernetesApi(self.api_client).apps_v1
-        self.extensions_v1 = KubernetesApi(self.api_client).extensions_v1
-
-        self.zabbix_sender = ZabbixSender(zabbix_server=config.zabbix_server)
+        self.event_recorder = None
+        self.kubernetes_api = KubernetesApi.from_config(self.api_configuration, config)
+        self.api_client = self.kubernetes_api.api_client
+        self.watch_api_client = self.kubernetes_api.watch_api_client
+        self.request_timeouts = RequestTimeouts.from_config(config)
+
+        if CheckKubernetesDaemon.ingest_pool is None and int(config.ingest_workers) > 0:
+            # multiprocessing and the worker code are only imported if the workers are used
+            from .ingest_pool import IngestPool
+            CheckKubernetesDaemon.ingest_pool = IngestPool(int(config.ingest_workers), config.zabbix_host,
+                                                           batch_size=int(config.ingest_batch_size),
+                                                           exit_flag=exit_flag)
+        if CheckKubernetesDaemon.zabbix_sender is None:
+            # shared, so all daemons see the same health of the zabbix endpoints
+            CheckKubernetesDaemon.zabbix_sender = ZabbixSenderPool.from_config(config)
         self.zabbix_resources = CheckKubernetesDaemon.exclude_resources(resources, resources_excluded_zabbix)
         self.zabbix_host = config.zabbix_host
         self.zabbix_debug = str2bool(config.zabbix_debug)
         self.zabbix_single_debug = str2bool(config.zabbix_single_debug)
         self.zabbix_dry_run = str2bool(config.zabbix_dry_run)
+        self.stats_zabbix_enable = str2bool(config.stats_zabbix_enable)
 
         self.web_api_enable = str2bool(config.web_api_enable)
         self.web_api_resources = CheckKubernetesDaemon.exclude_resources(resources, resources_excluded_web)
@@ -92,8 +236,13 @@ class CheckKubernetesDaemon:
         self.web_api_token = config.web_api_token
         self.web_api_cluster = config.web_api_cluster
         self.web_api_verify_ssl = str2bool(config.web_api_verify_ssl)
+        self.web_api_delta_updates = str2bool(config.web_api_delta_updates)
+        self.web_api_timeout = (float(config.web_api_connect_timeout), float(config.web_api_read_timeout))
 
         self.resources = CheckKubernetesDaemon.exclude_resources(resources, resources_excluded)
+        self.watch_selectors = WatchSelectors.from_config(config)
+        # protobuf resources which the apiserver answered with json, watched as json from then on
+        self.protobuf_fallback = set()
 
         init_msg = "INIT K8S-ZABBIX Watcher\n<===>\n" \
                    "K8S API Server: %s\n" \
@@ -150,19 +299,59 @@ class CheckKubernetesDaemon:
                     else:
                         rd = d
                     self.logger.info('%s: %s\n' % (r, rd))
+        elif signum in [signal.SIGHUP]:
+            self.request_web_resync()
+
+    def request_web_resync(self):
+        """ the next send of every object to the web api is the full state instead of a merge patch """
+        self.logger.info('=== Full resync of the web api within the resend interval ===')
+        with self.thread_lock:
+            for r, d in self.data.items():
+                if hasattr(d, 'objects'):
+                    for obj in d.objects.values():
+                        obj.web_acked_data = None
 
     def run(self):
+        self.start_debounce_thread()
         self.start_data_threads()
         self.start_api_info_threads()
         self.start_loop_send_discovery_threads()
         self.start_resend_threads()
+        self.start_adaptive_interval_thread()
+        self.start_retry_thread()
+        self.start_overload_thread()
+        self.start_events_threads()
+        self.start_reconcile_threads()
+
+    def init_resource_manager(self, resource):
+        with self.thread_lock:
+            if resource not in self.data:
+                self.data[resource] = self.create_resource_manager(resource)
+                STATS.set_gauge('objects', self.data[resource].count_objects, resource=resource)
+            if self.watch_selectors.is_metadata_only(resource):
+                self.data[resource].full_object_loader = get_full_object_loader(
+                    self.get_api_for_resource, request_timeout=self.request_timeouts.get_request_timeout())
+            if resource == 'pods':
+                self.data.setdefault('containers', K8sResourceManager('containers'))
+
+    def create_resource_manager(self, resource):
+        """ every change of a object is notified once to all subscribers, their time is measured per subscriber """
+        manager = K8sResourceManager(resource, zabbix_host=self.zabbix_host)
+        manager.subscriber_timer = lambda name, seconds: STATS.observe('subscriber_seconds', seconds,
+                                                                       resource=resource, subscriber=name)
+        manager.subscribe('zabbix', self.emit_zabbix)
+        manager.subscribe('web_api', self.emit_web_api)
+        if self.rollups_enable and resource in CONTRIBUTIONS:
+            manager.subscribe('rollups', self.rollups.handle)
+        if resource == 'services':
+            manager.subscribe('service_totals', self.service_totals.handle)
+        elif resource == 'pods':
+            manager.subscribe('container_totals', self.container_totals.handle)
+        return manager
 
     def start_data_threads(self):
         for resource in self.resources:
-            with self.thread_lock:
-                self.data.setdefault(resource, K8sResourceManager(resource, zabbix_host=self.zabbix_host))
-                if resource == 'pods':
-                    self.data.setdefault('containers', K8sResourceManager('containers'))
+            self.init_resource_manager(resource)
 
             # watcher threads
             if resource == 'containers':
@@ -173,10 +362,12 @@ class CheckKubernetesDaemon:
                 self.manage_threads.append(thread)
                 thread.start()
             else:
-                thread = WatcherThread(resource, exit_flag,
-                                       daemon=self, daemon_method='watch_data')
-                self.manage_threads.append(thread)
-                thread.start()
+                for name_space in self.watch_selectors.get_watch_namespaces(resource):
+                    thread = WatcherThread(resource, exit_flag,
+                                           daemon=self, daemon_method='watch_data',
+                                           name_space=name_space)
+                    self.manage_threads.append(thread)
+                    thread.start()
 
             # additional looping data threads
             if resource == 'services':
@@ -192,6 +383,16 @@ class CheckKubernetesDaemon:
                 self.manage_threads.append(thread)
                 thread.start()
 
+    def start_debounce_thread(self):
+        if self.debounce_seconds <= 0:
+            return
+        self.debouncer = Debouncer(self.debounce_seconds, exit_flag, callback=self.send_debounced_object,
+                                   merge_func=self.merge_debounced_sends,
+                                   name='Debouncer-%s' % ','.join(self.resources))
+        STATS.set_gauge('debounce_pending', self.debouncer.count_pending, daemon=','.join(self.resources))
+        self.manage_threads.append(self.debouncer)
+        self.debouncer.start()
+
     def start_api_info_threads(self):
         if 'nodes' not in self.resources:
             # only send api heartbeat once
@@ -202,6 +403,13 @@ class CheckKubernetesDaemon:
         self.manage_threads.append(thread)
         thread.start()
 
+        if self.rollups_enable:
+            thread = TimedThread('rollups', self.api_zabbix_interval, exit_flag,
+                                 daemon=self, daemon_method='send_rollups',
+                                 delay_first_run=True, delay_first_run_seconds=30)
+            self.manage_threads.append(thread)
+            thread.start()
+
     def start_loop_send_discovery_threads(self):
         for resource in self.resources:
             send_discovery_thread = TimedThread(resource, self.discovery_interval, exit_flag,
@@ -209,110 +417,471 @@ class CheckKubernetesDaemon:
                                                 delay_first_run=True,
                                                 delay_first_run_seconds=30)
             self.manage_threads.append(send_discovery_thread)
+            self.discovery_threads.append(send_discovery_thread)
             send_discovery_thread.start()
 
     def start_resend_threads(self):
         for resource in self.resources:
-            resend_thread = TimedThread(resource, self.data_resend_interval, exit_flag,
+            # every slice resends the objects whose phase falls into it
+            resend_thread = TimedThread(resource, min(self.resend_slice_seconds, self.data_resend_interval), exit_flag,
                                         daemon=self, daemon_method='resend_data',
                                         delay_first_run=True,
                                         delay_first_run_seconds=60,
                                         )
             self.manage_threads.append(resend_thread)
+            self.resend_threads.append(resend_thread)
             resend_thread.start()
 
-    def get_api_for_resource(self, resource):
-        if resource in ['nodes', 'components', 'secrets', 'pods', 'services']:
-            api = self.core_v1
+    def start_events_threads(self):
+        if self.event_aggregates is None:
+            return
+        STATS.set_gauge('events_tracked', lambda: len(self.event_aggregates.tracked))
+        STATS.set_gauge('events_overflow', lambda: self.event_aggregates.overflow)
+        thread = WatcherThread('events', exit_flag, daemon=self, daemon_method='watch_events')
+        self.manage_threads.append(thread)
+        thread.start()
+        thread = TimedThread('events', self.api_zabbix_interval, exit_flag,
+                             daemon=self, daemon_method='send_event_aggregates',
+                             delay_first_run=True, delay_first_run_seconds=30)
+        self.manage_threads.append(thread)
+        thread.start()
+
+    def start_reconcile_threads(self):
+        if self.reconcile_interval <= 0:
+            return
+        for resource in self.resources:
+            if resource not in WATCH_FUNCTIONS:
+                # components are listed completely anyway
+                continue
+            thread = TimedThread(resource, self.reconcile_interval, exit_flag,
+                                 daemon=self, daemon_method='reconcile',
+                                 delay_first_run=True, delay_first_run_seconds=self.reconcile_interval)
+            self.manage_threads.append(thread)
+            thread.start()
+
+    def start_adaptive_interval_thread(self):
+        if self.interval_controller is None:
+            return
+        for resource in self.resources:
+            STATS.set_gauge('resend_interval_seconds', lambda: self.data_resend_interval, resource=resource)
+            STATS.set_gauge('discovery_interval_seconds', lambda: self.discovery_interval, resource=resource)
+        thread = TimedThread('adaptive_intervals', self.adaptive_intervals_check_seconds, exit_flag,
+                             daemon=self, daemon_method='adapt_intervals')
+        self.manage_threads.append(thread)
+        thread.start()
+
+    def start_retry_thread(self):
+        if self.retry_buffer is None or CheckKubernetesDaemon.retry_thread_started:
+            # only one replay for the shared buffer
+            return
+        CheckKubernetesDaemon.retry_thread_started = True
+        thread = TimedThread('retry_buffer', self.retry_replay_check_seconds, exit_flag,
+                             daemon=self, daemon_method='replay_retry_buffer')
+        self.manage_threads.append(thread)
+        thread.start()
+
+    def start_overload_thread(self):
+        if self.overload is None:
+            return
+        self.overload.add_listener(self.apply_overload_level)
+        if CheckKubernetesDaemon.overload_thread_started:
+            # one controller for the whole process
+            return
+        CheckKubernetesDaemon.overload_thread_started = True
+        thread = TimedThread('overload', self.overload_check_seconds, exit_flag,
+                             daemon=self, daemon_method='check_overload')
+        self.manage_threads.append(thread)
+        thread.start()
+
+    def is_degraded(self, level):
+        return self.overload is not None and self.overload.is_active(level)
+
+    def check_overload(self, *args):
+        if self.overload.update():
+            self.send_overload_info()
+
+    def apply_overload_level(self, level):
+        if self.debouncer is not None:
+            factor = self.overload_debounce_factor if level >= DEBOUNCE_WIDENED else 1.0
+            self.debouncer.set_window(self.debounce_seconds * factor)
+
+    def send_overload_info(self):
+        result = self.send_to_zabbix([
+            ZabbixValue(self.zabbix_host, get_item_key('overload', 'level'), self.overload.level),
+            ZabbixValue(self.zabbix_host, get_item_key('overload', 'pressure'), round(self.overload.pressure, 3)),
+        ], lane='critical')
+        if result.failed > 0:
+            self.logger.error("failed to send the overload level to zabbix")
+
+    def replay_retry_buffer(self, *args):
+        """ sends the buffered metrics oldest first with their original clock until the buffer is empty or sending fails """
+        replayed = 0
+        while not exit_flag.is_set():
+            entries = self.retry_buffer.pop(int(self.retry_budget.burst))
+            if not entries:
+                break
+            self.retry_budget.acquire(len(entries), exit_flag)
+            result = self.send_to_zabbix(to_metrics(entries), retry=False, lane='bulk')
+            if getattr(result, 'error', None) is not None:
+                # zabbix is still not reachable, the undelivered rest is tried again on the next run
+                delivered = len(entries) - len(result.undelivered)
+                self.retry_buffer.push_front(entries[delivered:])
+                replayed += delivered
+                STATS.inc('retry_buffer_replayed_total', delivered)
+                break
+            replayed += len(entries)
+            STATS.inc('retry_buffer_replayed_total', len(entries))
+        if replayed:
+            self.logger.info('replayed %i buffered zabbix items, %i left' % (replayed, len(self.retry_buffer)))
+
+    def adapt_intervals(self, *args):
+        self.data_resend_interval, self.discovery_interval = self.interval_controller.update()
+        for thread in self.discovery_threads:
+            thread.set_interval(self.discovery_interval)
+        for thread in self.resend_threads:
+            thread.set_interval(min(self.resend_slice_seconds, self.data_resend_interval))
+
+        metrics = []
+        for resource in self.resources:
+            metrics.append(ZabbixValue(self.zabbix_host, get_item_key('interval', 'resend', resource),
+                                       self.data_resend_interval))
+            metrics.append(ZabbixValue(self.zabbix_host, get_item_key('interval', 'discovery', resource),
+                                       self.discovery_interval))
+        result = self.send_to_zabbix(metrics)
+        if result.failed > 0:
+            self.logger.error("failed to send the adaptive intervals to zabbix")
+
+    def get_api_for_resource(self, resource, watch=False):
+        if resource in ['nodes', 'components', 'secrets', 'pods', 'services', 'events']:
+            api_class = 'CoreV1Api'
         elif resource in ['deployments', 'daemonsets', 'statefulsets']:
-            api = self.apps_v1
+            api_class = 'AppsV1Api'
         elif resource in ['ingresses']:
-            api = self.extensions_v1
+            api_class = 'ExtensionsV1beta1Api'
         else:
             raise AttributeError('No valid resource found: %s' % resource)
-        return api
+        return self.kubernetes_api.get_api(api_class, watch=watch)
 
     def get_web_api(self):
         if not hasattr(self, '_web_api'):
             from .web_api import WebApi
-            self._web_api = WebApi(self.web_api_host, self.web_api_token, verify_ssl=self.web_api_verify_ssl)
+            self._web_api = WebApi(self.web_api_host, self.web_api_token, verify_ssl=self.web_api_verify_ssl,
+                                   timeout=self.web_api_timeout)
         return self._web_api
 
-    def watch_data(self, resource, timeout=240):
-        api = self.get_api_for_resource(resource)
-
+    def watch_data(self, resource, timeout=240, name_space=None):
         if timeout == 0:
             timeout_str = "no timeout"
         else:
             timeout_str = "%i seconds" % timeout
 
-        self.logger.info("Watching for resource >>>%s<<< with a timeout of %s" % (resource, timeout_str))
+        stream_kwargs = self.watch_selectors.get_stream_kwargs(resource, name_space=name_space)
+        self.logger.info("Watching for resource >>>%s<<< in namespace %s with a timeout of %s %s" % (
+            resource, name_space if name_space else "<all>", timeout_str, stream_kwargs))
+        stream_kwargs.update(timeout_seconds=timeout, _request_timeout=self.request_timeouts.get_watch_timeout(timeout))
+        failures = 0
         while True:
-            w = watch.Watch()
-            if resource == 'nodes':
-                for obj in w.stream(api.list_node, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'deployments':
-                for obj in w.stream(api.list_deployment_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'daemonsets':
-                for obj in w.stream(api.list_daemon_set_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'statefulsets':
-                for obj in w.stream(api.list_stateful_set_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'components':
+            if resource == 'components':
                 # The api does not support watching on component status
+                api = self.get_api_for_resource(resource)
+                items = api.list_component_status(
+                    watch=False, _request_timeout=self.request_timeouts.get_request_timeout()).to_dict().get('items')
+                notifications = []
                 with self.thread_lock:
-                    for obj in api.list_component_status(watch=False).to_dict().get('items'):
-                        self.data[resource].add_obj(obj)
+                    for obj in items:
+                        self.data[resource].add_obj(obj, notifications=notifications)
+                self.data[resource].notify(notifications)
                 time.sleep(self.data_resend_interval)
-            elif resource == 'ingresses':
-                for obj in w.stream(api.list_ingress_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'tls':
-                for obj in w.stream(api.list_secret_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'pods':
-                for obj in w.stream(api.list_pod_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
-            elif resource == 'services':
-                for obj in w.stream(api.list_service_for_all_namespaces, timeout_seconds=timeout):
-                    self.watch_event_handler(resource, obj)
+            elif resource in WATCH_FUNCTIONS:
+                try:
+                    self.watch_resource(resource, name_space, stream_kwargs)
+                    failures = 0
+                except (ReadTimeoutError, ProtocolError, MaxRetryError) as e:
+                    # the connection died (read timeout, tcp keepalive), broke or the apiserver is not
+                    # reachable, watch again on a new connection
+                    failures += 1
+                    STATS.inc('watch_reconnects_total', resource=resource)
+                    self.logger.warning("Watch for resource >>>%s<<< failed (%i times in a row), reconnecting: %s" % (
+                        resource, failures, e))
+                    time.sleep(min(60, 2 ** (failures - 1)))
             else:
                 self.logger.error("No watch handling for resource %s" % resource)
                 time.sleep(60)
             self.logger.debug("Watch/fetch completed for resource >>>%s<<<, restarting" % resource)
 
-    def watch_event_handler(self, resource, event):
-        event_type = event['type']
-        obj = event['object'].to_dict()
-        self.logger.debug(event_type + ' [' + resource + ']: ' + obj['metadata']['name'])
-        with self.thread_lock:
-            if not self.data[resource].resource_class:
-                self.logger.error('Could not add watch_event_handler! No resource_class for "%s"' % resource)
+    def watch_events(self, resource, timeout=240):
+        """ counts the kubernetes events in the event aggregates, the events themselves are not kept
+
+            a single type is filtered by the apiserver, the watch continues at the last resource version,
+            so the events of the watch cache are only listed again if the apiserver answered 410 gone
+        """
+        kwargs = dict(timeout_seconds=timeout, _request_timeout=self.request_timeouts.get_watch_timeout(timeout))
+        if len(self.event_aggregates.types) == 1:
+            kwargs['field_selector'] = 'type=%s' % self.event_aggregates.types[0]
+        self.logger.info("Watching for resource >>>%s<<< with a timeout of %i seconds %s" % (resource, timeout, kwargs))
+        resource_version = None
+        failures = 0
+        while not exit_flag.is_set():
+            try:
+                resource_version = self.watch_events_once(resource, resource_version, kwargs)
+                failures = 0
+            except (ReadTimeoutError, ProtocolError, MaxRetryError, ApiException) as e:
+                # i.e. the events are not readable with the permissions of the monitoring user
+                failures += 1
+                STATS.inc('watch_reconnects_total', resource=resource)
+                self.logger.warning("Watch for resource >>>%s<<< failed (%i times in a row), reconnecting: %s" % (
+                    resource, failures, e))
+                time.sleep(min(60, 2 ** (failures - 1)))
+
+    def watch_events_once(self, resource, resource_version, kwargs):
+        """ a single watch request, returns the resource version to continue at """
+        api = self.get_api_for_resource(resource, watch=True)
+        if resource_version is not None:
+            kwargs = dict(kwargs, resource_version=resource_version)
+        resp = api.list_event_for_all_namespaces(watch=True, _preload_content=False, **kwargs)
+        try:
+            for line in iter_resp_lines(resp):
+                # only a few fields are used, the events are not deserialized to models
+                event = json.loads(line)
+                obj = event['object']
+                if event['type'] == 'ERROR':
+                    if obj.get('code') == 410:
+                        self.logger.info('resource version of %s expired, listing the events again' % resource)
+                        return None
+                    self.logger.error('watch of %s failed: %s %s' % (resource, obj.get('code'), obj.get('message')))
+                    return resource_version
+                resource_version = (obj.get('metadata') or {}).get('resourceVersion') or resource_version
+                STATS.inc('watch_events_total', resource=resource, type=event['type'])
+                self.event_aggregates.handle(event['type'], obj)
+        finally:
+            resp.close()
+            resp.release_conn()
+        return resource_version
+
+    def watch_resource(self, resource, name_space, kwargs):
+        """ a single watch request, returns when the apiserver ends the watch """
+        if self.watch_selectors.is_protobuf(resource) and resource not in self.protobuf_fallback:
+            self.watch_protobuf(resource, name_space, kwargs)
+            return
+
+        list_all_func, list_namespaced_func = WATCH_FUNCTIONS[resource]
+        api = self.get_api_for_resource(resource, watch=True)
+        if self.watch_selectors.is_metadata_only(resource):
+            func, args = get_metadata_list_function(self.watch_api_client, resource, name_space), []
+        elif name_space is not None:
+            func, args = getattr(api, list_namespaced_func), [name_space]
+        else:
+            func, args = getattr(api, list_all_func), []
+        w = watch.Watch()
+        if self.ingest_pool is not None:
+            self.watch_raw(resource, w.get_return_type(func), func, args, kwargs)
+            return
+        for obj in w.stream(func, *args, **kwargs):
+            if not self.watch_selectors.accepts(resource, get_event_namespace(obj)):
+                continue
+            if self.event_recorder:
+                self.event_recorder.record(resource, obj)
+            self.watch_event_handler(resource, obj)
+
+    def watch_raw(self, resource, kind, func, args, kwargs):
+        """ passes the undecoded watch lines to the ingestion workers, replaces kubernetes.watch.Watch.stream """
+        resp = func(*args, watch=True, _preload_content=False, **kwargs)
+        try:
+            for line in iter_resp_lines(resp):
+                if self.event_recorder:
+                    self.event_recorder.record_raw(resource, line, kind)
+                self.ingest_pool.submit(resource, kind, line, self.ingested_event_handler)
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def watch_protobuf(self, resource, name_space, kwargs):
+        """ watches nodes or pods as protobuf, decodes only the fields used by the resource classes """
+        func = get_protobuf_watch_function(self.watch_api_client, resource, name_space)
+        resp = func(**kwargs)
+        try:
+            if not is_protobuf_response(resp):
+                self.logger.warning('apiserver does not send protobuf for %s (content type %s), using json' % (
+                    resource, resp.headers.get('Content-Type')))
+                self.protobuf_fallback.add(resource)
                 return
+            for event_type, obj in iter_protobuf_events(resp, resource):
+                if event_type == 'ERROR':
+                    self.logger.error('protobuf watch of %s failed: %s %s' % (resource, obj['code'], obj['message']))
+                    return
+                if not self.watch_selectors.accepts(resource, obj['metadata']['namespace']):
+                    continue
+                resource_version = obj['metadata'].pop('resource_version')
+                event = dict(type=event_type, object=obj)
+                if self.event_recorder:
+                    self.event_recorder.record(resource, event)
+                self.watch_event_handler(resource, event, resource_version=resource_version)
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def ingested_event_handler(self, resource, event_type, obj, checksum, metrics, error):
+        """ applies a event decoded by a ingestion worker """
+        from .ingest_pool import intern_metrics
+        if error:
+            self.logger.error('failed to decode %s event [%s]: %s' % (event_type, resource, error))
+            return
+        if not self.watch_selectors.accepts(resource, (obj.get('metadata') or {}).get('namespace')):
+            return
+        STATS.inc('watch_events_total', resource=resource, type=event_type)
+        with STATS.timed('watch_event_handler_seconds', resource=resource):
+            if metrics is not None:
+                metrics = intern_metrics(self.zabbix_host, metrics)
+            self.handle_event_object(resource, event_type, obj, checksum=checksum, zabbix_metrics=metrics)
+
+    def watch_event_handler(self, resource, event, resource_version=None):
+        STATS.inc('watch_events_total', resource=resource, type=event['type'])
+        with STATS.timed('watch_event_handler_seconds', resource=resource):
+            if isinstance(event['object'], dict):
+                obj = event['object']
+            else:
+                obj = event['object'].to_dict()
+            self.handle_event_object(resource, event['type'], project_object(obj), resource_version=resource_version)
 
-        if event_type.lower() == 'added':
-            with self.thread_lock:
-                resourced_obj = self.data[resource].add_obj(obj)
-            if resourced_obj.is_dirty_zabbix or resourced_obj.is_dirty_web:
-                self.send_object(resource, resourced_obj, event_type,
-                                 send_zabbix_data=resourced_obj.is_dirty_zabbix,
-                                 send_web=resourced_obj.is_dirty_web)
-        elif event_type.lower() == 'modified':
+    def handle_event_object(self, resource, event_type, obj, checksum=None, zabbix_metrics=None,
+                            resource_version=None):
+        """ adds, updates or deletes the object, the subscribers of the manager send the changes """
+        self.logger.debug(event_type + ' [' + resource + ']: ' + obj['metadata']['name'])
+        manager = self.data[resource]
+        if not manager.resource_class:
+            self.logger.error('Could not add watch_event_handler! No resource_class for "%s"' % resource)
+            return
+
+        notifications = []
+        if event_type.lower() in ['added', 'modified']:
             with self.thread_lock:
-                resourced_obj = self.data[resource].add_obj(obj)
-            if resourced_obj.is_dirty_zabbix or resourced_obj.is_dirty_web:
-                self.send_object(resource, resourced_obj, event_type,
-                                 send_zabbix_data=resourced_obj.is_dirty_zabbix,
-                                 send_web=resourced_obj.is_dirty_web)
+                manager.add_obj(obj, checksum=checksum, zabbix_metrics=zabbix_metrics, notifications=notifications,
+                                resource_version=resource_version)
         elif event_type.lower() == 'deleted':
             with self.thread_lock:
-                resourced_obj = self.data[resource].del_obj(obj)
-                self.delete_object(resource, resourced_obj)
+                manager.del_obj(obj, checksum=checksum, notifications=notifications)
         else:
             self.logger.info('event type "%s" not implemented' % event_type)
+        # outside of the lock, the subscribers send to zabbix and the web api
+        manager.notify(notifications)
+
+    def reconcile(self, resource):
+        """ compares the objects with a metadata list from the watch cache of the apiserver and fixes up only the
+            objects which drifted
+
+            the list only nominates the objects, every missing, stale or vanished object is confirmed by a GET
+            request (at most reconcile_max_fetches per run) before it is applied or deleted like by a watch event
+        """
+        started = time.perf_counter()
+        load_full_object = get_full_object_loader(self.get_api_for_resource,
+                                                  request_timeout=self.request_timeouts.get_request_timeout())
+        drift_counts = dict((kind, 0) for kind in DRIFT_KINDS)
+        listed_count = 0
+        fetches = 0
+        skipped = 0
+        for name_space in self.watch_selectors.get_watch_namespaces(resource):
+            try:
+                listed, list_resource_version = list_metadata_pages(
+                    get_metadata_list_function(self.api_client, resource, name_space),
+                    page_size=self.reconcile_page_size, _request_timeout=self.request_timeouts.get_request_timeout(),
+                    **self.watch_selectors.get_stream_kwargs(resource, name_space=name_space))
+                listed = dict((key, item) for key, item in listed.items()
+                              if self.watch_selectors.accepts(resource, key[0]))
+                listed_count += len(listed)
+                drift = find_drift(self.get_local_resource_versions(resource, name_space), listed,
+                                   list_resource_version)
+                if any(drift.values()) and self.reconcile_settle_seconds > 0:
+                    # watch events which were in flight while listing are no drift, they are applied meanwhile
+                    exit_flag.wait(self.reconcile_settle_seconds)
+                    settled = dict((kind, set(keys)) for kind, keys in find_drift(
+                        self.get_local_resource_versions(resource, name_space), listed, list_resource_version).items())
+                    drift = dict((kind, [key for key in keys if key in settled[kind]]) for kind, keys in drift.items())
+                for kind, keys in drift.items():
+                    for key in keys:
+                        if fetches >= self.reconcile_max_fetches:
+                            skipped += 1
+                            continue
+                        requests, confirmed = self.fix_drift(resource, kind, key, listed.get(key), load_full_object)
+                        fetches += requests
+                        if confirmed:
+                            drift_counts[confirmed] += 1
+                            STATS.inc('reconcile_drift_total', resource=resource, kind=confirmed)
+            except (ApiException, ReadTimeoutError, ProtocolError, MaxRetryError) as e:
+                STATS.inc('reconcile_failed_total', resource=resource)
+                self.logger.warning('reconciliation of %s failed: %s' % (resource, e))
+                return
+
+        seconds = time.perf_counter() - started
+        STATS.observe('reconcile_seconds', seconds, resource=resource)
+        if skipped:
+            self.logger.warning('reconciliation of %s reached %i requests, %i objects are checked by the next run'
+                                % (resource, fetches, skipped))
+        self.logger.info('reconciled %i listed %s in %.1fs: %i missing, %i stale, %i vanished' % (
+            listed_count, resource, seconds, drift_counts[MISSING], drift_counts[STALE], drift_counts[VANISHED]))
+
+        result = self.send_to_zabbix([ZabbixValue(self.zabbix_host, get_item_key('reconcile', resource, kind), count)
+                                      for kind, count in drift_counts.items()])
+        if result.failed > 0:
+            self.logger.error("failed to send the reconciliation of %s to zabbix" % resource)
+
+    def get_local_resource_versions(self, resource, name_space=None):
+        with self.thread_lock:
+            return dict((key, resource_version) for key, resource_version in
+                        self.data[resource].resource_versions.items() if name_space is None or key[0] == name_space)
+
+    def fix_drift(self, resource, kind, key, item, load_full_object):
+        """ confirms and applies the drift of a object, returns the number of requests and the confirmed drift kind
+            (None if the watch was right, i.e. the object was deleted or changed after the list)
+        """
+        name_space, name = key
+        if kind != VANISHED and self.watch_selectors.is_metadata_only(resource):
+            # the list item is what the watch would have sent
+            self.handle_event_object(resource, 'ADDED' if kind == MISSING else 'MODIFIED',
+                                     dict(item, kind='PartialObjectMetadata', apiVersion='meta.k8s.io/v1'))
+            return 0, kind
+        try:
+            obj = project_object(load_full_object(resource, name_space, name))
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            obj = None
+
+        manager = self.data[resource]
+        notifications = []
+        with self.thread_lock:
+            known = key in manager.resource_versions
+            resource_version = manager.resource_versions.get(key)
+            if obj is None:
+                if not known:
+                    return 1, None
+                manager.del_obj(dict(metadata=dict(name=name, namespace=name_space)), notifications=notifications)
+                confirmed = VANISHED
+            elif known and resource_version is not None and \
+                    not is_newer(get_resource_version(obj), resource_version):
+                return 1, None
+            else:
+                manager.add_obj(obj, notifications=notifications)
+                confirmed = STALE if known else MISSING
+        manager.notify(notifications)
+        return 1, confirmed
+
+    @staticmethod
+    def get_event_type(notification):
+        return 'ADDED' if notification.kind == ADDED else 'MODIFIED'
+
+    def emit_zabbix(self, notification):
+        """ subscriber of all resource managers, sends the metrics of added and updated objects """
+        if notification.new is not None:
+            self.send_object(notification.resource, notification.new, self.get_event_type(notification),
+                             send_zabbix_data=True)
+
+    def emit_web_api(self, notification):
+        """ subscriber of all resource managers, sends all changes to the web api """
+        if notification.new is None:
+            self.delete_object(notification.resource, notification.old)
+        else:
+            self.send_object(notification.resource, notification.new, self.get_event_type(notification),
+                             send_web=True)
 
     def report_global_data_zabbix(self, resource):
         """ aggregate and report information for some speciality in resources """
@@ -323,159 +892,331 @@ class CheckKubernetesDaemon:
         data_to_send = list()
 
         if resource == 'services':
-            num_services = 0
-            num_ingress_services = 0
-            with self.thread_lock:
-                for obj_uid, resourced_obj in self.data[resource].objects.items():
-                    num_services += 1
-                    if resourced_obj.resource_data['is_ingress']:
-                        num_ingress_services += 1
-
-            data_to_send.append(ZabbixMetric(self.zabbix_host, 'check_kubernetes[get,services,num_services]', num_services))
-            data_to_send.append(ZabbixMetric(self.zabbix_host, 'check_kubernetes[get,services,num_ingress_services]', num_ingress_services))
+            num_services, num_ingress_services = self.service_totals.get_totals()
+            data_to_send.append(ZabbixValue(self.zabbix_host, 'check_kubernetes[get,services,num_services]', num_services))
+            data_to_send.append(ZabbixValue(self.zabbix_host, 'check_kubernetes[get,services,num_ingress_services]', num_ingress_services))
             self.send_data_to_zabbix(resource, None, data_to_send)
         elif resource == 'containers':
-            # aggregate pod data to containers for each namespace
-            with self.thread_lock:
-                containers = dict()
-                for obj_uid, resourced_obj in self.data['pods'].objects.items():
-                    ns = resourced_obj.name_space
-                    if ns not in containers:
-                        containers[ns] = dict()
-
-                    pod_data = resourced_obj.resource_data
-                    pod_base_name = resourced_obj.base_name
-                    for container_name, container_data in pod_data['container_status'].items():
-                        containers[ns].setdefault(pod_base_name, dict())
-                        containers[ns][pod_base_name].setdefault(container_name, container_data)
-                        for k, v in containers[ns][pod_base_name][container_name].items():
-                            if isinstance(v, int):
-                                containers[ns][container_name][pod_base_name][k] += container_data[k]
-                            elif k == 'status' and container_data[k].startswith('ERROR'):
-                                containers[ns][container_name][pod_base_name][k] = container_data[k]
-
-                for ns, d1 in containers.items():
-                    for pod_base_name, d2 in d1.items():
-                        for container_name, container_data in d2.items():
-                            data_to_send += get_container_zabbix_metrics(self.zabbix_host, ns, pod_base_name, container_name, container_data)
-
-                self.send_data_to_zabbix(resource, None, data_to_send)
+            if self.is_degraded(CONTAINERS_AGGREGATED):
+                self.logger.debug('skipping the container metrics, overloaded (namespace rollups only)')
+                return
+            # maintained by the subscriber of the pods manager
+            for ns, d1 in self.container_totals.get_totals().items():
+                for pod_base_name, d2 in d1.items():
+                    for container_name, container_data in d2.items():
+                        data_to_send += get_container_zabbix_metrics(self.zabbix_host, ns, pod_base_name,
+                                                                     container_name, container_data)
+
+            self.send_budgeted_data_to_zabbix(resource, data_to_send)
+
+    def get_resend_window(self, resource):
+        """ returns the window (start, end] of the resend cycle since the last call
+
+            the first call covers a complete cycle, objects sent before the discovery was known to zabbix
+            are sent again
+        """
+        now = time.time()
+        start = self.resend_positions.get(resource, now - self.data_resend_interval)
+        self.resend_positions[resource] = now
+        return start, now
+
+    def load_full_data(self, resource, objects):
+        """ fetches the full objects of metadata only watches outside of the lock, a object which could not be
+            loaded stays incomplete and is skipped until it is sent again
+        """
+        for obj in objects:
+            try:
+                obj.load_full_data()
+            except (ApiException, ReadTimeoutError, ProtocolError, MaxRetryError) as e:
+                self.logger.warning('failed to load the full object of [%s] %s/%s: %s' % (
+                    resource, obj.name_space, obj.name, e))
 
     def resend_data(self, resource):
-
+        window = self.get_resend_window(resource)
+        metrics = list()
+        web_sends = list()
+        with self.thread_lock:
+            incomplete = [obj for obj in self.data[resource].objects.values() if obj.is_incomplete] \
+                if resource in self.data else []
+        self.load_full_data(resource, incomplete)
         with self.thread_lock:
             try:
-                metrics = list()
                 if resource not in self.data or len(self.data[resource].objects) == 0:
                     self.logger.debug("no resource data available for %s , stop delivery" % resource)
                     return
 
                 # Zabbix
-                for obj_uid, obj in self.data[resource].objects.items():
-                    zabbix_send = False
-                    if self.data['zabbix_discovery_sent'].get(resource) is not None:
-                        zabbix_send = True
-                    elif obj.last_sent_zabbix < (datetime.now() - timedelta(seconds=self.data_resend_interval)):
-                        self.logger.debug("resend zabbix : %s  - %s/%s data because its outdated" % (resource, obj.name_space, obj.name))
-                        zabbix_send = True
-                    if zabbix_send:
-                        metrics += obj.get_zabbix_metrics()
-                        obj.last_sent_zabbix = datetime.now()
-                        obj.is_dirty_zabbix = False
-                if len(metrics) > 0:
-                    if self.data['zabbix_discovery_sent'].get(resource) is None:
-                        self.logger.debug(
-                            'skipping resend_data zabbix , discovery for %s - %s/%s not sent yet!' % (resource, obj.name_space, obj.name))
-                    else:
-                        self.send_data_to_zabbix(resource, metrics=metrics)
-
-                # Web
-                for obj_uid, obj in self.data[resource].objects.items():
-                    if obj.is_dirty_web:
-                        if obj.is_unsubmitted_web():
-                            self.send_to_web_api(resource, obj, 'ADDED')
-                        else:
-                            self.send_to_web_api(resource, obj, 'MODIFIED')
-                    else:
-                        if obj.is_unsubmitted_web():
-                            self.send_to_web_api(resource, obj, 'ADDED')
-                        elif obj.last_sent_web < (datetime.now() - timedelta(seconds=self.data_resend_interval)):
-                            self.send_to_web_api(resource, obj, 'MODIFIED')
-                            self.logger.debug("resend web : %s/%s data because its outdated" % (resource, obj.name))
-                    obj.last_sent_web = datetime.now()
-                    obj.is_dirty_web = False
+                if self.data['zabbix_discovery_sent'].get(resource) is None:
+                    self.logger.debug('skipping resend_data zabbix, discovery for %s not sent yet!' % resource)
+                else:
+                    for obj_uid, obj in self.data[resource].objects.items():
+                        if obj.is_incomplete:
+                            # changed since it was loaded, sent by the send of its change
+                            continue
+                        if obj.is_dirty_zabbix or in_phase_window(get_phase(obj_uid, self.data_resend_interval),
+                                                                  window[0], window[1], self.data_resend_interval):
+                            metrics += obj.take_zabbix_metrics()
+                            obj.last_sent_zabbix = datetime.now()
+                            obj.is_dirty_zabbix = False
+
+                # Web, paused while overloaded, the changed objects stay dirty and are sent after the recovery
+                web_objects = [] if self.is_degraded(WEB_PAUSED) or not self.is_web_api_resource(resource) \
+                    else self.data[resource].objects.items()
+                for obj_uid, obj in web_objects:
+                    if obj.is_incomplete:
+                        continue
+                    if obj.is_unsubmitted_web():
+                        web_sends.append((obj, 'ADDED'))
+                    elif obj.is_dirty_web or in_phase_window(get_phase(obj_uid, self.data_resend_interval),
+                                                             window[0], window[1], self.data_resend_interval):
+                        web_sends.append((obj, 'MODIFIED'))
+                        self.logger.debug("resend web : %s/%s data because its outdated" % (resource, obj.name))
             except RuntimeError as e:
                 self.logger.warning(str(e))
 
+        # outside of the lock, waiting for the send budget or the web api must not block the watchers
+        self.send_budgeted_data_to_zabbix(resource, metrics)
+        for obj, action in web_sends:
+            self.send_to_web_api(resource, obj, action)
+
     def delete_object(self, resource_type, resourced_obj):
+        pending = self.debouncer.cancel((resource_type, resourced_obj.uid)) if self.debouncer else None
+        if resourced_obj.is_unsubmitted_web() or (pending is not None and pending['event_type'].lower() == 'added'):
+            # created and deleted within the debounce window, the web api never got the object
+            self.logger.debug('obj >>>type: %s, name: %s/%s<<< deleted before it was sent to the web api' % (
+                resource_type, resourced_obj.name_space, resourced_obj.name))
+            return
         # TODO: trigger zabbix discovery, srsly?
         self.send_to_web_api(resource_type, resourced_obj, "deleted")
 
     def send_zabbix_discovery(self, resource):
         # aggregate data and send to zabbix
+        if self.is_degraded(DISCOVERY_DEFERRED) and self.data['zabbix_discovery_sent'].get(resource) is not None \
+                and self.deferred_discoveries.get(resource, 0) < self.overload_max_deferred_discoveries:
+            # at most overload_max_deferred_discoveries in a row, new objects have to be discovered eventually
+            self.deferred_discoveries[resource] = self.deferred_discoveries.get(resource, 0) + 1
+            self.logger.info('deferring the discovery of %s, overloaded' % resource)
+            return
+        self.deferred_discoveries[resource] = 0
         with self.thread_lock:
             if resource not in self.data:
                 self.logger.warning('send_zabbix_discovery: resource "%s" not in self.data... skipping!' % resource)
                 return
+            objects = list(self.data[resource].objects.values())
+
+        self.load_full_data(resource, [obj for obj in objects if obj.is_incomplete])
+        # a object which could not be loaded is discovered by the next run
+        objects = [obj for obj in objects if not obj.is_incomplete]
+        if objects:
+            # the rows are encoded while they are produced, outside of the lock
+            discovery_data, rows = get_writer().write_discovery(
+                row for obj in objects for row in obj.get_zabbix_discovery_data())
+            STATS.observe('discovery_bytes', len(discovery_data), resource=resource)
+            metric = ZabbixValue(self.zabbix_host, objects[0].discovery_key, discovery_data)
+            self.logger.debug('sending discovery for [%s] with %i rows: %s' % (resource, rows, metric))
+            self.send_discovery_to_zabbix(resource, metric=[metric])
 
-            data = list()
-            for obj_uid, obj in self.data[resource].objects.items():
-                data += obj.get_zabbix_discovery_data()
-
-            if data:
-                metric = obj.get_discovery_for_zabbix(data)
-                self.logger.debug('sending discovery for [%s]: %s' % (resource, metric))
-                self.send_discovery_to_zabbix(resource, metric=[metric])
-
+        with self.thread_lock:
             self.data['zabbix_discovery_sent'][resource] = datetime.now()
 
     def send_object(self, resource, resourced_obj, event_type, send_zabbix_data=False, send_web=False):
-        # send single object for updates
+        if self.debouncer is None:
+            self.send_object_now(resource, resourced_obj, event_type,
+                                 send_zabbix_data=send_zabbix_data, send_web=send_web)
+            return
+
+        # coalesce all changes within the debounce window, the latest state is sent when the window closes
+        if not self.debouncer.schedule((resource, resourced_obj.uid),
+                                       dict(event_type=event_type, send_zabbix_data=send_zabbix_data, send_web=send_web)):
+            self.logger.debug('obj >>>type: %s, name: %s/%s<<< change coalesced into pending send (%is)' % (
+                resource, resourced_obj.name_space, resourced_obj.name, self.debounce_seconds))
+
+    @staticmethod
+    def merge_debounced_sends(pending, new):
+        return dict(
+            # an object created within the window is still new for the web api
+            event_type=pending['event_type'] if pending['event_type'].lower() == 'added' else new['event_type'],
+            send_zabbix_data=pending['send_zabbix_data'] or new['send_zabbix_data'],
+            send_web=pending['send_web'] or new['send_web'],
+        )
+
+    def send_debounced_object(self, key, payload):
+        resource, uid = key
         with self.thread_lock:
-            if send_zabbix_data:
-                if resourced_obj.last_sent_zabbix < datetime.now() - timedelta(seconds=self.rate_limit_seconds):
-                    self.send_data_to_zabbix(resource, obj=resourced_obj)
-                    resourced_obj.last_sent_zabbix = datetime.now()
-                    resourced_obj.is_dirty_zabbix = False
-                else:
-                    self.logger.debug('obj >>>type: %s, name: %s/%s<<< not sending to zabbix! rate limited (%is)' % (
-                        resource, resourced_obj.name_space, resourced_obj.name, self.rate_limit_seconds))
-                    resourced_obj.is_dirty_zabbix = True
-
-            if send_web:
-                if resourced_obj.last_sent_web < datetime.now() - timedelta(seconds=self.rate_limit_seconds):
-                    self.send_to_web_api(resource, resourced_obj, event_type)
-                    resourced_obj.last_sent_web = datetime.now()
-                    if resourced_obj.is_dirty_web is True and not send_zabbix_data:
-                        # only set dirty False if send_to_web_api worked
-                        resourced_obj.is_dirty_web = False
-                else:
-                    self.logger.debug('obj >>>type: %s, name: %s/%s<<< not sending to web! rate limited (%is)' % (
-                        resource, resourced_obj.name_space, resourced_obj.name, self.rate_limit_seconds))
-                    resourced_obj.is_dirty_web = True
+            resourced_obj = self.data[resource].objects.get(uid)
+        if resourced_obj is None:
+            self.logger.debug('obj >>>type: %s, uid: %s<<< vanished before the debounced send' % (resource, uid))
+            return
+        self.send_object_now(resource, resourced_obj, payload['event_type'],
+                             send_zabbix_data=payload['send_zabbix_data'], send_web=payload['send_web'])
+
+    def send_object_now(self, resource, resourced_obj, event_type, send_zabbix_data=False, send_web=False):
+        # send single object for updates
+        metrics = []
+        if send_zabbix_data or send_web:
+            self.load_full_data(resource, [resourced_obj])
+            if resourced_obj.is_incomplete:
+                return
+        if send_zabbix_data:
+            with self.thread_lock:
+                if resource in self.zabbix_resources:
+                    metrics = resourced_obj.take_zabbix_metrics()
+                resourced_obj.last_sent_zabbix = datetime.now()
+                resourced_obj.is_dirty_zabbix = False
+
+        # outside of the lock, a slow zabbix or web api must not block the watchers and the other lanes
+        if metrics:
+            self.send_data_to_zabbix(resource, obj=resourced_obj, metrics=metrics)
+        if send_web and not self.is_degraded(WEB_PAUSED):
+            self.send_to_web_api(resource, resourced_obj, event_type)
 
     def send_heartbeat_info(self, *args):
         result = self.send_to_zabbix([
-            ZabbixMetric(self.zabbix_host, 'check_kubernetesd[discover,api]', int(time.time()))
-        ])
+            ZabbixValue(self.zabbix_host, 'check_kubernetesd[discover,api]', int(time.time()))
+        ], lane='critical')
         if result.failed > 0:
             self.logger.error("failed to send heartbeat to zabbix")
         else:
             self.logger.debug("successfully sent heartbeat to zabbix ")
 
-    def send_to_zabbix(self, metrics):
+        if self.stats_zabbix_enable:
+            self.send_stats_info()
+        if self.overload is not None:
+            self.send_overload_info()
+
+    def send_rollups(self, *args):
+        """ cluster totals, per namespace requests/limits and allocation ratios of nodes and pods """
+        metrics = [ZabbixValue(self.zabbix_host, get_item_key('rollup', 'cluster', metric), value)
+                   for metric, value in sorted(self.rollups.get_cluster_totals().items())]
+
+        namespace_totals = self.rollups.get_namespace_totals()
+        namespaces = sorted(namespace_totals)
+        if namespaces != self.rollups_namespaces_sent or \
+                self.rollups_discovery_sent < datetime.now() - timedelta(seconds=self.discovery_interval):
+            discovery_data = encode_discovery({'{#NAMESPACE}': name_space} for name_space in namespaces)
+            result = self.send_to_zabbix([ZabbixValue(self.zabbix_host, get_item_key('discover', 'namespaces'),
+                                                      discovery_data)], retry=False, lane='bulk')
+            if result.failed == 0:
+                # the items of new namespaces do not exist before the discovery was processed
+                namespace_totals = dict((name_space, totals) for name_space, totals in namespace_totals.items()
+                                        if name_space in (self.rollups_namespaces_sent or []))
+                self.rollups_namespaces_sent = namespaces
+                self.rollups_discovery_sent = datetime.now()
+
+        for name_space, totals in sorted(namespace_totals.items()):
+            metrics += [ZabbixValue(self.zabbix_host, get_item_key('rollup', 'namespace', name_space, metric), value)
+                        for metric, value in sorted(totals.items())]
+
+        result = self.send_to_zabbix(metrics)
+        if result.failed > 0:
+            self.logger.error("failed to send %s of %s rollup items to zabbix" % (result.failed, len(metrics)))
+
+    def send_event_aggregates(self, *args):
+        """ event counts per window by reason, namespace and kind and the objects with the most events """
+        aggregates = self.event_aggregates
+        totals = aggregates.get_totals()
+        values = aggregates.get_discovery_values()
+        # the items of the values of the last discovery exist, values which left it are sent as 0 once more
+        sent = self.events_values_sent or []
+        if values != self.events_values_sent or \
+                self.events_discovery_sent < datetime.now() - timedelta(seconds=self.discovery_interval):
+            discovery = [
+                ZabbixValue(self.zabbix_host, get_item_key('discover', 'event_windows'),
+                            encode_discovery({'{#WINDOW}': str(window)} for window in aggregates.windows)),
+                ZabbixValue(self.zabbix_host, get_item_key('discover', 'events'),
+                            encode_discovery({'{#DIMENSION}': dimension, '{#VALUE}': value, '{#WINDOW}': str(window)}
+                                             for dimension, value in values for window in aggregates.windows)),
+            ]
+            result = self.send_to_zabbix(discovery, retry=False, lane='bulk')
+            if result.failed == 0:
+                self.events_values_sent = values
+                self.events_discovery_sent = datetime.now()
+
+        metrics = []
+        for window in aggregates.windows:
+            window_key = str(window)
+            metrics.append(ZabbixValue(self.zabbix_host, get_item_key('events', 'total', window_key),
+                                       totals[window]['total']))
+            metrics.append(ZabbixValue(self.zabbix_host, get_item_key('events', 'top', window_key),
+                                       json.dumps(aggregates.get_top(window, self.events_top), separators=(',', ':'))))
+            metrics += [ZabbixValue(self.zabbix_host, get_item_key('events', dimension, value, window_key),
+                                    totals[window][dimension].get(value, 0))
+                        for dimension, value in sent]
+
+        result = self.send_to_zabbix(metrics)
+        if result.failed > 0:
+            self.logger.error("failed to send %s of %s event items to zabbix" % (result.failed, len(metrics)))
+
+    def get_stats_metrics(self):
+        stats = dict(
+            events=STATS.get_counter('watch_events_total'),
+            objects=STATS.get_gauge('objects'),
+            event_handler_p95=STATS.get_histogram('watch_event_handler_seconds').percentile(95),
+            lock_wait_p95=STATS.get_histogram('lock_wait_seconds').percentile(95),
+            zabbix_send_p95=STATS.get_histogram('zabbix_send_seconds').percentile(95),
+            zabbix_send_failed=STATS.get_counter('zabbix_send_failed_total'),
+            zabbix_send_errors=STATS.get_counter('zabbix_send_errors_total'),
+            web_api_p95=STATS.get_histogram('web_api_request_seconds').percentile(95),
+            web_api_failed=STATS.get_counter('web_api_failed_total'),
+            web_api_bytes_per_hour=int(STATS.get_counter('web_api_sent_bytes_total') * 3600 /
+                                       max(1.0, time.time() - STATS.started)),
+            retry_buffer_items=STATS.get_gauge('retry_buffer_items'),
+            retry_buffer_dropped=STATS.get_counter('retry_buffer_dropped_total'),
+            watch_reconnects=STATS.get_counter('watch_reconnects_total'),
+            reconcile_missing=STATS.get_counter('reconcile_drift_total', kind=MISSING),
+            reconcile_stale=STATS.get_counter('reconcile_drift_total', kind=STALE),
+            reconcile_vanished=STATS.get_counter('reconcile_drift_total', kind=VANISHED),
+        )
+        for lane in LANES:
+            histogram = STATS.get_histogram('zabbix_send_seconds', lane=lane)
+            stats['zabbix_send_p95_%s' % lane] = histogram.percentile(95)
+            stats['zabbix_send_p99_%s' % lane] = histogram.percentile(99)
+        return [ZabbixValue(self.zabbix_host, get_item_key('stats', k), v) for k, v in stats.items()]
+
+    def send_stats_info(self):
+        result = self.send_to_zabbix(self.get_stats_metrics())
+        if result.failed > 0:
+            self.logger.error("failed to send self monitoring stats to zabbix")
+        else:
+            self.logger.debug("successfully sent self monitoring stats to zabbix")
+
+    def send_to_zabbix(self, metrics, retry=True, lane='normal'):
+        """ if zabbix is not reachable the metrics are kept in the retry buffer (retry=True)
+
+            lane is the priority of the send, see zabbix_pool.LANES
+        """
         if self.zabbix_dry_run:
             result = DryResult()
+            result.processed = result.total = len(metrics)
             result.failed = 0
             if self.debug_k8s_events:
                 self.logger.debug('===> Sending to zabbix: %s\n' % metrics)
         else:
+            started = time.perf_counter()
             try:
-                result = self.zabbix_sender.send(metrics)
+                result = self.zabbix_sender.send(metrics, lane=lane)
+                STATS.inc('zabbix_send_processed_total', result.processed)
+                STATS.inc('zabbix_send_failed_total', result.failed)
             except Exception as e:
                 self.logger.error(e)
+                STATS.inc('zabbix_send_errors_total')
                 result = DryResult()
-                result.failed = 1
+                result.processed = result.failed = 0
+                result.total = len(metrics)
+                result.undelivered = metrics
+                result.error = e
+                if isinstance(e, ZabbixSendError):
+                    # the chunks delivered before the failed one must not be sent again
+                    result.processed, result.failed = e.result.processed, e.result.failed
+                    result.undelivered = e.undelivered
+                    result.error = e.error
+                    STATS.inc('zabbix_send_processed_total', result.processed)
+                    STATS.inc('zabbix_send_failed_total', result.failed)
+                result.failed += len(result.undelivered)
+                if retry and self.retry_buffer is not None:
+                    self.retry_buffer.add(result.undelivered)
+            STATS.observe('zabbix_send_seconds', time.perf_counter() - started, lane=lane)
+        STATS.inc('zabbix_send_items_total', len(metrics))
         return result
 
     def send_discovery_to_zabbix(self, resource, metric=None, obj=None):
@@ -489,13 +1230,15 @@ class CheckKubernetesDaemon:
                 return
 
             discovery_key = 'check_kubernetesd[discover,' + resource + ']'
-            result = self.send_to_zabbix([ZabbixMetric(self.zabbix_host, discovery_key, discovery_data)])
+            # a outdated discovery would bring back deleted objects, it is resent periodically anyway
+            result = self.send_to_zabbix([ZabbixValue(self.zabbix_host, discovery_key, discovery_data)], retry=False,
+                                         lane='bulk')
             if result.failed > 0:
                 self.logger.error("failed to sent zabbix discovery: %s : >>>%s<<<" % (discovery_key, discovery_data))
             elif self.zabbix_debug:
                 self.logger.info("successfully sent zabbix discovery: %s  >>>>%s<<<" % (discovery_key, discovery_data))
         elif metric:
-            result = self.send_to_zabbix(metric)
+            result = self.send_to_zabbix(metric, retry=False, lane='bulk')
 
             if result.failed > 0:
                 self.logger.error("failed to sent mass zabbix discovery: >>>%s<<<" % metric)
@@ -504,12 +1247,26 @@ class CheckKubernetesDaemon:
         else:
             self.logger.warning('No obj or metrics found for send_discovery_to_zabbix [%s]' % resource)
 
-    def send_data_to_zabbix(self, resource, obj=None, metrics=[]):
+    def send_budgeted_data_to_zabbix(self, resource, metrics):
+        """ sends periodic bulk data in chunks within resend_max_metrics_per_second, must not be called with the lock held """
+        if resource in CRITICAL_RESOURCES:
+            # few items, must not queue behind the resends of other resources
+            self.send_data_to_zabbix(resource, metrics=metrics)
+            return
+        chunk_size = max(1, int(self.resend_budget.burst))
+        for idx in range(0, len(metrics), chunk_size):
+            chunk = metrics[idx:idx + chunk_size]
+            STATS.observe('resend_budget_wait_seconds', self.resend_budget.acquire(len(chunk), exit_flag))
+            self.send_data_to_zabbix(resource, metrics=chunk, lane='bulk')
+
+    def send_data_to_zabbix(self, resource, obj=None, metrics=[], lane=None):
         if resource not in self.zabbix_resources:
             return
+        if lane is None:
+            lane = 'critical' if resource in CRITICAL_RESOURCES else 'normal'
 
         if obj and len(metrics) == 0:
-            metrics = obj.get_zabbix_metrics()
+            metrics = obj.take_zabbix_metrics()
 
         if len(metrics) == 0 and obj:
             self.logger.debug('No zabbix metrics to send for %s: %s' % (obj.uid, metrics))
@@ -520,13 +1277,13 @@ class CheckKubernetesDaemon:
 
         if self.zabbix_single_debug:
             for metric in metrics:
-                result = self.send_to_zabbix([metric])
+                result = self.send_to_zabbix([metric], lane=lane)
                 if result.failed > 0:
                     self.logger.error("failed to sent zabbix items: %s", metric)
                 else:
                     self.logger.info("successfully sent zabbix items: %s", metric)
         else:
-            result = self.send_to_zabbix(metrics)
+            result = self.send_to_zabbix(metrics, lane=lane)
             if result.failed > 0:
                 self.logger.error("failed to sent %s zabbix items, processed %s items [%s: %s]"
                                   % (result.failed, result.processed, resource, obj.name if obj else 'metrics'))
@@ -534,15 +1291,77 @@ class CheckKubernetesDaemon:
             else:
                 self.logger.debug("successfully sent %s zabbix items [%s: %s]" % (len(metrics), resource, obj.name if obj else 'metrics'))
 
-    def send_to_web_api(self, resource, obj, action):
-        if resource not in self.web_api_resources:
-            return
+    def is_web_api_resource(self, resource):
+        return self.web_api_enable and resource in self.web_api_resources
 
-        if self.web_api_enable:
-            api = self.get_web_api()
-            data_to_send = obj.resource_data
-            data_to_send['cluster'] = self.web_api_cluster
+    def send_to_web_api(self, resource, obj, action):
+        """ modified objects known to the web api are sent as merge patch against the acknowledged state,
+            unchanged objects are skipped
+
+            the request is prepared and acknowledged under thread_lock and sent outside of it, web_lock keeps
+            the requests in order so every merge patch is based on the acknowledged state.
+            Returns False if the web api did not accept the object, it stays dirty
+        """
+        if not self.is_web_api_resource(resource):
+            if resource in self.web_api_resources:
+                self.logger.debug("suppressing submission of %s %s/%s" % (resource, obj.name_space, obj.name))
+            return True
+
+        deleted = action.lower() == 'deleted'
+        with self.web_lock:
+            with self.thread_lock:
+                if not deleted:
+                    # the latest state, the object may have changed or vanished since the send was scheduled
+                    obj = self.data[resource].objects.get(obj.uid) if resource in self.data else None
+                    if obj is None:
+                        return True
+                request = self.get_web_request(resource, obj, action)
+                acked_data = obj.web_acked_data
+
+            sent = True
+            if request is not None:
+                sent, acked_data = self.send_web_request(resource, *request)
+            if deleted:
+                return sent
 
-            api.send_data(resource, data_to_send, action)
-        else:
-            self.logger.debug("suppressing submission of %s %s/%s" % (resource, obj.name_space, obj.name))
+            with self.thread_lock:
+                now = datetime.now()
+                obj.last_sent_web = now
+                # a failed send is repeated by the next resend
+                obj.is_dirty_web = not sent
+                obj.web_acked_data = acked_data
+                current = self.data[resource].objects.get(obj.uid) if resource in self.data else None
+                if current is not None and current is not obj:
+                    # replaced while it was sent, the newer state stays dirty
+                    current.last_sent_web = now
+                    current.web_acked_data = acked_data
+        return sent
+
+    def get_web_request(self, resource, obj, action):
+        """ (action, data, patch) of the request which sends obj, None if the web api has this state already """
+        if action.lower() == 'deleted':
+            # the object is identified by its metadata, a deleted object can not be loaded anymore
+            return action, dict(name=obj.name, name_space=obj.name_space, cluster=self.web_api_cluster), None
+
+        data_to_send = obj.resource_data
+        data_to_send['cluster'] = self.web_api_cluster
+        if self.web_api_delta_updates and action.lower() == 'modified' and obj.web_acked_data is not None:
+            patch = create_merge_patch(obj.web_acked_data, remove_nulls(data_to_send))
+            if not patch:
+                STATS.inc('web_api_unchanged_total', resource=resource)
+                return None
+            return 'patched', data_to_send, patch
+        return action, data_to_send, None
+
+    def send_web_request(self, resource, action, data, patch):
+        """ returns if the web api accepted the request and the state it acknowledged, None if it is unknown """
+        api = self.get_web_api()
+        status = api.send_data(resource, data, action, patch=patch)
+        if status == 404 and action == 'patched':
+            # the web api lost the object, it gets the full state right away
+            action = 'modified'
+            status = api.send_data(resource, data, action)
+        if status is None or status >= 400:
+            # the next send is the full state
+            return False, None
+        return True, None if action.lower() == 'deleted' else remove_nulls(data)
@@ -0,0 +1,148 @@
+import math
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """ hashed timer wheel, scheduling, cancelling and expiring a timer are O(1)
+
+        timers are rounded up to the next tick, timers further away than one
+        revolution of the wheel stay in their slot until their tick is reached
+    """
+
+    def __init__(self, tick=0.25, slots=1024, now=None):
+        self.tick = float(tick)
+        self.slots = [dict() for _ in range(int(slots))]
+        self.targets = dict()
+        self.current_tick = self.to_tick(time.monotonic() if now is None else now)
+
+    def to_tick(self, timestamp):
+        return int(math.floor(timestamp / self.tick))
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __contains__(self, key):
+        return key in self.targets
+
+    def schedule(self, key, delay, payload, now=None):
+        now = time.monotonic() if now is None else now
+        target = max(self.to_tick(now + delay + self.tick - 1e-9), self.current_tick + 1)
+        self.cancel(key)
+        self.targets[key] = target
+        self.slots[target % len(self.slots)][key] = (target, payload)
+
+    def get(self, key):
+        if key not in self.targets:
+            return None
+        return self.slots[self.targets[key] % len(self.slots)][key][1]
+
+    def update(self, key, payload):
+        """ replaces the payload without changing the expiry """
+        slot = self.slots[self.targets[key] % len(self.slots)]
+        slot[key] = (slot[key][0], payload)
+
+    def cancel(self, key):
+        """ returns the payload of the cancelled timer, None if none was scheduled """
+        target = self.targets.pop(key, None)
+        if target is None:
+            return None
+        return self.slots[target % len(self.slots)].pop(key)[1]
+
+    def advance(self, now=None):
+        """ returns the list of (key, payload) of all expired timers """
+        now_tick = self.to_tick(time.monotonic() if now is None else now)
+        expired = []
+        if now_tick - self.current_tick >= len(self.slots):
+            # one or more complete revolutions, check every slot once
+            ticks = range(now_tick - len(self.slots) + 1, now_tick + 1)
+        else:
+            ticks = range(self.current_tick + 1, now_tick + 1)
+        for tick in ticks:
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            for key, (target, payload) in list(slot.items()):
+                if target <= now_tick:
+                    del slot[key]
+                    del self.targets[key]
+                    expired.append((key, payload))
+        self.current_tick = max(self.current_tick, now_tick)
+        return expired
+
+    def pop_all(self):
+        expired = []
+        for slot in self.slots:
+            expired += [(key, payload) for key, (target, payload) in slot.items()]
+            slot.clear()
+        self.targets.clear()
+        return expired
+
+
+class Debouncer(threading.Thread):
+    """ trailing edge debounce per key
+
+        the first change of a key opens a window of window_seconds, all changes within the
+        window are coalesced (merge_func(old_payload, new_payload)) and callback(key, payload)
+        is called once when the window closes, clock can be replaced for replaying recorded events
+    """
+
+    def __init__(self, window_seconds, exit_flag, callback, merge_func=None, tick=0.25, name='Debouncer',
+                 clock=time.monotonic):
+        threading.Thread.__init__(self, target=self.run, name=name)
+        self.daemon = True
+        self.window_seconds = float(window_seconds)
+        self.exit_flag = exit_flag
+        self.callback = callback
+        self.merge_func = merge_func
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.wheel = TimerWheel(tick=tick, slots=max(64, int(math.ceil(self.window_seconds / tick)) * 2), now=clock())
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def count_pending(self):
+        return len(self.wheel)
+
+    def schedule(self, key, payload):
+        """ returns False if the change was coalesced into a pending window """
+        with self.lock:
+            pending = self.wheel.get(key)
+            if pending is not None:
+                self.wheel.update(key, self.merge_func(pending, payload) if self.merge_func else payload)
+                return False
+            self.wheel.schedule(key, self.window_seconds, payload, now=self.clock())
+            return True
+
+    def set_window(self, window_seconds):
+        """ applies to windows opened from now on """
+        self.window_seconds = float(window_seconds)
+
+    def cancel(self, key):
+        """ returns the pending payload of key, None if no window is open """
+        with self.lock:
+            return self.wheel.cancel(key)
+
+    def run_expired(self):
+        with self.lock:
+            expired = self.wheel.advance(self.clock())
+        self.dispatch(expired)
+
+    def flush(self):
+        with self.lock:
+            expired = self.wheel.pop_all()
+        self.dispatch(expired)
+
+    def dispatch(self, expired):
+        for key, payload in expired:
+            try:
+                self.callback(key, payload)
+            except Exception as e:
+                self.logger.exception('debounced send of %s failed: %s' % (key, e))
+
+    def run(self):
+        self.logger.info('starting debouncer with a window of %.1fs' % self.window_seconds)
+        while not self.exit_flag.wait(self.wheel.tick):
+            self.run_expired()
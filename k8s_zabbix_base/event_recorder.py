@@ -0,0 +1,82 @@
+import gzip
+import json
+import time
+import logging
+import threading
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+
+class EventRecorder:
+    """ writes raw watch events as gzip compressed newline delimited json
+
+        each line contains the timestamp, the resource, the event type, the model class
+        used for decoding (None for metadata only watches) and the raw object from the apiserver
+    """
+
+    def __init__(self, path, flush_interval=5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.fh = gzip.open(path, 'at', encoding='utf-8')
+        self.last_flush = time.time()
+        self.events = 0
+        logger.info('recording watch events to %s' % path)
+
+    def record(self, resource, event):
+        event_object = event['object']
+        self.write(resource, event['type'], None if isinstance(event_object, dict) else event_object.__class__.__name__,
+                   event.get('raw_object', event_object))
+
+    def record_raw(self, resource, line, kind):
+        """ a undecoded line of the watch stream, kind is the model class the line will be decoded to """
+        raw_event = json.loads(line)
+        self.write(resource, raw_event['type'], kind or None, raw_event['object'])
+
+    def write(self, resource, event_type, kind, raw_object):
+        line = json.dumps(dict(
+            ts=time.time(),
+            resource=resource,
+            type=event_type,
+            kind=kind,
+            object=raw_object,
+        ), separators=(',', ':'))
+
+        with self.lock:
+            self.fh.write(line + '\n')
+            self.events += 1
+            if time.time() - self.last_flush > self.flush_interval:
+                self.fh.flush()
+                self.last_flush = time.time()
+
+    def close(self):
+        with self.lock:
+            self.fh.close()
+
+
+def read_events(path):
+    """ yields the recorded events as dicts """
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        try:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # the last line of a file which is still written may be incomplete
+                    logger.warning('skipping invalid line in %s' % path)
+        except EOFError:
+            logger.warning('%s was not closed properly, stopping at the last complete event' % path)
+
+
+def to_watch_event(api_client, recorded_event):
+    """ decodes a recorded event the same way kubernetes.watch.Watch does """
+    raw_object = recorded_event['object']
+    if recorded_event['kind']:
+        event_object = api_client.deserialize(SimpleNamespace(data=json.dumps(raw_object)), recorded_event['kind'])
+    else:
+        event_object = raw_object
+    return dict(type=recorded_event['type'], object=event_object, raw_object=raw_object)
@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import time
+import json
+import zlib
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from k8s_zabbix_base.stats import STATS
+from k8s_zabbix_base.event_recorder import to_watch_event
+from k8sobjects.k8sobject import K8sResourceManager, ZabbixValue, project_object
+
+logger = logging.getLogger(__name__)
+
+# the apiserver writes the name as first field of the metadata
+NAME_PATTERN = re.compile(r'"metadata":\s*\{\s*"name":\s*"((?:[^"\\]|\\.)*)"')
+
+# state of a worker process, set by init_worker
+worker = dict()
+
+
+def watch_parent(parent_pid):
+    """ the workers are not stopped if the daemon is killed or leaves with os._exit() """
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def init_worker(zabbix_host):
+    from kubernetes import client
+    thread = threading.Thread(target=watch_parent, args=(os.getppid(),), name='ParentWatcher')
+    thread.daemon = True
+    thread.start()
+    # only used to decode the watch events to models, never connects to the apiserver
+    worker['api_client'] = client.ApiClient()
+    worker['zabbix_host'] = zabbix_host
+    worker['managers'] = dict()
+
+
+def get_worker_manager(resource):
+    manager = worker['managers'].get(resource)
+    if manager is None:
+        manager = worker['managers'][resource] = K8sResourceManager(resource, zabbix_host=worker['zabbix_host'])
+    return manager
+
+
+def process_event(resource, kind, line):
+    """ raw watch line -> (event type, object dict, checksum, zabbix metrics, error)
+
+        the object is decoded exactly like kubernetes.watch.Watch and to_dict() in the daemon do,
+        metrics are (key, value) tuples, the daemon adds the host
+    """
+    raw_event = json.loads(line)
+    event_type = raw_event['type']
+    try:
+        event = to_watch_event(worker['api_client'], dict(type=event_type, object=raw_event['object'], kind=kind))
+        obj = event['object'] if isinstance(event['object'], dict) else event['object'].to_dict()
+        obj = project_object(obj)
+
+        manager = get_worker_manager(resource)
+        if not manager.resource_class or event_type not in ['ADDED', 'MODIFIED', 'DELETED']:
+            return event_type, obj, None, None, None
+        resourced_obj = manager.resource_class(obj, resource, manager=manager)
+        metrics = None
+        if event_type != 'DELETED' and not resourced_obj.is_metadata_only:
+            # metadata only objects would load the full object from the apiserver
+            metrics = tuple((metric.key, metric.value) for metric in resourced_obj.get_zabbix_metrics())
+        return event_type, obj, resourced_obj.data_checksum, metrics, None
+    except Exception as e:
+        return event_type, None, None, None, '%s: %s' % (e.__class__.__name__, e)
+
+
+def process_batch(events):
+    return [process_event(*event) for event in events]
+
+
+def get_partition_key(line):
+    """ all events of a object are handled by the same worker, in order """
+    m = NAME_PATTERN.search(line)
+    return m.group(1) if m else line
+
+
+class IngestPool:
+    """ decodes watch events, calculates checksums and zabbix metrics in worker processes
+
+        the events are partitioned by the object name, every partition is a single worker process,
+        so the events of one object are processed and applied in the order of the watch stream.
+        events queued while the workers are busy are sent as one batch to reduce the ipc overhead.
+        results are applied by one thread per partition, in the main process
+    """
+
+    def __init__(self, workers, zabbix_host, batch_size=100, queue_size=10000, exit_flag=None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.exit_flag = exit_flag or threading.Event()
+        self.incoming = queue.Queue(maxsize=queue_size)
+        self.zabbix_host = zabbix_host
+        self.executors = [self.create_executor() for _ in range(workers)]
+        self.executors_lock = threading.Lock()
+        self.pending = [queue.Queue() for _ in range(workers)]
+        STATS.set_gauge('ingest_queue', self.incoming.qsize)
+
+        self.threads = [threading.Thread(target=self.dispatch, name='IngestDispatcher')]
+        for partition in range(workers):
+            self.threads.append(threading.Thread(target=self.apply, args=(partition,),
+                                                 name='IngestApplier-%i' % partition))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+        logger.info('started %i ingestion worker processes' % workers)
+
+    def create_executor(self):
+        # spawn, forking the threaded daemon could copy held locks into the workers
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_worker, initargs=(self.zabbix_host,))
+
+    def replace_executor(self, partition, broken):
+        """ the dispatcher and the applier can both notice a dead worker, it is replaced once """
+        with self.executors_lock:
+            if self.executors[partition] is broken:
+                logger.error('ingestion worker %i died, starting a new one' % partition)
+                self.executors[partition] = self.create_executor()
+            return self.executors[partition]
+
+    def submit_batch(self, partition, events):
+        executor = self.executors[partition]
+        try:
+            return executor.submit(process_batch, events)
+        except BrokenProcessPool:
+            return self.replace_executor(partition, executor).submit(process_batch, events)
+
+    def submit(self, resource, kind, line, callback):
+        """ blocks if the workers are behind, the watch streams are slowed down instead of growing the queue """
+        self.incoming.put((resource, kind, line, callback, time.monotonic()))
+
+    def get_partition(self, line):
+        return zlib.crc32(get_partition_key(line).encode('utf-8')) % self.workers
+
+    def dispatch(self):
+        while not self.exit_flag.is_set():
+            try:
+                batch = [self.incoming.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.incoming.get_nowait())
+                except queue.Empty:
+                    break
+            STATS.observe('ingest_batch_events', len(batch))
+
+            partitions = dict()
+            for resource, kind, line, callback, queued in batch:
+                events, callbacks = partitions.setdefault(self.get_partition(line), ([], []))
+                events.append((resource, kind, line))
+                callbacks.append((resource, callback, queued))
+            for partition, (events, callbacks) in partitions.items():
+                self.pending[partition].put((self.submit_batch(partition, events), events, callbacks))
+
+    def apply(self, partition):
+        pending = self.pending[partition]
+        while not self.exit_flag.is_set():
+            try:
+                future, events, callbacks = pending.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    # the worker crashed, the batch is decoded once more by a new worker before the following
+                    # batches are applied, a lost DELETED event would only be repaired by the reconciliation
+                    logger.warning('ingestion worker %i died, resubmitting %i events' % (partition, len(events)))
+                    results = self.submit_batch(partition, events).result()
+            except Exception as e:
+                logger.error('ingestion worker %i failed for %i events: %s' % (partition, len(callbacks), e))
+                STATS.inc('ingest_errors_total', len(callbacks))
+                continue
+            now = time.monotonic()
+            for (resource, callback, queued), result in zip(callbacks, results):
+                # time from reading the event from the watch stream until it is applied
+                STATS.observe('ingest_lag_seconds', now - queued)
+                try:
+                    callback(resource, *result)
+                except Exception as e:
+                    logger.exception('failed to apply %s event: %s' % (resource, e))
+
+    def shutdown(self):
+        self.exit_flag.set()
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+
+
+def intern_metrics(zabbix_host, metrics):
+    """ (key, value) tuples of a worker -> ZabbixValue, the keys are interned like get_item_key does """
+    return [ZabbixValue(zabbix_host, sys.intern(key), value) for key, value in metrics]
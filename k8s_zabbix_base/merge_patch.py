@@ -0,0 +1,40 @@
+""" json merge patches (RFC 7386) between the web api states of a object """
+
+
+def create_merge_patch(old, new):
+    """ the merge patch which turns old into new, a empty dict if both are equal
+
+        nested dicts are patched recursively, all other values (including lists) are replaced,
+        removed keys are null
+    """
+    patch = dict()
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                patch[key] = create_merge_patch(old[key], value)
+            else:
+                patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def remove_nulls(document):
+    """ the document as the web api keeps it, null values of nested dicts are not stored """
+    return apply_merge_patch({}, document)
+
+
+def apply_merge_patch(target, patch):
+    """ the document after applying the merge patch, target is not modified """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else dict()
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
@@ -0,0 +1,95 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# resources whose metadata can be listed (i.e. by the reconciliation): resource -> (api path prefix, plural)
+METADATA_LIST_RESOURCES = dict(
+    nodes=('/api/v1', 'nodes'),
+    services=('/api/v1', 'services'),
+    secrets=('/api/v1', 'secrets'),
+    pods=('/api/v1', 'pods'),
+    deployments=('/apis/apps/v1', 'deployments'),
+    daemonsets=('/apis/apps/v1', 'daemonsets'),
+    statefulsets=('/apis/apps/v1', 'statefulsets'),
+    ingresses=('/apis/extensions/v1beta1', 'ingresses'),
+)
+
+# resources which can be watched as PartialObjectMetadata, their classes use only the metadata or
+# K8sObject.full_data, nodes, pods and deployments read their spec and status on every change
+METADATA_RESOURCES = dict((resource, METADATA_LIST_RESOURCES[resource])
+                          for resource in ['services', 'secrets', 'daemonsets', 'statefulsets', 'ingresses'])
+
+# functions to fetch the full object lazily if a k8sobject class needs more than the metadata
+FULL_OBJECT_READ_FUNCTIONS = dict(
+    services='read_namespaced_service',
+    secrets='read_namespaced_secret',
+    pods='read_namespaced_pod',
+    deployments='read_namespaced_deployment',
+    daemonsets='read_namespaced_daemon_set',
+    statefulsets='read_namespaced_stateful_set',
+    ingresses='read_namespaced_ingress',
+    nodes='read_node',
+)
+
+METADATA_ACCEPT_HEADER = 'application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json'
+METADATA_WATCH_ACCEPT_HEADER = 'application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1,application/json'
+
+QUERY_PARAMETERS = dict(
+    watch='watch',
+    timeout_seconds='timeoutSeconds',
+    label_selector='labelSelector',
+    field_selector='fieldSelector',
+    resource_version='resourceVersion',
+    limit='limit',
+    _continue='continue',
+)
+
+
+def get_metadata_list_function(api_client, resource, name_space=None):
+    """ list function usable with kubernetes.watch.Watch().stream() which only transfers object metadata
+
+        the watch stream yields plain dicts of kind PartialObjectMetadata, the apiserver
+        falls back to full objects if it does not support the metadata transformation
+    """
+    api_prefix, plural = METADATA_LIST_RESOURCES[resource]
+    if name_space is None:
+        path = '%s/%s' % (api_prefix, plural)
+    else:
+        path = '%s/namespaces/%s/%s' % (api_prefix, name_space, plural)
+
+    def list_metadata(**kwargs):
+        query_params = []
+        for arg, param in QUERY_PARAMETERS.items():
+            if kwargs.get(arg) is not None:
+                query_params.append((param, kwargs[arg]))
+
+        if kwargs.get('watch'):
+            accept = METADATA_WATCH_ACCEPT_HEADER
+        else:
+            accept = METADATA_ACCEPT_HEADER
+
+        return api_client.call_api(path, 'GET',
+                                   path_params={},
+                                   query_params=query_params,
+                                   header_params={'Accept': accept},
+                                   response_type='object',
+                                   auth_settings=['BearerToken'],
+                                   _return_http_data_only=True,
+                                   _preload_content=kwargs.get('_preload_content', True),
+                                   _request_timeout=kwargs.get('_request_timeout'))
+
+    list_metadata.__name__ = 'list_%s_metadata' % plural
+    return list_metadata
+
+
+def get_full_object_loader(get_api_for_resource, request_timeout=None):
+    """ returns a function which fetches the complete object as dict, like the watch stream does """
+
+    def load_full_object(resource, name_space, name):
+        api = get_api_for_resource(resource)
+        logger.debug('lazy loading full object for [%s] %s/%s' % (resource, name_space, name))
+        read_func = getattr(api, FULL_OBJECT_READ_FUNCTIONS[resource])
+        args = [name] if name_space is None else [name, name_space]
+        return read_func(*args, _request_timeout=request_timeout).to_dict()
+
+    return load_full_object
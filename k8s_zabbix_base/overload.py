@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+
+from k8s_zabbix_base.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+# every level includes the degradations of the levels below
+LEVELS = ['normal', 'web_paused', 'debounce_widened', 'containers_aggregated', 'discovery_deferred']
+WEB_PAUSED = 1
+DEBOUNCE_WIDENED = 2
+CONTAINERS_AGGREGATED = 3
+DISCOVERY_DEFERRED = 4
+
+
+def get_rss_bytes():
+    """ resident memory of the process, None if /proc is not available """
+    try:
+        with open('/proc/self/statm', 'r') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class OverloadController:
+    """ degrades the daemon in steps (see LEVELS) while the event processing falls behind
+
+        every update compares the signals of the last interval with their limits, the pressure is
+        the highest ratio:
+
+        * backlog: watch events queued for the ingestion workers
+        * lag: p95 of the time events waited in the ingestion queue
+        * busy: share of the interval spent in the watch event handlers (all handlers share one GIL)
+        * memory: resident memory of the process in MiB
+
+        a pressure >= 1 raises the level by one per update, the level is lowered by one after
+        recover_updates updates in a row with a pressure below recover_ratio
+    """
+
+    def __init__(self, max_backlog=5000, max_lag_seconds=30, max_busy_ratio=0.9, max_memory_mb=0,
+                 recover_ratio=0.5, recover_updates=3, rss_func=get_rss_bytes):
+        self.limits = dict(backlog=float(max_backlog), lag=float(max_lag_seconds), busy=float(max_busy_ratio),
+                           memory=float(max_memory_mb))
+        self.recover_ratio = recover_ratio
+        self.recover_updates = recover_updates
+        self.rss_func = rss_func
+        self.level = 0
+        self.pressure = 0.0
+        self.signals = dict()
+        self.calm_updates = 0
+        self.last_sample = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        STATS.set_gauge('overload_level', lambda: self.level)
+
+    def add_listener(self, func):
+        """ func(level) is called after every level change """
+        self.listeners.append(func)
+
+    def is_active(self, level):
+        return self.level >= level
+
+    @property
+    def level_name(self):
+        return LEVELS[self.level]
+
+    def sample(self):
+        return dict(
+            time=time.monotonic(),
+            handler=STATS.get_histogram('watch_event_handler_seconds'),
+            lag=STATS.get_histogram('ingest_lag_seconds'),
+            backlog=STATS.get_gauge('ingest_queue'),
+            memory=self.rss_func() if self.limits['memory'] > 0 else None,
+        )
+
+    def get_signals(self, current, last):
+        seconds = max(current['time'] - last['time'], 1e-3)
+        signals = dict(
+            backlog=current['backlog'],
+            lag=current['lag'].since(last['lag']).percentile(95),
+            busy=(current['handler'].sum - last['handler'].sum) / seconds,
+        )
+        if current['memory'] is not None:
+            signals['memory'] = current['memory'] / 1024.0 / 1024.0
+        return signals
+
+    def get_pressure(self, signals):
+        return max([0.0] + [value / self.limits[name] for name, value in signals.items() if self.limits[name] > 0])
+
+    def update(self):
+        """ returns True if the level changed """
+        current = self.sample()
+        with self.lock:
+            last, self.last_sample = self.last_sample, current
+            if last is None:
+                return False
+            self.signals = self.get_signals(current, last)
+            self.pressure = self.get_pressure(self.signals)
+
+            level = self.level
+            if self.pressure >= 1.0:
+                self.calm_updates = 0
+                level = min(level + 1, len(LEVELS) - 1)
+            elif self.pressure < self.recover_ratio:
+                self.calm_updates += 1
+                if self.calm_updates >= self.recover_updates:
+                    self.calm_updates = 0
+                    level = max(level - 1, 0)
+            else:
+                self.calm_updates = 0
+            if level == self.level:
+                return False
+            logger.warning('overload level %i -> %i (%s), pressure %.2f %s' % (
+                self.level, level, LEVELS[level], self.pressure,
+                ', '.join('%s=%.2f' % item for item in sorted(self.signals.items()))))
+            self.level = level
+            STATS.inc('overload_level_changes_total')
+
+        for func in self.listeners:
+            try:
+                func(level)
+            except Exception as e:
+                logger.exception('applying overload level %i failed: %s' % (level, e))
+        return True
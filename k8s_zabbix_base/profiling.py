@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+from k8sobjects.k8sobject import K8S_RESOURCES
+
+logger = logging.getLogger(__name__)
+
+K8SOBJECTS_DIR = os.sep + 'k8sobjects' + os.sep
+CLASS_NAMES = dict((module, module.capitalize()) for module in K8S_RESOURCES.values())
+CLASS_NAMES['k8sobject'] = 'K8sObject/K8sResourceManager'
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return '%s (%s:%i)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def k8sobjects_class(traceback):
+    """ first k8sobjects class in the traceback of an allocation (most recent call first) """
+    for frame in reversed(traceback):
+        if K8SOBJECTS_DIR in frame.filename:
+            module = os.path.splitext(os.path.basename(frame.filename))[0]
+            return CLASS_NAMES.get(module, module)
+    return None
+
+
+class Profiler:
+    """ on demand profiling, nothing is running or traced until a profile is requested
+
+        - cpu profile: samples the stacks of all threads for n seconds (statistical profile)
+        - memory profile: traces allocations for n seconds and reports the growth per allocation site
+          and per k8sobjects class
+    """
+
+    def __init__(self, output_dir, default_seconds=30, max_seconds=300, sample_interval=0.005, traceback_limit=25,
+                 top=30):
+        self.output_dir = output_dir
+        self.default_seconds = int(default_seconds)
+        self.max_seconds = int(max_seconds)
+        self.sample_interval = float(sample_interval)
+        self.traceback_limit = int(traceback_limit)
+        self.top = int(top)
+        self.cpu_lock = threading.Lock()
+        self.memory_lock = threading.Lock()
+
+    def get_output_file(self, kind, suffix):
+        return os.path.join(self.output_dir, 'k8s-zabbix-%s-%s.%s' % (kind, time.strftime('%Y%m%d-%H%M%S'), suffix))
+
+    def get_seconds(self, seconds):
+        """ the requested duration limited to 1..max_seconds, the default for missing or invalid values """
+        try:
+            seconds = int(seconds or self.default_seconds)
+        except (TypeError, ValueError):
+            seconds = self.default_seconds
+        return max(1, min(seconds, self.max_seconds))
+
+    def start_in_background(self, method, seconds=None):
+        """ used by signal handlers, profiling must not block the interrupted thread """
+        thread = threading.Thread(target=method, kwargs=dict(seconds=seconds), name='Profiler')
+        thread.daemon = True
+        thread.start()
+
+    def cpu_profile(self, seconds=None):
+        seconds = self.get_seconds(seconds)
+        if not self.cpu_lock.acquire(blocking=False):
+            logger.warning('cpu profile already running, ignoring request')
+            return 'cpu profile already running\n'
+
+        try:
+            logger.info('starting cpu profile of all threads for %is' % seconds)
+            own_ident = threading.get_ident()
+            stacks = Counter()
+            own_time = Counter()
+            total_time = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                thread_names = dict((t.ident, t.name) for t in threading.enumerate())
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_label(frame))
+                        frame = frame.f_back
+                    if not stack:
+                        continue
+                    own_time[stack[0]] += 1
+                    for label in set(stack):
+                        total_time[label] += 1
+                    stack.append(thread_names.get(ident, str(ident)))
+                    stacks[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(self.sample_interval)
+        finally:
+            self.cpu_lock.release()
+
+        report = ['cpu profile: %i samples over %is of all threads (interval %.3fs)' % (samples, seconds, self.sample_interval),
+                  '', 'top %i by own samples:' % self.top]
+        report += ['%8i  %s' % (count, label) for label, count in own_time.most_common(self.top)]
+        report += ['', 'top %i by cumulative samples:' % self.top]
+        report += ['%8i  %s' % (count, label) for label, count in total_time.most_common(self.top)]
+        report = '\n'.join(report) + '\n'
+
+        report_file = self.get_output_file('cpu-profile', 'txt')
+        collapsed_file = self.get_output_file('cpu-profile', 'collapsed')
+        with open(report_file, 'w') as fh:
+            fh.write(report)
+        with open(collapsed_file, 'w') as fh:
+            # flamegraph.pl/speedscope compatible collapsed stacks
+            for stack, count in stacks.most_common():
+                fh.write('%s %i\n' % (stack, count))
+        logger.info('cpu profile written to %s and %s' % (report_file, collapsed_file))
+        return report
+
+    def memory_profile(self, seconds=None):
+        seconds = self.get_seconds(seconds)
+        if not self.memory_lock.acquire(blocking=False):
+            logger.warning('memory profile already running, ignoring request')
+            return 'memory profile already running\n'
+
+        try:
+            already_tracing = tracemalloc.is_tracing()
+            if not already_tracing:
+                tracemalloc.start(self.traceback_limit)
+            logger.info('starting memory profile for %is' % seconds)
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            before = tracemalloc.take_snapshot().filter_traces(filters)
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot().filter_traces(filters)
+            traced_current, traced_peak = tracemalloc.get_traced_memory()
+            if not already_tracing:
+                tracemalloc.stop()
+        finally:
+            self.memory_lock.release()
+
+        report = ['memory profile: allocation growth over %is (traced current %i KiB, peak %i KiB)' % (
+            seconds, traced_current / 1024, traced_peak / 1024), '', 'growth per k8sobjects class:']
+
+        class_sizes = dict()
+        for sign, snapshot in ((-1, before), (1, after)):
+            for stat in snapshot.statistics('traceback'):
+                class_name = k8sobjects_class(stat.traceback) or '<other>'
+                size, count = class_sizes.get(class_name, (0, 0))
+                class_sizes[class_name] = (size + sign * stat.size, count + sign * stat.count)
+        for class_name, (size, count) in sorted(class_sizes.items(), key=lambda x: -x[1][0]):
+            report.append('%+12.1f KiB %+10i blocks  %s' % (size / 1024, count, class_name))
+
+        report += ['', 'top %i allocation sites by growth:' % self.top]
+        for stat in after.compare_to(before, 'lineno')[:self.top]:
+            report.append(str(stat))
+        report = '\n'.join(report) + '\n'
+
+        report_file = self.get_output_file('memory-profile', 'txt')
+        with open(report_file, 'w') as fh:
+            fh.write(report)
+        logger.info('memory profile written to %s' % report_file)
+        return report
+
+    def http_cpu_profile(self, query):
+        return 200, 'text/plain', self.cpu_profile(seconds=query.get('seconds', [None])[0])
+
+    def http_memory_profile(self, query):
+        return 200, 'text/plain', self.memory_profile(seconds=query.get('seconds', [None])[0])
+
+    def register_routes(self, stats_http_server):
+        stats_http_server.register_route('/debug/profile/cpu', self.http_cpu_profile)
+        stats_http_server.register_route('/debug/profile/memory', self.http_memory_profile)
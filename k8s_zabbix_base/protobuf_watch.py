@@ -0,0 +1,266 @@
+import struct
+import logging
+
+from k8s_zabbix_base.metadata_watch import QUERY_PARAMETERS
+
+logger = logging.getLogger(__name__)
+
+# resources which can be watched as protobuf: resource -> (api path prefix, plural)
+PROTOBUF_RESOURCES = dict(
+    nodes=('/api/v1', 'nodes'),
+    pods=('/api/v1', 'pods'),
+)
+
+PROTOBUF_CONTENT_TYPE = 'application/vnd.kubernetes.protobuf'
+# the apiserver answers with json if it can not encode the type as protobuf
+PROTOBUF_WATCH_ACCEPT_HEADER = PROTOBUF_CONTENT_TYPE + ',application/json'
+# prefix of every protobuf encoded object, followed by a runtime.Unknown envelope
+MAGIC = b'k8s\x00'
+
+STRING, BOOL, VARINT, MESSAGE, REPEATED_MESSAGE, MAP_STRING, MAP_QUANTITY = range(7)
+
+
+class Message:
+    """ the decoded fields of a protobuf message, field number -> (key, kind) or (key, kind, message)
+
+        the keys are the ones of the to_dict() of the kubernetes models, all other fields are skipped,
+        missing fields are None, empty lists or empty dicts like in to_dict()
+    """
+
+    def __init__(self, fields):
+        # field number -> (key, kind, message, expected wire type)
+        self.fields = dict()
+        for number, field in fields.items():
+            key, kind, message = field if len(field) == 3 else field + (None,)
+            self.fields[number] = (key, kind, message, 0 if kind in [BOOL, VARINT] else 2)
+        self.defaults = dict((key, None) for key, kind, message, wire_type in self.fields.values()
+                             if kind not in [REPEATED_MESSAGE, MAP_STRING, MAP_QUANTITY])
+        self.repeated = [key for key, kind, message, wire_type in self.fields.values() if kind == REPEATED_MESSAGE]
+        self.maps = [key for key, kind, message, wire_type in self.fields.values()
+                     if kind in [MAP_STRING, MAP_QUANTITY]]
+
+
+# k8s.io/apimachinery/pkg/apis/meta/v1/generated.proto
+# the resource version is taken out of the object for the index of the resource manager, a change of the
+# resource version alone (i.e. a node heartbeat) is no change of the decoded fields
+OBJECT_META = Message({1: ('name', STRING), 3: ('namespace', STRING), 6: ('resource_version', STRING)})
+STATUS = Message({3: ('message', STRING), 4: ('reason', STRING), 6: ('code', VARINT)})
+
+# k8s.io/api/core/v1/generated.proto, only the fields used by k8sobjects
+RESOURCE_REQUIREMENTS = Message({1: ('limits', MAP_QUANTITY), 2: ('requests', MAP_QUANTITY)})
+CONTAINER = Message({1: ('name', STRING), 8: ('resources', MESSAGE, RESOURCE_REQUIREMENTS)})
+CONTAINER_STATE = Message({
+    1: ('waiting', MESSAGE, Message({1: ('reason', STRING), 2: ('message', STRING)})),
+    2: ('running', MESSAGE, Message({})),
+    3: ('terminated', MESSAGE, Message({1: ('exit_code', VARINT), 3: ('reason', STRING)})),
+})
+CONTAINER_STATUS = Message({1: ('name', STRING), 2: ('state', MESSAGE, CONTAINER_STATE), 4: ('ready', BOOL),
+                            5: ('restart_count', VARINT)})
+POD = Message({
+    1: ('metadata', MESSAGE, OBJECT_META),
+    2: ('spec', MESSAGE, Message({2: ('containers', REPEATED_MESSAGE, CONTAINER)})),
+    3: ('status', MESSAGE, Message({1: ('phase', STRING), 8: ('container_statuses', REPEATED_MESSAGE,
+                                                                CONTAINER_STATUS)})),
+})
+NODE = Message({
+    1: ('metadata', MESSAGE, OBJECT_META),
+    3: ('status', MESSAGE, Message({1: ('capacity', MAP_QUANTITY), 2: ('allocatable', MAP_QUANTITY),
+                                    4: ('conditions', REPEATED_MESSAGE,
+                                        Message({1: ('type', STRING), 2: ('status', STRING)}))})),
+})
+
+RESOURCE_MESSAGES = dict(pods=POD, nodes=NODE)
+
+
+def read_varint(buf, pos):
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+
+
+def skip_field(buf, pos, wire_type):
+    if wire_type == 0:
+        while buf[pos] >= 0x80:
+            pos += 1
+        return pos + 1
+    if wire_type == 2:
+        length, pos = read_varint(buf, pos)
+        return pos + length
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 5:
+        return pos + 4
+    raise ValueError('unsupported protobuf wire type %i' % wire_type)
+
+
+def iter_fields(buf, pos, end):
+    """ yields (field number, wire type, value) with value as (start, end) for length delimited fields """
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        number, wire_type = tag >> 3, tag & 7
+        if wire_type == 2:
+            length, pos = read_varint(buf, pos)
+            yield number, wire_type, (pos, pos + length)
+            pos += length
+        elif wire_type == 0:
+            value, pos = read_varint(buf, pos)
+            yield number, wire_type, value
+        else:
+            start = pos
+            pos = skip_field(buf, pos, wire_type)
+            yield number, wire_type, (start, pos)
+
+
+def decode_string(buf, pos, end):
+    return buf[pos:end].decode('utf-8')
+
+
+def decode_map_entry(buf, pos, end, kind):
+    key = value = None
+    for number, wire_type, field_value in iter_fields(buf, pos, end):
+        if number == 1:
+            key = decode_string(buf, *field_value)
+        elif number == 2:
+            if kind == MAP_QUANTITY:
+                # resource.Quantity is a message with the string representation as field 1
+                for quantity_number, quantity_wire_type, quantity_value in iter_fields(buf, *field_value):
+                    if quantity_number == 1:
+                        value = decode_string(buf, *quantity_value)
+            else:
+                value = decode_string(buf, *field_value)
+    return key, value
+
+
+def decode_message(buf, pos, end, message):
+    result = dict(message.defaults)
+    for key in message.repeated:
+        result[key] = []
+    for key in message.maps:
+        result[key] = {}
+
+    fields = message.fields
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        field = fields.get(tag >> 3)
+        if field is None or field[3] != tag & 7:
+            pos = skip_field(buf, pos, tag & 7)
+            continue
+        key, kind, sub_message, wire_type = field
+        if kind == VARINT or kind == BOOL:
+            value, pos = read_varint(buf, pos)
+            if kind == BOOL:
+                value = value != 0
+            elif value >= 1 << 63:
+                value -= 1 << 64
+            result[key] = value
+            continue
+        length, pos = read_varint(buf, pos)
+        field_end = pos + length
+        if kind == STRING:
+            result[key] = buf[pos:field_end].decode('utf-8')
+        elif kind == MESSAGE:
+            result[key] = decode_message(buf, pos, field_end, sub_message)
+        elif kind == REPEATED_MESSAGE:
+            result[key].append(decode_message(buf, pos, field_end, sub_message))
+        else:
+            map_key, map_value = decode_map_entry(buf, pos, field_end, kind)
+            result[key][map_key] = map_value
+        pos = field_end
+    return result
+
+
+def decode_object(buf, message):
+    """ a protobuf encoded object: magic, runtime.Unknown(typeMeta=1, raw=2, contentEncoding=3, contentType=4) """
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError('protobuf object without the k8s prefix')
+    for number, wire_type, value in iter_fields(buf, len(MAGIC), len(buf)):
+        if number == 2:
+            return decode_message(buf, value[0], value[1], message)
+    raise ValueError('protobuf object without raw data')
+
+
+def decode_watch_event(frame, message):
+    """ metav1.WatchEvent(type=1, object=2) -> (event type, object dict), ERROR events return the Status """
+    event_type = None
+    raw_object = None
+    for number, wire_type, value in iter_fields(frame, 0, len(frame)):
+        if number == 1:
+            event_type = decode_string(frame, *value)
+        elif number == 2:
+            # runtime.RawExtension(raw=1)
+            for raw_number, raw_wire_type, raw_value in iter_fields(frame, *value):
+                if raw_number == 1:
+                    raw_object = frame[raw_value[0]:raw_value[1]]
+    if raw_object is None:
+        raise ValueError('protobuf watch event without object')
+    return event_type, decode_object(raw_object, STATUS if event_type == 'ERROR' else message)
+
+
+def read_exactly(resp, length):
+    data = resp.read(length)
+    while len(data) < length:
+        chunk = resp.read(length - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def iter_watch_frames(resp):
+    """ the watch stream is a sequence of frames, each prefixed with its length as 4 byte big endian integer """
+    while True:
+        header = read_exactly(resp, 4)
+        if len(header) < 4:
+            return
+        length = struct.unpack('>I', header)[0]
+        frame = read_exactly(resp, length)
+        if len(frame) < length:
+            logger.warning('protobuf watch stream ended within a frame')
+            return
+        yield frame
+
+
+def is_protobuf_response(resp):
+    return resp.headers.get('Content-Type', '').startswith(PROTOBUF_CONTENT_TYPE)
+
+
+def get_protobuf_watch_function(api_client, resource, name_space=None):
+    """ watch request which prefers protobuf, the response is returned undecoded (see iter_protobuf_events) """
+    api_prefix, plural = PROTOBUF_RESOURCES[resource]
+    if name_space is None:
+        path = '%s/%s' % (api_prefix, plural)
+    else:
+        path = '%s/namespaces/%s/%s' % (api_prefix, name_space, plural)
+
+    def watch_protobuf(**kwargs):
+        query_params = [('watch', 'true')]
+        for arg, param in QUERY_PARAMETERS.items():
+            if arg != 'watch' and kwargs.get(arg) is not None:
+                query_params.append((param, kwargs[arg]))
+        return api_client.call_api(path, 'GET',
+                                   path_params={},
+                                   query_params=query_params,
+                                   header_params={'Accept': PROTOBUF_WATCH_ACCEPT_HEADER},
+                                   auth_settings=['BearerToken'],
+                                   _return_http_data_only=True,
+                                   _preload_content=False,
+                                   _request_timeout=kwargs.get('_request_timeout'))
+
+    watch_protobuf.__name__ = 'watch_%s_protobuf' % plural
+    return watch_protobuf
+
+
+def iter_protobuf_events(resp, resource):
+    """ yields (event type, object dict) of a protobuf watch response """
+    message = RESOURCE_MESSAGES[resource]
+    for frame in iter_watch_frames(resp):
+        yield decode_watch_event(frame, message)
@@ -0,0 +1,68 @@
+""" periodic comparison of the watched objects with a metadata list of the apiserver
+
+    watches can miss events (i.e. while a watcher thread was dead or the watch was restarted), a
+    deleted object is then kept forever and a missed update until the object changes again
+"""
+from k8sobjects.k8sobject import get_resource_version
+
+# objects which are not known locally, known with a older resource version or deleted in the apiserver
+MISSING, STALE, VANISHED = 'missing', 'stale', 'vanished'
+DRIFT_KINDS = [MISSING, STALE, VANISHED]
+
+
+def is_newer(resource_version, other):
+    """ resource versions are opaque strings, the apiserver uses the etcd revision which is compared as number """
+    try:
+        return int(resource_version) > int(other)
+    except (TypeError, ValueError):
+        return resource_version != other
+
+
+def list_metadata_pages(list_func, page_size=500, **kwargs):
+    """ (name_space, name) -> PartialObjectMetadata dict of all listed objects, and the resource version of the list
+
+        the first page is requested with resourceVersion=0 which is served from the watch cache of the apiserver
+        instead of etcd, older apiservers ignore the limit for the watch cache and answer with a single page
+    """
+    items = dict()
+    list_resource_version = None
+    continue_token = None
+    while True:
+        if continue_token is None:
+            page = list_func(resource_version='0', limit=page_size, **kwargs)
+        else:
+            # the following pages are a snapshot of the resource version of the first page
+            page = list_func(limit=page_size, _continue=continue_token, **kwargs)
+        metadata = page.get('metadata') or {}
+        if list_resource_version is None:
+            list_resource_version = metadata.get('resourceVersion')
+        for item in page.get('items') or []:
+            item_metadata = item.get('metadata') or {}
+            items[(item_metadata.get('namespace'), item_metadata.get('name'))] = item
+        continue_token = metadata.get('continue')
+        if not continue_token:
+            return items, list_resource_version
+
+
+def find_drift(local, listed, list_resource_version):
+    """ kind -> sorted keys of the objects which drifted
+
+        local is the index of the resource manager ((name_space, name) -> resource version), listed the
+        result of list_metadata_pages. The watch cache can be a little behind the watches, a object is only
+        stale if the list has a newer resource version and only vanished if it is not newer than the list
+    """
+    drift = dict((kind, []) for kind in DRIFT_KINDS)
+    for key, item in listed.items():
+        if key not in local:
+            drift[MISSING].append(key)
+        elif local[key] is not None and is_newer(get_resource_version(item), local[key]):
+            drift[STALE].append(key)
+    for key, resource_version in local.items():
+        if key in listed:
+            continue
+        if resource_version is None or list_resource_version is None or \
+                not is_newer(resource_version, list_resource_version):
+            drift[VANISHED].append(key)
+    for keys in drift.values():
+        keys.sort(key=lambda k: (k[0] or '', k[1] or ''))
+    return drift
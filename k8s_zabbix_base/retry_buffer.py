@@ -0,0 +1,204 @@
+import os
+import json
+import shutil
+import time
+import logging
+import threading
+from collections import deque
+
+from k8s_zabbix_base.stats import STATS
+from k8sobjects.k8sobject import ZabbixValue
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'zabbix-retry-'
+SEGMENT_SUFFIX = '.ndjson'
+
+
+def to_entries(values, now=None):
+    """ the clock is fixed at the time of the first attempt """
+    now = int(now or time.time())
+    return [(host, key, str(value), now if clock is None else clock) for host, key, value, clock in values]
+
+
+def to_metrics(entries):
+    return [ZabbixValue(*entry) for entry in entries]
+
+
+class RetryBuffer:
+    """ holds batches of zabbix metrics which could not be delivered
+
+        batches are kept in memory up to max_items, older batches are spilled to segment files in spill_dir
+        (if configured) up to max_spill_bytes, beyond that the oldest data is dropped first.
+        Segments left over by a previous run are picked up again.
+    """
+
+    def __init__(self, max_items=100000, spill_dir='', max_spill_bytes=100 * 1024 * 1024, segment_bytes=4 * 1024 * 1024):
+        self.max_items = int(max_items)
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = int(max_spill_bytes)
+        self.segment_bytes = int(segment_bytes)
+        self.lock = threading.Lock()
+        self.memory = deque()
+        self.memory_items = 0
+        # batches of the oldest segment which are currently replayed, older than everything else
+        self.replaying = deque()
+        self.replaying_items = 0
+        # segments (path, items, bytes), oldest first, the last one is open for appending
+        self.segments = deque()
+        self.segment_fh = None
+        self.segment_counter = 0
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self.load_segments()
+
+    def load_segments(self):
+        for filename in sorted(os.listdir(self.spill_dir)):
+            if not (filename.startswith(SEGMENT_PREFIX) and filename.endswith(SEGMENT_SUFFIX)):
+                continue
+            path = os.path.join(self.spill_dir, filename)
+            items = 0
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        items += len(json.loads(line))
+                    except ValueError:
+                        pass
+            self.segments.append((path, items, os.path.getsize(path)))
+            self.segment_counter = max(self.segment_counter, int(filename[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        if self.segments:
+            logger.info('found %i buffered zabbix items in %i segments in %s' % (
+                self.count_spilled(), len(self.segments), self.spill_dir))
+
+    def __len__(self):
+        with self.lock:
+            return self.replaying_items + self.memory_items + self.count_spilled()
+
+    def count_spilled(self):
+        return sum(items for path, items, size in self.segments)
+
+    def add(self, metrics):
+        entries = to_entries(metrics)
+        if not entries or self.max_items <= 0:
+            return
+        with self.lock:
+            self.memory.append(entries)
+            self.memory_items += len(entries)
+            while self.memory_items > self.max_items and len(self.memory) > 1:
+                oldest = self.memory.popleft()
+                self.memory_items -= len(oldest)
+                self.spill(oldest)
+
+    def spill(self, entries):
+        if not self.spill_dir:
+            STATS.inc('retry_buffer_dropped_total', len(entries))
+            return
+
+        if self.segment_fh is None or self.segments[-1][2] >= self.segment_bytes:
+            self.close_segment()
+            self.segment_counter += 1
+            path = os.path.join(self.spill_dir, '%s%012i%s' % (SEGMENT_PREFIX, self.segment_counter, SEGMENT_SUFFIX))
+            self.segment_fh = open(path, 'a')
+            self.segments.append((path, 0, 0))
+
+        line = json.dumps(entries, separators=(',', ':')) + '\n'
+        self.segment_fh.write(line)
+        self.segment_fh.flush()
+        path, items, size = self.segments[-1]
+        self.segments[-1] = (path, items + len(entries), size + len(line))
+        STATS.inc('retry_buffer_spilled_total', len(entries))
+        self.drop_oldest_segments()
+
+    def spill_front(self, batches):
+        """ writes batches in front of the oldest segment, they are older than everything spilled """
+        if not batches:
+            return
+        if not self.segments:
+            for entries in batches:
+                self.spill(entries)
+            return
+
+        self.close_segment()
+        lines = [json.dumps(entries, separators=(',', ':')) + '\n' for entries in batches]
+        path, items, size = self.segments[0]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as out:
+            out.writelines(lines)
+            with open(path) as fh:
+                shutil.copyfileobj(fh, out)
+        os.replace(tmp_path, path)
+        spilled_items = sum(len(entries) for entries in batches)
+        self.segments[0] = (path, items + spilled_items, size + sum(len(line) for line in lines))
+        STATS.inc('retry_buffer_spilled_total', spilled_items)
+        self.drop_oldest_segments()
+
+    def drop_oldest_segments(self):
+        """ drops the oldest segments, but never the one which is written to """
+        while len(self.segments) > 1 and sum(size for path, items, size in self.segments) > self.max_spill_bytes:
+            path, items, size = self.segments.popleft()
+            logger.warning('zabbix retry buffer full, dropping %i items of %s' % (items, path))
+            STATS.inc('retry_buffer_dropped_total', items)
+            os.unlink(path)
+
+    def close_segment(self):
+        if self.segment_fh is not None:
+            self.segment_fh.close()
+            self.segment_fh = None
+
+    def take_oldest_segment(self):
+        """ loads the oldest segment for replaying """
+        if self.segments[0][0] == self.segments[-1][0]:
+            self.close_segment()
+        path, items, size = self.segments.popleft()
+        batches = []
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    batches.append([tuple(entry) for entry in json.loads(line)])
+                except ValueError:
+                    logger.warning('skipping invalid line in %s' % path)
+        os.unlink(path)
+        self.replaying.extend(batches)
+        self.replaying_items += sum(len(entries) for entries in batches)
+
+    def pop(self, max_items=250):
+        """ returns up to max_items of the oldest entries """
+        with self.lock:
+            entries = []
+            while len(entries) < max_items:
+                if not self.replaying and self.segments:
+                    self.take_oldest_segment()
+                if self.replaying:
+                    batch = self.replaying.popleft()
+                    self.replaying_items -= len(batch)
+                elif self.memory:
+                    batch = self.memory.popleft()
+                    self.memory_items -= len(batch)
+                else:
+                    break
+                if len(entries) + len(batch) > max_items:
+                    # the rest is the oldest data now
+                    rest = batch[max_items - len(entries):]
+                    batch = batch[:max_items - len(entries)]
+                    self.replaying.appendleft(rest)
+                    self.replaying_items += len(rest)
+                entries += batch
+            return entries
+
+    def push_front(self, entries):
+        """ returns entries which failed again, they stay the oldest data """
+        with self.lock:
+            self.replaying.appendleft(entries)
+            self.replaying_items += len(entries)
+
+    def close(self):
+        """ keeps all buffered data for the next start if a spill dir is configured """
+        with self.lock:
+            if self.spill_dir:
+                while self.memory:
+                    self.spill(self.memory.popleft())
+                # the replayed batches are older than all segments
+                self.spill_front(list(self.replaying))
+                self.replaying.clear()
+                self.replaying_items = self.memory_items = 0
+            self.close_segment()
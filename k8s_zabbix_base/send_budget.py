@@ -0,0 +1,59 @@
+import time
+import zlib
+import threading
+
+
+def get_phase(uid, interval):
+    """ stable offset of a object within a cycle of interval seconds, spreads the resends of all objects """
+    return (zlib.crc32(uid.encode('utf-8')) % 100000) / 100000.0 * interval
+
+
+def in_phase_window(phase, start, end, interval):
+    """ True if phase lies in the window (start, end] of a cycle, start and end are absolute timestamps """
+    if end - start >= interval:
+        return True
+    start_phase = start % interval
+    end_phase = end % interval
+    if start_phase <= end_phase:
+        return start_phase < phase <= end_phase
+    # window wraps around the end of the cycle
+    return phase > start_phase or phase <= end_phase
+
+
+class TokenBucket:
+    """ limits the send rate to rate items per second, a rate of 0 disables the limit
+
+        bursts up to burst items are allowed, larger requests wait until enough tokens accumulated
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(self.rate, 1))
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = float(rate)
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, count, exit_flag=None):
+        """ blocks until count tokens are available, returns the seconds waited """
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        with self.lock:
+            self.refill(started)
+            # requests larger than the bucket are allowed to drive it negative, the next callers wait for it
+            self.tokens -= count
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            if exit_flag is not None:
+                exit_flag.wait(wait)
+            else:
+                time.sleep(wait)
+        return time.monotonic() - started
@@ -0,0 +1,247 @@
+import time
+import json
+import bisect
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = 'k8s_zabbix_'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def labels_key(labels):
+    if not labels:
+        return ()
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in key) + '}'
+
+
+class Histogram:
+    """ fixed bucket histogram, percentiles are estimated by the upper bound of the bucket """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for idx, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                if idx < len(self.buckets):
+                    return min(self.buckets[idx], self.max)
+                return self.max
+        return self.max
+
+    def since(self, earlier):
+        """ observations after earlier was taken from the same histogram, max is kept as the overall max """
+        result = Histogram(self.buckets)
+        result.bucket_counts = [now - then for now, then in zip(self.bucket_counts, earlier.bucket_counts)]
+        result.count = self.count - earlier.count
+        result.sum = self.sum - earlier.sum
+        result.max = self.max
+        return result
+
+    def to_dict(self):
+        return dict(
+            count=self.count,
+            sum=self.sum,
+            avg=self.sum / self.count if self.count else 0.0,
+            max=self.max,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+        )
+
+
+class DaemonStats:
+    """ process wide counters, gauges and latency histograms of the daemon itself """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, labels_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def set_gauge(self, name, value, **labels):
+        """ value may be a callable which is evaluated when the stats are read """
+        with self.lock:
+            self.gauges[(name, labels_key(labels))] = value
+
+    def timed(self, name, **labels):
+        return TimedContext(self, name, labels)
+
+    def get_counter(self, name, **labels):
+        """ sum of all counters with this name matching the given labels """
+        result = 0
+        with self.lock:
+            for (counter_name, key), value in self.counters.items():
+                if counter_name == name and set(labels.items()) <= set(key):
+                    result += value
+        return result
+
+    def get_histogram(self, name, **labels):
+        """ merged histogram of all histograms with this name matching the given labels """
+        result = Histogram()
+        with self.lock:
+            for (histogram_name, key), histogram in self.histograms.items():
+                if histogram_name == name and set(labels.items()) <= set(key):
+                    for idx, bucket_count in enumerate(histogram.bucket_counts):
+                        result.bucket_counts[idx] += bucket_count
+                    result.count += histogram.count
+                    result.sum += histogram.sum
+                    result.max = max(result.max, histogram.max)
+        return result
+
+    def get_gauge(self, name, **labels):
+        result = 0
+        for (gauge_name, key), value in self.read_gauges():
+            if gauge_name == name and set(labels.items()) <= set(key):
+                result += value
+        return result
+
+    def read_gauges(self):
+        with self.lock:
+            gauges = list(self.gauges.items())
+        result = []
+        for key, value in gauges:
+            if callable(value):
+                try:
+                    value = value()
+                except Exception as e:
+                    logger.debug('reading gauge %s failed: %s' % (key[0], e))
+                    continue
+            result.append((key, value))
+        return result
+
+    def to_dict(self):
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = [(key, histogram.to_dict()) for key, histogram in self.histograms.items()]
+
+        result = dict(uptime_seconds=time.time() - self.started, counters=[], gauges=[], histograms=[])
+        for (name, key), value in sorted(counters):
+            result['counters'].append(dict(name=name, labels=dict(key), value=value))
+        for (name, key), value in sorted(self.read_gauges(), key=lambda x: x[0]):
+            result['gauges'].append(dict(name=name, labels=dict(key), value=value))
+        for (name, key), value in sorted(histograms, key=lambda x: x[0]):
+            result['histograms'].append(dict(name=name, labels=dict(key), **value))
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(((key, histogram.buckets, list(histogram.bucket_counts), histogram.count, histogram.sum)
+                                 for key, histogram in self.histograms.items()), key=lambda x: x[0])
+        lines = ['# TYPE %suptime_seconds gauge' % STATS_PREFIX,
+                 '%suptime_seconds %f' % (STATS_PREFIX, time.time() - self.started)]
+
+        last_name = None
+        for (name, key), value in counters:
+            if name != last_name:
+                lines.append('# TYPE %s%s counter' % (STATS_PREFIX, name))
+                last_name = name
+            lines.append('%s%s%s %s' % (STATS_PREFIX, name, format_labels(key), value))
+
+        last_name = None
+        for (name, key), value in sorted(self.read_gauges(), key=lambda x: x[0]):
+            if name != last_name:
+                lines.append('# TYPE %s%s gauge' % (STATS_PREFIX, name))
+                last_name = name
+            lines.append('%s%s%s %s' % (STATS_PREFIX, name, format_labels(key), value))
+
+        last_name = None
+        for (name, key), buckets, bucket_counts, count, total in histograms:
+            if name != last_name:
+                lines.append('# TYPE %s%s histogram' % (STATS_PREFIX, name))
+                last_name = name
+            cumulative = 0
+            for bucket, bucket_count in zip(buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append('%s%s_bucket%s %i' % (STATS_PREFIX, name, format_labels(key + (('le', bucket),)), cumulative))
+            lines.append('%s%s_bucket%s %i' % (STATS_PREFIX, name, format_labels(key + (('le', '+Inf'),)), count))
+            lines.append('%s%s_sum%s %f' % (STATS_PREFIX, name, format_labels(key), total))
+            lines.append('%s%s_count%s %i' % (STATS_PREFIX, name, format_labels(key), count))
+        return '\n'.join(lines) + '\n'
+
+
+class TimedContext:
+    def __init__(self, stats, name, labels):
+        self.stats = stats
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+class TimedLock:
+    """ threading.Lock which records the time spent waiting for the lock """
+
+    def __init__(self, name, stats=None):
+        self.name = name
+        self.stats = stats
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        result = self._lock.acquire(blocking, timeout)
+        (self.stats or STATS).observe('lock_wait_seconds', time.perf_counter() - started, lock=self.name)
+        return result
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+STATS = DaemonStats()
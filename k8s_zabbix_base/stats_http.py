@@ -0,0 +1,67 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from k8s_zabbix_base.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+
+def stats_prometheus(query):
+    return 200, 'text/plain; version=0.0.4', STATS.to_prometheus()
+
+
+def stats_json(query):
+    return 200, 'application/json', STATS.to_json()
+
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    routes = dict()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = self.routes.get(url.path)
+        if route is None:
+            status, content_type, body = 404, 'text/plain', 'not found, available: %s\n' % ', '.join(sorted(self.routes))
+        else:
+            try:
+                status, content_type, body = route(parse_qs(url.query))
+            except Exception as e:
+                logger.exception('stats http request %s failed' % self.path)
+                status, content_type, body = 500, 'text/plain', '%s\n' % e
+
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s' % (self.address_string(), format % args))
+
+
+class StatsHttpServer(threading.Thread):
+    """ optional http endpoint for the self monitoring of the daemon """
+
+    def __init__(self, address, port):
+        threading.Thread.__init__(self, target=self.run, name='StatsHttpServer')
+        self.daemon = True
+        self.routes = dict()
+        self.register_route('/metrics', stats_prometheus)
+        self.register_route('/metrics.json', stats_json)
+        handler = type('BoundStatsRequestHandler', (StatsRequestHandler,), dict(routes=self.routes))
+        self.server = ThreadingHTTPServer((address, int(port)), handler)
+        self.server.daemon_threads = True
+
+    def register_route(self, path, func):
+        """ func(query) has to return a tuple of (http status, content type, body) """
+        self.routes[path] = func
+
+    def run(self):
+        logger.info('serving self monitoring stats on http://%s:%s/metrics' % self.server.server_address[:2])
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
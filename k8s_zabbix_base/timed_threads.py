@@ -7,6 +7,8 @@ class TimedThread(threading.Thread):
     stop_thread = False
     restart_thread = False
     daemon = None
+    # changes of cycle_interval_seconds are noticed at least this often
+    max_wait_seconds = 10
 
     # TODO: change default of delay_first_run_seconds to 120 seconds
     def __init__(self, resource, interval, exit_flag, daemon, daemon_method, delay_first_run=False, delay_first_run_seconds=60):
@@ -24,6 +26,12 @@ class TimedThread(threading.Thread):
         self.logger.info('OK: Thread "' + self.resource + '" is stopping"')
         self.stop_thread = True
 
+    def set_interval(self, interval):
+        self.cycle_interval_seconds = interval
+
+    def get_wait_seconds(self, last_run):
+        return max(0, min(last_run + self.cycle_interval_seconds - time.monotonic(), self.max_wait_seconds))
+
     def run(self):
         if self.delay_first_run:
             self.logger.info('%s -> %s | delaying first run by %is [interval %is]' %
@@ -32,10 +40,14 @@ class TimedThread(threading.Thread):
 
         self.logger.debug('first looprun on timed thread %s.%s [interval %is]' %
                           (self.resource, self.daemon_method, self.cycle_interval_seconds))
+        last_run = time.monotonic()
         getattr(self.daemon, self.daemon_method)(self.resource)
         self.logger.debug('first looprun complete on timed thread %s.%s [interval %is]' %
                           (self.resource, self.daemon_method, self.cycle_interval_seconds))
-        while not self.exit_flag.wait(self.cycle_interval_seconds):
+        while not self.exit_flag.wait(self.get_wait_seconds(last_run)):
+            if time.monotonic() < last_run + self.cycle_interval_seconds:
+                continue
+            last_run = time.monotonic()
             self.logger.debug('looprun on timed thread %s.%s [interval %is]' %
                               (self.resource, self.daemon_method, self.cycle_interval_seconds))
             getattr(self.daemon, self.daemon_method)(self.resource)
@@ -0,0 +1,130 @@
+import re
+import json
+import logging
+
+from k8s_zabbix_base.protobuf_watch import PROTOBUF_RESOURCES
+from k8s_zabbix_base.metadata_watch import METADATA_RESOURCES
+
+logger = logging.getLogger(__name__)
+
+# resources which are not bound to a namespace, namespace filters are ignored for them
+CLUSTER_SCOPED_RESOURCES = ['nodes', 'components']
+
+
+def to_resource_dict(value):
+    """ config values are dicts in config files and json strings if set by environment variables """
+    if not value:
+        return dict()
+    if isinstance(value, dict):
+        return value
+    return json.loads(value)
+
+
+def to_list(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [x for x in value if x]
+    return [x for x in re.split(r"[\s,]+", value.strip()) if x]
+
+
+class WatchSelectors:
+    """ server side filtering of watched resources
+
+        all settings are dicts keyed by resource name, the key "*" is used for all resources
+        without a specific setting:
+          - namespaces_include: only watch these namespaces
+          - namespaces_exclude: never watch these namespaces
+          - label_selectors: label selector passed to the apiserver
+          - field_selectors: field selector passed to the apiserver (i.e. "status.phase!=Succeeded")
+
+        metadata_only is a list of resources which are watched as PartialObjectMetadata (see metadata_watch),
+        protobuf is a list of resources which are watched as protobuf (only nodes and pods, see protobuf_watch)
+
+        if the include list of a resource has at most per_namespace_max entries,
+        a dedicated watch per namespace is started, otherwise all namespaces are watched
+        and the include list is applied on the client side
+    """
+
+    def __init__(self, namespaces_include=None, namespaces_exclude=None,
+                 label_selectors=None, field_selectors=None, per_namespace_max=0, metadata_only=None,
+                 protobuf=None):
+        self.namespaces_include = to_resource_dict(namespaces_include)
+        self.namespaces_exclude = to_resource_dict(namespaces_exclude)
+        self.label_selectors = to_resource_dict(label_selectors)
+        self.field_selectors = to_resource_dict(field_selectors)
+        self.per_namespace_max = int(per_namespace_max)
+        self.metadata_only = to_list(metadata_only)
+        for resource in self.metadata_only:
+            if resource not in METADATA_RESOURCES:
+                logger.warning('%s can not be watched metadata only, watching the complete objects' % resource)
+        self.protobuf = to_list(protobuf)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(namespaces_include=config.watch_namespaces_include,
+                   namespaces_exclude=config.watch_namespaces_exclude,
+                   label_selectors=config.watch_label_selectors,
+                   field_selectors=config.watch_field_selectors,
+                   per_namespace_max=config.watch_per_namespace_max,
+                   metadata_only=config.watch_metadata_only,
+                   protobuf=config.watch_protobuf_resources)
+
+    @staticmethod
+    def _lookup(settings, resource):
+        if resource in settings:
+            return settings[resource]
+        return settings.get('*')
+
+    def is_metadata_only(self, resource):
+        return resource in self.metadata_only and resource in METADATA_RESOURCES
+
+    def is_protobuf(self, resource):
+        return resource in self.protobuf and resource in PROTOBUF_RESOURCES and not self.is_metadata_only(resource)
+
+    def get_namespaces_include(self, resource):
+        if resource in CLUSTER_SCOPED_RESOURCES:
+            return []
+        return to_list(self._lookup(self.namespaces_include, resource))
+
+    def get_namespaces_exclude(self, resource):
+        if resource in CLUSTER_SCOPED_RESOURCES:
+            return []
+        return to_list(self._lookup(self.namespaces_exclude, resource))
+
+    def is_per_namespace(self, resource):
+        namespaces = self.get_namespaces_include(resource)
+        return 0 < len(namespaces) <= self.per_namespace_max
+
+    def get_watch_namespaces(self, resource):
+        """ namespaces which need a dedicated watch, None means all namespaces """
+        if self.is_per_namespace(resource):
+            return [x for x in self.get_namespaces_include(resource)
+                    if x not in self.get_namespaces_exclude(resource)]
+        return [None]
+
+    def get_stream_kwargs(self, resource, name_space=None):
+        kwargs = dict()
+        label_selector = self._lookup(self.label_selectors, resource)
+        if label_selector:
+            kwargs['label_selector'] = label_selector
+
+        field_selectors = []
+        if self._lookup(self.field_selectors, resource):
+            field_selectors.append(self._lookup(self.field_selectors, resource))
+        if name_space is None:
+            # the apiserver only supports AND for field selectors, excluding works server side
+            for excluded_name_space in self.get_namespaces_exclude(resource):
+                field_selectors.append('metadata.namespace!=%s' % excluded_name_space)
+        if field_selectors:
+            kwargs['field_selector'] = ','.join(field_selectors)
+        return kwargs
+
+    def accepts(self, resource, name_space):
+        """ client side filter for include lists which are too long for per namespace watches """
+        if resource in CLUSTER_SCOPED_RESOURCES or self.is_per_namespace(resource):
+            return True
+        namespaces_include = self.get_namespaces_include(resource)
+        if namespaces_include and name_space not in namespaces_include:
+            return False
+        return name_space not in self.get_namespaces_exclude(resource)
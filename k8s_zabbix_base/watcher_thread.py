@@ -9,9 +9,10 @@ class WatcherThread(threading.Thread):
     restart_thread = False
     daemon = None
 
-    def __init__(self, resource, exit_flag, daemon, daemon_method):
+    def __init__(self, resource, exit_flag, daemon, daemon_method, name_space=None):
         self.exit_flag = exit_flag
         self.resource = resource
+        self.name_space = name_space
         self.daemon = daemon
         self.daemon_method = daemon_method
         threading.Thread.__init__(self, target=self.run)
@@ -23,8 +24,11 @@ class WatcherThread(threading.Thread):
 
     def run(self):
         self.logger.info('[start thread|watch] %s -> %s' % (self.resource, self.daemon_method))
+        kwargs = dict()
+        if self.name_space is not None:
+            kwargs['name_space'] = self.name_space
         try:
-            getattr(self.daemon, self.daemon_method)(self.resource)
+            getattr(self.daemon, self.daemon_method)(self.resource, **kwargs)
         except (ProtocolError, ConnectionError) as e:
             self.logger.error(e)
             self.daemon.dirty_threads = True
@@ -1,26 +1,36 @@
+import time
 import requests
 import logging
 
 from k8sobjects.k8sobject import K8S_RESOURCES
+from k8sobjects.json_stream import encode_document
+from k8s_zabbix_base.stats import STATS
 
 logger = logging.getLogger(__name__)
 
 
 class WebApi:
-    def __init__(self, api_host, api_token, verify_ssl=True):
+    def __init__(self, api_host, api_token, verify_ssl=True, timeout=(10, 30)):
+        """ timeout is the (connect, read) timeout of every request """
         self.api_host = api_host
         self.api_token = api_token
         self.verify_ssl = verify_ssl
+        self.timeout = timeout
 
         url = self.get_url()
-        r = requests.head(url)
+        try:
+            r = requests.head(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning('%s is not reachable, keeping the configured url: %s' % (url, e))
+            return
         if r.status_code in [301, 302]:
             self.api_host = r.headers['location']
 
-    def get_headers(self):
+    def get_headers(self, content_type='application/json'):
         return {
             'Authorization': self.api_token,
             'User-Agent': 'k8s-zabbix agent',
+            'Content-Type': content_type,
         }
 
     def get_url(self, resource=None, path_append=""):
@@ -36,40 +46,68 @@ class WebApi:
             return url
         return url + api_resource + '/' + path_append
 
-    def send_data(self, resource, data, action):
+    @staticmethod
+    def get_object_path(data):
+        if 'name_space' in data and data["name_space"]:
+            return "%s/%s/%s/" % (
+                data["cluster"],
+                data["name_space"],
+                data["name"],
+            )
+        return "%s/%s/" % (
+            data["cluster"],
+            data["name"],
+        )
+
+    def send_data(self, resource, data, action, patch=None):
+        """ returns the http status code, None for unknown actions and failed requests
+
+            action 'patched' sends the json merge patch to the url of the object identified by data
+        """
         path_append = ""
+        content_type = 'application/json'
         if action.lower() == 'added':
             func = requests.post
         elif action.lower() == 'modified':
             func = requests.put
+        elif action.lower() == 'patched':
+            func = requests.patch
+            path_append = self.get_object_path(data)
+            content_type = 'application/merge-patch+json'
+            data = patch
         elif action.lower() == 'deleted':
             func = requests.delete
-            if 'name_space' in data and data["name_space"]:
-                path_append = "%s/%s/%s/" % (
-                    data["cluster"],
-                    data["name_space"],
-                    data["name"],
-                )
-            else:
-                path_append = "%s/%s/" % (
-                    data["cluster"],
-                    data["name"],
-                )
+            path_append = self.get_object_path(data)
             data = {}
         else:
-            return
+            return None
 
         url = self.get_url(resource, path_append)
 
-        # empty variables are NOT sent!
-        r = func(url,
-                 data=data,
-                 headers=self.get_headers(),
-                 verify=self.verify_ssl,
-                 allow_redirects=True)
+        # nested values (i.e. the container status of pods) are sent as json objects, not as strings
+        body = encode_document(data) if data else None
+        STATS.observe('web_api_request_bytes', len(body or b''), action=action.lower())
+        STATS.inc('web_api_sent_bytes_total', len(body or b''), action=action.lower())
+        started = time.perf_counter()
+        try:
+            r = func(url,
+                     data=body,
+                     headers=self.get_headers(content_type),
+                     verify=self.verify_ssl,
+                     allow_redirects=True,
+                     timeout=self.timeout)
+        except requests.RequestException as e:
+            # refused connections, dns errors and timeouts, the object stays dirty and is sent again
+            STATS.inc('web_api_failed_total', resource=resource)
+            logger.warning('%s %s sending %s failed (%s): %s' % (self.api_host, url, resource, action, e))
+            return None
+        STATS.observe('web_api_request_seconds', time.perf_counter() - started,
+                      action=action.lower(), status=r.status_code)
 
         if r.status_code > 399:
+            STATS.inc('web_api_failed_total', resource=resource)
             logger.warning('%s [%s] %s sended %s but failed data >>>%s<<< (%s)' % (self.api_host, r.status_code, url, resource, data, action))
             logger.warning(r.text)
         else:
             logger.debug('%s [%s] %s sucessfully sended %s >>>%s<<< (%s)' % (self.api_host, r.status_code, url, resource, data, action))
+        return r.status_code
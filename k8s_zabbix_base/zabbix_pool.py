@@ -0,0 +1,264 @@
+import re
+import time
+import socket
+import logging
+import threading
+
+from k8s_zabbix_base.stats import STATS
+from k8s_zabbix_base.zabbix_protocol import create_packet, send_packet
+
+logger = logging.getLogger(__name__)
+
+SEND_MODES = ['failover', 'round_robin']
+# critical: heartbeat and node/component health, normal: changes of objects, bulk: resends, discovery and replays
+LANES = ['critical', 'normal', 'bulk']
+# the info of a trapper response as parsed by pyzabbix.ZabbixResponse
+RESPONSE_INFO = re.compile(r'[Pp]rocessed:? (\d*);? [Ff]ailed:? (\d*);? [Tt]otal:? (\d*);? [Ss]econds spent:? (\d*\.\d*)')
+
+
+def parse_zabbix_servers(zabbix_server, default_port=10051):
+    """ "zabbix1,zabbix2:10052" or a list of "host[:port]" -> [(host, port), ...] """
+    if isinstance(zabbix_server, str):
+        zabbix_server = zabbix_server.split(',')
+    result = []
+    for server in zabbix_server:
+        server = server.strip()
+        if not server:
+            continue
+        if ':' in server:
+            host, port = server.rsplit(':', 1)
+            result.append((host, int(port)))
+        else:
+            result.append((server, int(default_port)))
+    return result
+
+
+def check_response(response):
+    """ raises if the trapper did not accept the data (i.e. invalid json) or the response can not be parsed """
+    if not isinstance(response, dict) or response.get('response') != 'success' or \
+            not RESPONSE_INFO.search(str(response.get('info'))):
+        raise IOError('zabbix did not accept the data: %r' % (response,))
+
+
+class ZabbixSendError(Exception):
+    """ a chunk was not accepted by any endpoint
+
+        result has the responses of the chunks delivered before, undelivered the values of the failed
+        chunk and of all following chunks which were not sent
+    """
+
+    def __init__(self, error, result, undelivered):
+        super().__init__(str(error))
+        self.error = error
+        self.result = result
+        self.undelivered = undelivered
+
+
+class PriorityGate:
+    """ bulk sends yield while sends of the critical or normal lane are running,
+        at most max_yield_seconds per chunk so bulk traffic is never starved completely
+    """
+
+    def __init__(self, max_yield_seconds=2.0):
+        self.max_yield_seconds = max_yield_seconds
+        self.condition = threading.Condition()
+        self.active = dict((lane, 0) for lane in LANES)
+
+    def enter(self, lane):
+        with self.condition:
+            if lane == 'bulk':
+                deadline = time.monotonic() + self.max_yield_seconds
+                while self.active['critical'] + self.active['normal'] > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            self.active[lane] += 1
+
+    def leave(self, lane):
+        with self.condition:
+            self.active[lane] -= 1
+            self.condition.notify_all()
+
+
+class ZabbixEndpoint:
+    """ a zabbix server or proxy, marked as down after a failed request for retry_seconds (doubled on
+        every further failure up to max_retry_seconds), afterwards a tcp connect probes it before it is used again
+
+        the critical lane has own connection slots, bulk sends use at most concurrency - 1 of the shared slots
+    """
+
+    def __init__(self, host, port, concurrency=4, timeout=10, retry_seconds=30, max_retry_seconds=300):
+        self.host = host
+        self.port = port
+        self.name = '%s:%i' % (host, port)
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.critical_slots = threading.BoundedSemaphore(1)
+        self.bulk_slots = threading.BoundedSemaphore(max(1, concurrency - 1))
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.down_until = 0.0
+        STATS.set_gauge('zabbix_endpoint_healthy', lambda: int(self.is_healthy()), endpoint=self.name)
+
+    def is_healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def probe(self):
+        try:
+            socket.create_connection((self.host, self.port), timeout=self.timeout).close()
+            return True
+        except (socket.error, socket.timeout):
+            return False
+
+    def is_available(self):
+        """ healthy or the retry time passed and a tcp connect succeeds """
+        if self.failures == 0:
+            return True
+        if not self.is_healthy():
+            return False
+        if self.probe():
+            return True
+        self.mark_failed(Exception('health check failed'))
+        return False
+
+    def mark_failed(self, error):
+        with self.lock:
+            self.failures += 1
+            delay = min(self.retry_seconds * 2 ** (self.failures - 1), self.max_retry_seconds)
+            self.down_until = time.monotonic() + delay
+        STATS.inc('zabbix_endpoint_errors_total', endpoint=self.name)
+        logger.warning('zabbix endpoint %s failed (%s), not used for %is' % (self.name, error, delay))
+
+    def mark_ok(self):
+        if self.failures:
+            logger.info('zabbix endpoint %s is available again' % self.name)
+            with self.lock:
+                self.failures = 0
+                self.down_until = 0.0
+
+    def get_slots(self, lane):
+        if lane == 'critical':
+            return [self.critical_slots]
+        if lane == 'bulk':
+            return [self.bulk_slots, self.slots]
+        return [self.slots]
+
+    def send_packet(self, packet, block=True, lane='normal'):
+        """ returns the accepted response or None if all slots are in use and block is False
+
+            the trapper protocol closes the connection after every response, a connection per request is required
+        """
+        acquired = []
+        for slots in self.get_slots(lane):
+            if not slots.acquire(blocking=block):
+                for acquired_slots in acquired:
+                    acquired_slots.release()
+                return None
+            acquired.append(slots)
+        started = time.perf_counter()
+        try:
+            response = send_packet(self.host, self.port, packet, timeout=self.timeout)
+        finally:
+            for acquired_slots in acquired:
+                acquired_slots.release()
+            STATS.observe('zabbix_endpoint_send_seconds', time.perf_counter() - started, endpoint=self.name, lane=lane)
+        STATS.inc('zabbix_endpoint_requests_total', endpoint=self.name)
+        check_response(response)
+        return response
+
+
+class ZabbixSenderPool:
+    """ sends to one of several zabbix servers/proxies, replaces ZabbixSender
+
+        failover: every chunk goes to the first available endpoint in configured order
+        round_robin: chunks are spread over all available endpoints, endpoints with free slots first
+
+        a chunk which fails is retried on the next endpoint, if no endpoint accepted it ZabbixSendError
+        is raised with the values which were not delivered
+
+        every send belongs to one of LANES, see PriorityGate and ZabbixEndpoint for the priorities
+    """
+
+    def __init__(self, endpoints, mode='failover', chunk_size=250):
+        if mode not in SEND_MODES:
+            raise ValueError('invalid zabbix send mode %s, use one of %s' % (mode, ', '.join(SEND_MODES)))
+        if not endpoints:
+            raise ValueError('no zabbix server configured')
+        self.endpoints = endpoints
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.next_endpoint = 0
+        self.gate = PriorityGate()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls([ZabbixEndpoint(host, port, concurrency=int(config.zabbix_endpoint_concurrency),
+                                   timeout=int(config.zabbix_timeout),
+                                   retry_seconds=int(config.zabbix_endpoint_retry_seconds))
+                    for host, port in parse_zabbix_servers(config.zabbix_server, config.zabbix_port)],
+                   mode=config.zabbix_send_mode)
+
+    def get_candidates(self):
+        if self.mode == 'failover':
+            return list(self.endpoints)
+        with self.lock:
+            start = self.next_endpoint
+            self.next_endpoint = (self.next_endpoint + 1) % len(self.endpoints)
+        return self.endpoints[start:] + self.endpoints[:start]
+
+    def send_chunk(self, values, lane='normal'):
+        # serialized once, also if the chunk is retried on other endpoints
+        packet = create_packet(values)
+        candidates = [endpoint for endpoint in self.get_candidates() if endpoint.is_available()]
+        if not candidates:
+            raise Exception('all zabbix endpoints are down: %s' % ', '.join(e.name for e in self.endpoints))
+
+        last_error = Exception('no zabbix endpoint accepted the data')
+        if self.mode == 'round_robin':
+            # prefer endpoints with a free slot, block only if all are busy
+            busy = []
+            for endpoint in candidates:
+                try:
+                    response = endpoint.send_packet(packet, block=False, lane=lane)
+                except Exception as e:
+                    endpoint.mark_failed(e)
+                    last_error = e
+                    continue
+                if response is None:
+                    busy.append(endpoint)
+                    continue
+                endpoint.mark_ok()
+                return response
+            candidates = busy
+
+        for endpoint in candidates:
+            try:
+                response = endpoint.send_packet(packet, lane=lane)
+            except Exception as e:
+                endpoint.mark_failed(e)
+                last_error = e
+                continue
+            endpoint.mark_ok()
+            return response
+        raise last_error
+
+    def send(self, values, lane='normal'):
+        """ sends a list of ZabbixValue tuples """
+        # pyzabbix is imported with the first send, not at startup
+        from pyzabbix import ZabbixResponse
+        if lane not in LANES:
+            raise ValueError('invalid send lane %s, use one of %s' % (lane, ', '.join(LANES)))
+        result = ZabbixResponse()
+        for idx in range(0, len(values), self.chunk_size):
+            self.gate.enter(lane)
+            try:
+                result.parse(self.send_chunk(values[idx:idx + self.chunk_size], lane=lane))
+            except Exception as e:
+                raise ZabbixSendError(e, result, values[idx:]) from e
+            finally:
+                self.gate.leave(lane)
+        return result
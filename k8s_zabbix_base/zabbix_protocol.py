@@ -0,0 +1,67 @@
+import json
+import struct
+import socket
+
+ZBXD_HEADER = b'ZBXD\x01'
+
+# same escaping as json.dumps(ensure_ascii=False), implemented in C
+encode_string = json.encoder.encode_basestring
+
+ENCODED_KEYS_MAX = 1 << 17
+encoded_keys = dict()
+
+
+def encode_key(key):
+    """ the json encoded item keys are cached, there is a limited number of distinct keys """
+    encoded = encoded_keys.get(key)
+    if encoded is None:
+        if len(encoded_keys) >= ENCODED_KEYS_MAX:
+            encoded_keys.clear()
+        encoded = encoded_keys[key] = encode_string(key)
+    return encoded
+
+
+def create_packet(values):
+    """ serializes (host, key, value, clock) tuples to a sender data packet in one pass
+
+        values are converted with str() like pyzabbix.ZabbixMetric does
+    """
+    parts = []
+    append = parts.append
+    host = None
+    encoded_host = None
+    for value_host, key, value, clock in values:
+        if value_host is not host:
+            host = value_host
+            encoded_host = encode_string(host)
+        if clock is None:
+            append('{"host":%s,"key":%s,"value":%s}' % (encoded_host, encode_key(key), encode_string(str(value))))
+        else:
+            append('{"host":%s,"key":%s,"value":%s,"clock":%i}' % (
+                encoded_host, encode_key(key), encode_string(str(value)), clock))
+    request = ('{"request":"sender data","data":[' + ','.join(parts) + ']}').encode('utf-8')
+    return ZBXD_HEADER + struct.pack('<Q', len(request)) + request
+
+
+def receive(connection, count):
+    buf = b''
+    while len(buf) < count:
+        chunk = connection.recv(count - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def send_packet(host, port, packet, timeout=10):
+    """ sends a packet to the zabbix trapper and returns the decoded response, the trapper closes the connection """
+    connection = socket.create_connection((host, port), timeout=timeout)
+    try:
+        connection.sendall(packet)
+        header = receive(connection, 13)
+        if len(header) != 13 or not header.startswith(ZBXD_HEADER):
+            raise IOError('invalid response header from zabbix %s:%s: %r' % (host, port, header))
+        length = struct.unpack('<Q', header[5:])[0]
+        return json.loads(receive(connection, length).decode('utf-8'))
+    finally:
+        connection.close()
@@ -1,10 +1,12 @@
-from .deployment import *
-from .daemonset import *
-from .ingress import *
-from .node import *
-from .pod import *
-from .service import *
-from .statefulset import *
-from .secret import *
-from .component import *
-from .container import *
+import importlib
+
+from .k8sobject import K8S_RESOURCES
+
+# the resource classes are imported on first use, i.e. only watching secrets needs cryptography
+RESOURCE_MODULES = dict((module.capitalize(), module) for module in K8S_RESOURCES.values())
+
+
+def __getattr__(name):
+    if name not in RESOURCE_MODULES:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module('.' + RESOURCE_MODULES[name], __name__), name)
@@ -0,0 +1,94 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_COUNTERS = ['restart_count', 'ready', 'not_ready']
+
+
+class ServiceTotals:
+    """ number of services and of services used by a ingress, subscriber of the services manager """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # uid -> is_ingress
+        self.services = dict()
+        self.ingress_services = 0
+
+    def handle(self, notification):
+        is_ingress = notification.new.resource_data['is_ingress'] if notification.new is not None else None
+        with self.lock:
+            old = self.services.pop(notification.uid, None)
+            if old:
+                self.ingress_services -= 1
+            if is_ingress is not None:
+                self.services[notification.uid] = is_ingress
+                if is_ingress:
+                    self.ingress_services += 1
+
+    def get_totals(self):
+        with self.lock:
+            return len(self.services), self.ingress_services
+
+
+class ContainerTotals:
+    """ container states of all pods per namespace, pod base name and container, subscriber of the pods manager
+
+        the container states of a pod are extracted once per change of the pod, the counters of a container
+        are updated by the difference to the previous state of the pod
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # pod uid -> [(group, container status)]
+        self.pods = dict()
+        # (name_space, pod base name, container) -> counters and the error states by pod uid
+        self.groups = dict()
+
+    @staticmethod
+    def get_contributions(pod):
+        if not pod.data.get('spec'):
+            # metadata only watch
+            return []
+        name_space = pod.name_space
+        base_name = pod.base_name
+        return [((name_space, base_name, container_name), container_data)
+                for container_name, container_data in pod.resource_data['container_status'].items()]
+
+    def apply(self, uid, contributions, sign):
+        for group_key, container_data in contributions:
+            group = self.groups.get(group_key)
+            if group is None:
+                group = self.groups[group_key] = dict(pods=0, errors=dict(), **dict.fromkeys(CONTAINER_COUNTERS, 0))
+            group['pods'] += sign
+            for counter in CONTAINER_COUNTERS:
+                group[counter] += sign * container_data[counter]
+            if sign < 0:
+                group['errors'].pop(uid, None)
+                if group['pods'] == 0:
+                    del self.groups[group_key]
+            elif container_data['status'].startswith('ERROR'):
+                group['errors'][uid] = container_data['status']
+
+    def handle(self, notification):
+        contributions = self.get_contributions(notification.new) if notification.new is not None else None
+        with self.lock:
+            old = self.pods.pop(notification.uid, None)
+            if old is not None:
+                self.apply(notification.uid, old, -1)
+            if contributions is not None:
+                self.pods[notification.uid] = contributions
+                self.apply(notification.uid, contributions, 1)
+
+    def get_totals(self):
+        """ name_space -> pod base name -> container -> restart_count, ready, not_ready and status
+
+            the status is the error state of the last changed pod with a error, "OK" without errors
+        """
+        result = dict()
+        with self.lock:
+            for (name_space, base_name, container_name), group in self.groups.items():
+                container_data = dict((counter, group[counter]) for counter in CONTAINER_COUNTERS)
+                container_data['status'] = next(reversed(list(group['errors'].values())), 'OK')
+                result.setdefault(name_space, dict()).setdefault(base_name, dict())[container_name] = container_data
+        return result
@@ -1,13 +1,13 @@
 import logging
 
-from pyzabbix import ZabbixMetric
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, ZabbixValue, get_item_key, transform_value
 
 logger = logging.getLogger(__name__)
 
 
 class Component(K8sObject):
     object_type = 'service'
+    namespaced = False
 
     @property
     def resource_data(self):
@@ -28,9 +28,9 @@ class Component(K8sObject):
         data = self.resource_data
         data_to_send = list()
 
-        data_to_send.append(ZabbixMetric(
+        data_to_send.append(ZabbixValue(
             self.zabbix_host,
-            'check_kubernetesd[get,components,' + self.name + ',available_status]',
+            get_item_key('get', 'components', self.name, 'available_status'),
             data['healthy'])
         )
 
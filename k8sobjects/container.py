@@ -1,23 +1,17 @@
-from pyzabbix import ZabbixMetric
-
 import logging
 
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, ZabbixValue, get_item_key, transform_value
 
 logger = logging.getLogger(__name__)
 
+CONTAINER_VALUES = ('ready', 'not_ready', 'restart_count', 'status')
+
+
+def get_container_item_keys(name_space, pod_base_name, container_name):
+    return [get_item_key('get', 'containers', name_space, pod_base_name, container_name, value)
+            for value in CONTAINER_VALUES]
+
 
 def get_container_zabbix_metrics(zabbix_host, name_space, pod_base_name, container_name, data):
-    return [ZabbixMetric(
-        zabbix_host, 'check_kubernetesd[get,containers,%s,%s,%s,ready]' % (name_space, pod_base_name,container_name),
-        data["ready"],
-    ), ZabbixMetric(
-        zabbix_host, 'check_kubernetesd[get,containers,%s,%s,%s,not_ready]' % (name_space, pod_base_name,container_name),
-        data["not_ready"],
-    ), ZabbixMetric(
-        zabbix_host, 'check_kubernetesd[get,containers,%s,%s,%s,restart_count]' % (name_space, pod_base_name, container_name),
-        data["restart_count"],
-    ), ZabbixMetric(
-        zabbix_host, 'check_kubernetesd[get,containers,%s,%s,%s,status]' % (name_space, pod_base_name, container_name),
-        data["status"],
-    )]
+    return [ZabbixValue(zabbix_host, key, data[value]) for key, value in
+            zip(get_container_item_keys(name_space, pod_base_name, container_name), CONTAINER_VALUES)]
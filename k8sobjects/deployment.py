@@ -1,7 +1,6 @@
 import logging
 
-from pyzabbix import ZabbixMetric
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, ZabbixValue, get_item_key, transform_value
 
 logger = logging.getLogger(__name__)
 
@@ -42,12 +41,13 @@ class Deployment(K8sObject):
             if status_type == 'conditions':
                 continue
 
-            data_to_send.append(ZabbixMetric(
-                self.zabbix_host, 'check_kubernetesd[get,deployments,%s,%s,%s]' % (self.name_space, self.name, status_type),
+            data_to_send.append(ZabbixValue(
+                self.zabbix_host, get_item_key('get', 'deployments', self.name_space, self.name, status_type),
                 transform_value(self.data['status'][status_type]))
             )
 
-        data_to_send.append(ZabbixMetric(
-            self.zabbix_host, 'check_kubernetesd[get,deployments,%s,%s,available_status]' % (self.name_space, self.name), data['status']))
+        data_to_send.append(ZabbixValue(
+            self.zabbix_host, get_item_key('get', 'deployments', self.name_space, self.name, 'available_status'),
+            data['status']))
 
         return data_to_send
@@ -0,0 +1,233 @@
+import heapq
+import calendar
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# counted dimensions of the events, values beyond the limit of a dimension are counted as OTHER
+DIMENSIONS = ['reason', 'namespace', 'kind']
+OTHER = '_other'
+
+TIMESTAMP_FORMATS = ['%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S.%fZ']
+
+
+def parse_timestamp(value):
+    """ seconds since the epoch of a kubernetes timestamp, None if missing or unknown """
+    if not value:
+        return None
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return calendar.timegm(datetime.datetime.strptime(value, timestamp_format).timetuple())
+        except ValueError:
+            pass
+    return None
+
+
+def get_occurrences(event):
+    """ the number of occurrences of a core/v1 event so far, series are used by the events.k8s.io clients """
+    series = event.get('series')
+    if series and series.get('count'):
+        return series['count']
+    return event.get('count') or 1
+
+
+def get_last_seen(event):
+    series = event.get('series') or {}
+    return parse_timestamp(series.get('lastObservedTime')) or parse_timestamp(event.get('lastTimestamp')) or \
+        parse_timestamp(event.get('eventTime')) or parse_timestamp((event.get('metadata') or {}).get('creationTimestamp'))
+
+
+class SpaceSaving:
+    """ the most frequent keys of a stream with at most capacity counters (space saving algorithm)
+
+        a key which is not counted replaces the key with the smallest count and inherits that count as its
+        error, the count of a key is overestimated by at most its error and every key with a true count
+        above total / capacity is counted
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        # key -> [count, error]
+        self.counters = dict()
+        # (count, key) of all counters, entries whose count changed are skipped when the minimum is searched
+        self.heap = []
+
+    def add(self, key, count=1):
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[key] = [0, 0]
+            else:
+                minimum, victim = self.pop_minimum()
+                del self.counters[victim]
+                counter = self.counters[key] = [minimum, minimum]
+        counter[0] += count
+        heapq.heappush(self.heap, (counter[0], key))
+        if len(self.heap) > 4 * self.capacity:
+            # drop the outdated entries, the heap stays proportional to the capacity
+            self.heap = [(value[0], k) for k, value in self.counters.items()]
+            heapq.heapify(self.heap)
+
+    def pop_minimum(self):
+        while True:
+            count, key = heapq.heappop(self.heap)
+            counter = self.counters.get(key)
+            if counter is not None and counter[0] == count:
+                return count, key
+
+    def items(self):
+        """ (key, count, error) """
+        return [(key, counter[0], counter[1]) for key, counter in self.counters.items()]
+
+
+class Bucket:
+    def __init__(self, start, top_capacity):
+        self.start = start
+        self.total = 0
+        # (dimension, value) -> count
+        self.counts = dict()
+        self.top = SpaceSaving(top_capacity)
+
+
+class EventAggregates:
+    """ counts of kubernetes events by reason, namespace and kind of the involved object in sliding windows,
+        and the objects with the most events (heavy hitters)
+
+        the events are counted in buckets of bucket_seconds, a window is the sum of its latest buckets,
+        memory is bounded by the number of buckets, max_keys values per dimension, top_capacity
+        heavy hitter counters per bucket and max_tracked known events
+
+        the apiserver updates a repeated event instead of creating a new one, only the increase of its
+        count is counted. A event which is not known (i.e. after a restart) is counted once if it occurred
+        within the longest window
+    """
+
+    def __init__(self, windows=(300, 3600), bucket_seconds=60, max_keys=50, top_capacity=100, max_tracked=20000,
+                 types=('Warning',), clock=time.time):
+        self.lock = threading.Lock()
+        self.windows = sorted(int(window) for window in windows)
+        self.bucket_seconds = int(bucket_seconds)
+        self.max_keys = int(max_keys)
+        self.top_capacity = int(top_capacity)
+        self.max_tracked = int(max_tracked)
+        self.types = list(types)
+        self.clock = clock
+        self.buckets = deque()
+        # dimension -> value -> time of the last event, the values which are counted separately
+        self.known = dict((dimension, dict()) for dimension in DIMENSIONS)
+        # event uid -> occurrences, least recently updated first
+        self.tracked = OrderedDict()
+        self.received = 0
+        self.counted = 0
+        # events counted as OTHER in a dimension
+        self.overflow = 0
+
+    def get_new_occurrences(self, event_type, event, now):
+        uid = (event.get('metadata') or {}).get('uid')
+        if event_type == 'DELETED':
+            self.tracked.pop(uid, None)
+            return 0
+        occurrences = get_occurrences(event)
+        if uid in self.tracked:
+            new = occurrences - self.tracked[uid]
+            self.tracked.move_to_end(uid)
+        else:
+            last_seen = get_last_seen(event)
+            new = 1 if last_seen is None or last_seen > now - self.windows[-1] else 0
+            if len(self.tracked) >= self.max_tracked:
+                self.tracked.popitem(last=False)
+        self.tracked[uid] = occurrences
+        return max(0, new)
+
+    def get_value(self, dimension, value, now):
+        """ the value or OTHER if the dimension has too many values within the longest window """
+        value = value or OTHER
+        known = self.known[dimension]
+        if value not in known and len(known) >= self.max_keys:
+            oldest = now - self.windows[-1]
+            for old_value in [v for v, last in known.items() if last <= oldest]:
+                del known[old_value]
+            if len(known) >= self.max_keys:
+                self.overflow += 1
+                return OTHER
+        known[value] = now
+        return value
+
+    def get_bucket(self, now):
+        start = now - now % self.bucket_seconds
+        if not self.buckets or self.buckets[-1].start < start:
+            self.buckets.append(Bucket(start, self.top_capacity))
+            oldest = start - self.windows[-1]
+            while self.buckets[0].start <= oldest:
+                self.buckets.popleft()
+        return self.buckets[-1]
+
+    def handle(self, event_type, event):
+        """ a watch event of a core/v1 Event as json dict """
+        if self.types and event.get('type') not in self.types:
+            return
+        now = self.clock()
+        involved = event.get('involvedObject') or {}
+        with self.lock:
+            self.received += 1
+            count = self.get_new_occurrences(event_type, event, now)
+            if count == 0:
+                return
+            self.counted += count
+            bucket = self.get_bucket(now)
+            bucket.total += count
+            for dimension, value in [('reason', event.get('reason')),
+                                     ('namespace', involved.get('namespace') or (event.get('metadata') or {}).get('namespace')),
+                                     ('kind', involved.get('kind'))]:
+                key = (dimension, self.get_value(dimension, value, now))
+                bucket.counts[key] = bucket.counts.get(key, 0) + count
+            bucket.top.add((involved.get('namespace') or '', involved.get('kind') or '', involved.get('name') or '',
+                            event.get('reason') or ''), count)
+
+    def get_window_buckets(self, window, now):
+        return [bucket for bucket in self.buckets if bucket.start > now - window]
+
+    def get_totals(self):
+        """ window -> dict(total=count, reason={value: count}, namespace={...}, kind={...}) """
+        now = self.clock()
+        result = dict()
+        with self.lock:
+            for window in self.windows:
+                totals = dict((dimension, dict()) for dimension in DIMENSIONS)
+                totals['total'] = 0
+                for bucket in self.get_window_buckets(window, now):
+                    totals['total'] += bucket.total
+                    for (dimension, value), count in bucket.counts.items():
+                        totals[dimension][value] = totals[dimension].get(value, 0) + count
+                result[window] = totals
+        return result
+
+    def get_top(self, window, count=10):
+        """ the objects with the most events within the window, the counts of all buckets of the window merged,
+            [dict(namespace, kind, name, reason, count, error)] with count - error <= true count <= count
+        """
+        now = self.clock()
+        merged = dict()
+        with self.lock:
+            for bucket in self.get_window_buckets(window, now):
+                for key, bucket_count, error in bucket.top.items():
+                    value = merged.setdefault(key, [0, 0])
+                    value[0] += bucket_count
+                    value[1] += error
+        top = heapq.nlargest(count, merged.items(), key=lambda item: item[1][0])
+        return [dict(namespace=key[0], kind=key[1], name=key[2], reason=key[3], count=value[0], error=value[1])
+                for key, value in top]
+
+    def get_discovery_values(self):
+        """ (dimension, value) of all values counted within the longest window """
+        now = self.clock()
+        with self.lock:
+            result = set()
+            for bucket in self.get_window_buckets(self.windows[-1], now):
+                result.update(bucket.counts)
+        return sorted(result)
+
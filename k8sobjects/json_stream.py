@@ -0,0 +1,91 @@
+import json
+import datetime
+import threading
+
+
+def json_encoder(obj):
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+
+
+# ensure_ascii=False: zabbix and the web api accept utf-8, no need to escape to \uXXXX
+ENCODER = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=json_encoder)
+
+
+class JsonStreamWriter:
+    """ writes json documents incrementally into a buffer which is reused for every document
+
+        discovery rows are encoded one by one while they are produced, no list of all rows and no
+        intermediate chunk list of the complete document is built
+    """
+
+    def __init__(self):
+        # utf-8, io.StringIO would keep the text as 4 bytes per character
+        self.buffer = bytearray()
+
+    def reset(self):
+        del self.buffer[:]
+
+    def write(self, text):
+        self.buffer += text.encode('utf-8')
+
+    def write_discovery(self, rows, unique=True):
+        """ {"data":[row,...]} from a iterable of discovery rows, returns the document and the number of rows
+
+            identical rows (i.e. the containers of all pods of a deployment) are only written once
+        """
+        self.reset()
+        write = self.write
+        encode = ENCODER.encode
+        seen = set() if unique else None
+        count = 0
+        write('{"data":[')
+        for row in rows:
+            encoded = encode(row)
+            if seen is not None:
+                if encoded in seen:
+                    continue
+                seen.add(encoded)
+            if count:
+                write(',')
+            write(encoded)
+            count += 1
+        write(']}')
+        return self.buffer.decode('utf-8'), count
+
+    def write_document(self, obj):
+        """ encodes a dict value by value into the buffer, returns utf-8 bytes
+
+            the values are encoded by the c encoder, JSONEncoder.iterencode would fall back to python code
+        """
+        self.reset()
+        write = self.write
+        encode = ENCODER.encode
+        write('{')
+        for idx, (key, value) in enumerate(obj.items()):
+            if idx:
+                write(',')
+            write(encode(str(key)))
+            write(':')
+            write(encode(value))
+        write('}')
+        return bytes(self.buffer)
+
+
+local = threading.local()
+
+
+def get_writer():
+    """ a writer per thread, the discovery and web api threads run in parallel """
+    writer = getattr(local, 'writer', None)
+    if writer is None:
+        writer = local.writer = JsonStreamWriter()
+    return writer
+
+
+def encode_discovery(rows, unique=True):
+    return get_writer().write_discovery(rows, unique=unique)[0]
+
+
+def encode_document(obj):
+    return get_writer().write_document(obj)
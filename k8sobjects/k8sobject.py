@@ -1,11 +1,15 @@
-import re
+import sys
+import time
 import datetime
 import importlib
 import hashlib
 import json
 import logging
+from collections import namedtuple
+from functools import lru_cache
 
-from pyzabbix import ZabbixMetric
+from .quantity import parse_quantity
+from .json_stream import json_encoder, encode_discovery
 
 logger = logging.getLogger(__name__)
 
@@ -23,20 +27,56 @@ K8S_RESOURCES = dict(
 )
 
 
-def json_encoder(obj):
-    if isinstance(obj, (datetime.date, datetime.datetime)):
-        return obj.isoformat()
+# a value for the zabbix trapper, clock None means the time of receipt
+ZabbixValue = namedtuple('ZabbixValue', ['host', 'key', 'value', 'clock'])
+ZabbixValue.__new__.__defaults__ = (None,)
+
+# change notification of a K8sResourceManager, old is None for added and new is None for deleted objects
+Notification = namedtuple('Notification', ['kind', 'resource', 'uid', 'old', 'new'])
+ADDED = 'added'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+@lru_cache(maxsize=1 << 16)
+def get_item_key(*parts):
+    """ check_kubernetesd[part1,part2,...], built once per identity and interned """
+    return sys.intern('check_kubernetesd[%s]' % ','.join(parts))
+
+
+@lru_cache(maxsize=None)
+def get_resource_class(resource):
+    """ imports only the module of the resource, None for unknown resources """
+    module = importlib.import_module('k8sobjects.' + K8S_RESOURCES[resource])
+    return getattr(module, K8S_RESOURCES[resource].capitalize(), None)
 
 
 def transform_value(value):
+    """ None -> 0, kubernetes quantities -> numbers, everything else unchanged """
     if value is None:
         return 0
-    m = re.match(r"^(\d+)Ki$", str(value))
-    if m:
-        return int(m.group(1)) * 1024
+    if value.__class__ is str:
+        quantity = parse_quantity(value)
+        if quantity is not None:
+            return quantity
     return value
 
 
+def project_object(obj):
+    """ drops the parts of a object dict which are never used, the managed fields are often the biggest part """
+    metadata = obj.get('metadata')
+    if metadata:
+        metadata.pop('managed_fields', None)
+        metadata.pop('managedFields', None)
+    return obj
+
+
+def get_resource_version(obj):
+    """ resource version of a object dict, the metadata of to_dict() and of raw json use different keys """
+    metadata = obj.get('metadata') or {}
+    return metadata.get('resource_version') or metadata.get('resourceVersion')
+
+
 def slugit(name_space, name, maxlen):
     if name_space:
         slug = name_space + '/' + name
@@ -52,46 +92,96 @@ def slugit(name_space, name, maxlen):
 
 
 class K8sResourceManager:
+    """ the current state of all objects of a resource
+
+        every object is decoded and compared with its previous state once, added, updated and deleted
+        objects are notified to the subscribers (zabbix, web api, aggregates), unchanged objects are not
+    """
+
     def __init__(self, resource, zabbix_host=None):
         self.resource = resource
         self.zabbix_host = zabbix_host
 
         self.objects = dict()
         self.containers = dict()  # containers only used for pods
-
-        mod = importlib.import_module('k8sobjects')
-        class_label = K8S_RESOURCES[resource]
-        self.resource_class = getattr(mod, class_label.capitalize(), None)
-
-    def add_obj(self, obj):
+        # (name_space, name) -> resource version of the current state, compared by the reconciliation
+        self.resource_versions = dict()
+
+        # callable(resource, name_space, name) returning the full object for metadata only watches
+        self.full_object_loader = None
+        # (name, callable(notification))
+        self.subscribers = []
+        # callable(subscriber name, seconds) called after every notification of a subscriber
+        self.subscriber_timer = None
+
+        self.resource_class = get_resource_class(resource)
+
+    def count_objects(self):
+        return len(self.objects)
+
+    def subscribe(self, name, func):
+        self.subscribers.append((name, func))
+
+    def notify(self, notifications):
+        for notification in notifications:
+            for name, func in self.subscribers:
+                started = time.perf_counter()
+                try:
+                    func(notification)
+                except Exception as e:
+                    logger.exception('subscriber %s failed on %s %s: %s' % (name, notification.kind,
+                                                                           notification.uid, e))
+                if self.subscriber_timer:
+                    self.subscriber_timer(name, time.perf_counter() - started)
+
+    def deliver(self, notification, notifications):
+        """ notifications collected while a lock is held are delivered by the caller with notify() """
+        if notifications is None:
+            self.notify([notification])
+        else:
+            notifications.append(notification)
+
+    def add_obj(self, obj, checksum=None, zabbix_metrics=None, notifications=None, resource_version=None):
+        """ checksum and zabbix_metrics are passed if they were calculated by a ingestion worker,
+            resource_version if it is not part of the object (protobuf)
+        """
         if not self.resource_class:
             logger.error('No Resource Class found for "%s"' % self.resource)
             return
 
-        new_obj = self.resource_class(obj, self.resource, manager=self)
-        if new_obj.uid not in self.objects:
+        new_obj = self.resource_class(obj, self.resource, manager=self, checksum=checksum)
+        new_obj.precomputed_zabbix_metrics = zabbix_metrics
+        # also for unchanged objects, the reconciliation only fetches objects with a newer resource version
+        self.resource_versions[(new_obj.name_space, new_obj.name)] = resource_version or get_resource_version(obj)
+        old_obj = self.objects.get(new_obj.uid)
+        if old_obj is None:
             # new object
             self.objects[new_obj.uid] = new_obj
-        elif self.objects[new_obj.uid].data_checksum != new_obj.data_checksum:
+            self.deliver(Notification(ADDED, self.resource, new_obj.uid, None, new_obj), notifications)
+        elif old_obj.data_checksum != new_obj.data_checksum:
             # existing object with modified data
-            new_obj.last_sent_zabbix_discovery = self.objects[new_obj.uid].last_sent_zabbix_discovery
-            new_obj.last_sent_zabbix = self.objects[new_obj.uid].last_sent_zabbix
-            new_obj.last_sent_web = self.objects[new_obj.uid].last_sent_web
+            new_obj.last_sent_zabbix_discovery = old_obj.last_sent_zabbix_discovery
+            new_obj.last_sent_zabbix = old_obj.last_sent_zabbix
+            new_obj.last_sent_web = old_obj.last_sent_web
+            new_obj.web_acked_data = old_obj.web_acked_data
             new_obj.is_dirty_web = True
             new_obj.is_dirty_zabbix = True
             self.objects[new_obj.uid] = new_obj
+            self.deliver(Notification(UPDATED, self.resource, new_obj.uid, old_obj, new_obj), notifications)
 
         # return created or updated object
         return self.objects[new_obj.uid]
 
-    def del_obj(self, obj):
+    def del_obj(self, obj, checksum=None, notifications=None):
         if not self.resource_class:
             logger.error('No Resource Class found for "%s"' % self.resource)
             return
 
-        resourced_obj = self.resource_class(obj, self.resource, manager=self)
-        if resourced_obj.uid in self.objects:
-            del self.objects[resourced_obj.uid]
+        resourced_obj = self.resource_class(obj, self.resource, manager=self, checksum=checksum)
+        old_obj = self.objects.pop(resourced_obj.uid, None)
+        self.resource_versions.pop((resourced_obj.name_space, resourced_obj.name), None)
+        if old_obj is not None:
+            self.deliver(Notification(DELETED, self.resource, old_obj.uid, old_obj, None), notifications)
         return resourced_obj
 
 
@@ -99,15 +189,25 @@ INITIAL_DATE = datetime.datetime(2000, 1, 1, 0, 0)
 
 
 class K8sObject:
-    def __init__(self, obj_data, resource, manager=None):
+    # nodes and components have no namespace
+    namespaced = True
+    # the resource class reads full_data, see load_full_data()
+    needs_full_data = False
+
+    def __init__(self, obj_data, resource, manager=None, checksum=None):
         self.is_dirty_zabbix = True
         self.is_dirty_web = True
         self.last_sent_zabbix_discovery = INITIAL_DATE
         self.last_sent_zabbix = INITIAL_DATE
         self.last_sent_web = INITIAL_DATE
+        # the web api state acknowledged by the web api, changes are sent as merge patch against it
+        self.web_acked_data = None
         self.resource = resource
         self.data = obj_data
-        self.data_checksum = self.calculate_checksum()
+        self.is_metadata_only = obj_data.get('kind') == 'PartialObjectMetadata'
+        self.data_checksum = checksum if checksum is not None else self.calculate_checksum()
+        # metrics calculated by a ingestion worker, only used for the first send of this state
+        self.precomputed_zabbix_metrics = None
         self.manager = manager
         self.zabbix_host = self.manager.zabbix_host
 
@@ -122,6 +222,27 @@ class K8sObject:
             name_space=self.data['metadata']['namespace'],
         )
 
+    @property
+    def full_data(self):
+        """ complete object data, fetched lazily if the object was watched metadata only """
+        if self.is_metadata_only and self.manager.full_object_loader:
+            self.data = self.manager.full_object_loader(self.resource, self.name_space, self.name)
+            self.is_metadata_only = False
+        return self.data
+
+    @property
+    def is_incomplete(self):
+        """ metadata only object whose resource class needs the full object """
+        return self.needs_full_data and self.is_metadata_only
+
+    def load_full_data(self):
+        """ fetches the full object if the resource class needs it, called outside of the lock of the daemon,
+            the data of a incomplete object must not be read while the lock is held
+        """
+        if self.is_incomplete:
+            return self.full_data
+        return self.data
+
     @property
     def uid(self):
         if not hasattr(self, 'object_type'):
@@ -143,9 +264,7 @@ class K8sObject:
 
     @property
     def name_space(self):
-        from .node import Node
-        from .component import Component
-        if isinstance(self, Node) or isinstance(self, Component):
+        if not self.namespaced:
             return None
 
         name_space = self.data.get('metadata', {}).get('namespace')
@@ -178,17 +297,22 @@ class K8sObject:
             "{#SLUG}": slugit(self.name_space, self.name, 40),
         }]
 
+    @property
+    def discovery_key(self):
+        return get_item_key('discover', self.resource)
+
     def get_discovery_for_zabbix(self, discovery_data=None):
         if discovery_data is None:
             discovery_data = self.get_zabbix_discovery_data()
 
-        return ZabbixMetric(
-            self.zabbix_host,
-            'check_kubernetesd[discover,%s]' % self.resource,
-            json.dumps({
-                'data': discovery_data,
-            })
-        )
+        return ZabbixValue(self.zabbix_host, self.discovery_key, encode_discovery(discovery_data))
 
     def get_zabbix_metrics(self):
         return []
+
+    def take_zabbix_metrics(self):
+        """ the precomputed metrics once, afterwards they are calculated again (i.e. the valid days of certificates) """
+        metrics, self.precomputed_zabbix_metrics = self.precomputed_zabbix_metrics, None
+        if metrics is None:
+            return self.get_zabbix_metrics()
+        return metrics
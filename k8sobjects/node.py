@@ -1,13 +1,14 @@
 import logging
 
-from pyzabbix import ZabbixMetric
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, ZabbixValue, get_item_key, transform_value
+from .quantity import parse_quantities
 
 logger = logging.getLogger(__name__)
 
 
 class Node(K8sObject):
     object_type = 'node'
+    namespaced = False
 
     MONITOR_VALUES = ['allocatable.cpu',
                       'allocatable.ephemeral-storage',
@@ -17,6 +18,26 @@ class Node(K8sObject):
                       'capacity.ephemeral-storage',
                       'capacity.memory',
                       'capacity.pods']
+    MONITOR_PATHS = [monitor_value.split('.') for monitor_value in MONITOR_VALUES]
+
+    @classmethod
+    def get_monitor_values(cls, nodes):
+        """ batched conversion of the MONITOR_VALUES of all nodes, returns a {monitor_value: number} dict per node """
+        raw_values = []
+        for node in nodes:
+            raw_values += node.get_raw_monitor_values()
+        values = parse_quantities(raw_values)
+        count = len(cls.MONITOR_VALUES)
+        return [dict(zip(cls.MONITOR_VALUES, values[idx:idx + count])) for idx in range(0, len(values), count)]
+
+    def get_raw_monitor_values(self):
+        result = []
+        for path in self.MONITOR_PATHS:
+            current_indirection = self.data['status']
+            for key in path:
+                current_indirection = current_indirection[key]
+            result.append(0 if current_indirection is None else current_indirection)
+        return result
 
     @property
     def resource_data(self):
@@ -33,12 +54,7 @@ class Node(K8sObject):
 
         data['failed_conds'] = failed_conds
 
-        for monitor_value in self.MONITOR_VALUES:
-            current_indirection = self.data['status']
-            for key in monitor_value.split("."):
-                current_indirection = current_indirection[key]
-
-            data[monitor_value] = transform_value(current_indirection)
+        data.update(zip(self.MONITOR_VALUES, parse_quantities(self.get_raw_monitor_values())))
 
         return data
 
@@ -46,13 +62,13 @@ class Node(K8sObject):
         data_to_send = list()
         data = self.resource_data
 
-        data_to_send.append(ZabbixMetric(self.zabbix_host, 'check_kubernetesd[get,nodes,' + self.name + ',available_status]',
-                                         'not available' if data['condition_ready'] is not True else 'OK'))
-        data_to_send.append(ZabbixMetric(self.zabbix_host, 'check_kubernetesd[get,nodes,' + self.name + ',condition_status_failed]',
-                                         data['failed_conds'] if len(data['failed_conds']) > 0 else 'OK'))
+        data_to_send.append(ZabbixValue(self.zabbix_host, get_item_key('get', 'nodes', self.name, 'available_status'),
+                                        'not available' if data['condition_ready'] is not True else 'OK'))
+        data_to_send.append(ZabbixValue(self.zabbix_host, get_item_key('get', 'nodes', self.name, 'condition_status_failed'),
+                                        data['failed_conds'] if len(data['failed_conds']) > 0 else 'OK'))
         for monitor_value in self.MONITOR_VALUES:
-            data_to_send.append(ZabbixMetric(
-                self.zabbix_host, 'check_kubernetesd[get,nodes,%s,%s]' % (self.name, monitor_value),
+            data_to_send.append(ZabbixValue(
+                self.zabbix_host, get_item_key('get', 'nodes', self.name, monitor_value),
                 transform_value(data[monitor_value]))
             )
         return data_to_send
@@ -1,8 +1,6 @@
-import json
 import logging
 
-from pyzabbix import ZabbixMetric
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, get_item_key
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +26,7 @@ class Pod(K8sObject):
     @property
     def resource_data(self):
         data = super().resource_data
-        data['containers'] = json.dumps(self.containers)
+        data['containers'] = self.containers
         container_status = dict()
         data['ready'] = True
         pod_data = {
@@ -71,8 +69,8 @@ class Pod(K8sObject):
                     pod_data['status'] = container_status[container_name]['status']
                     data['ready'] = False
 
-        data['container_status'] = json.dumps(container_status)
-        data['pod_data'] = json.dumps(pod_data)
+        data['container_status'] = container_status
+        data['pod_data'] = pod_data
         return data
 
     def get_zabbix_discovery_data(self):
@@ -85,17 +83,9 @@ class Pod(K8sObject):
             }]
         return data
 
-    def get_discovery_for_zabbix(self, discovery_data=None):
-        if discovery_data is None:
-            discovery_data = self.get_zabbix_discovery_data()
-
-        return ZabbixMetric(
-            self.zabbix_host,
-            'check_kubernetesd[discover,containers]',
-            json.dumps({
-                'data': discovery_data,
-            })
-        )
+    @property
+    def discovery_key(self):
+        return get_item_key('discover', 'containers')
 
     # -> not used, aggregate over containers
     # def get_zabbix_metrics(self):
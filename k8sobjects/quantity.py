@@ -0,0 +1,57 @@
+import re
+from functools import lru_cache
+
+# https://github.com/kubernetes/apimachinery/blob/master/pkg/api/resource/quantity.go
+QUANTITY_PATTERN = re.compile(r'^([+-]?(?:\d+\.?\d*|\.\d+))(?:(Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE])|[eE]([+-]?\d+))?$')
+
+BINARY_SUFFIXES = dict(Ki=1024, Mi=1024 ** 2, Gi=1024 ** 3, Ti=1024 ** 4, Pi=1024 ** 5, Ei=1024 ** 6)
+DECIMAL_EXPONENTS = dict(n=-9, u=-6, m=-3, k=3, M=6, G=9, T=12, P=15, E=18)
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(value):
+    """ parses a kubernetes quantity string ("128974848", "129e6", "123Mi", "500m", "1.5Gi")
+
+        returns a int if the quantity is integral, otherwise a float, None if value is no quantity
+    """
+    m = QUANTITY_PATTERN.match(value)
+    if m is None:
+        return None
+    number, suffix, exponent = m.groups()
+
+    if suffix in BINARY_SUFFIXES:
+        multiplier, exponent = BINARY_SUFFIXES[suffix], 0
+    else:
+        multiplier, exponent = 1, DECIMAL_EXPONENTS[suffix] if suffix else int(exponent or 0)
+
+    if '.' not in number and exponent >= 0:
+        return int(number) * multiplier * 10 ** exponent
+
+    if exponent < 0:
+        # dividing keeps 100u at 0.0001 instead of 9.999999999999999e-05
+        result = float(number) * multiplier / 10 ** -exponent
+    else:
+        result = float(number) * multiplier * 10 ** exponent
+    if result.is_integer():
+        return int(result)
+    return result
+
+
+def parse_quantities(values):
+    """ batched parsing, distinct values are only parsed once (i.e. the capacities of identical nodes)
+
+        values which are no quantity are returned unchanged
+    """
+    parsed = dict()
+    result = []
+    for value in values:
+        if value.__class__ is not str:
+            result.append(value)
+            continue
+        quantity = parsed.get(value)
+        if quantity is None:
+            quantity = parse_quantity(value)
+            parsed[value] = value if quantity is None else quantity
+            quantity = parsed[value]
+        result.append(quantity)
+    return result
@@ -0,0 +1,127 @@
+import logging
+import threading
+
+from .k8sobject import transform_value
+
+logger = logging.getLogger(__name__)
+
+NODE_METRICS = ['nodes', 'nodes_ready', 'capacity_cpu', 'capacity_memory',
+                'allocatable_cpu', 'allocatable_memory', 'allocatable_pods']
+POD_METRICS = ['pods', 'requests_cpu', 'requests_memory', 'limits_cpu', 'limits_memory']
+# ratio -> (numerator, denominator)
+RATIO_METRICS = dict(
+    requests_cpu_ratio=('requests_cpu', 'allocatable_cpu'),
+    requests_memory_ratio=('requests_memory', 'allocatable_memory'),
+    limits_cpu_ratio=('limits_cpu', 'allocatable_cpu'),
+    limits_memory_ratio=('limits_memory', 'allocatable_memory'),
+    pods_ratio=('pods', 'allocatable_pods'),
+)
+CLUSTER_METRICS = NODE_METRICS + POD_METRICS + sorted(RATIO_METRICS)
+NAMESPACE_METRICS = POD_METRICS
+
+# pods in these phases do not occupy resources anymore
+FINISHED_POD_PHASES = ['Succeeded', 'Failed']
+
+
+def to_number(value):
+    value = transform_value(value)
+    return value if isinstance(value, (int, float)) else 0
+
+
+def get_node_contribution(node):
+    status = node.data.get('status')
+    if not status:
+        return None
+    capacity = status.get('capacity') or {}
+    allocatable = status.get('allocatable') or {}
+    ready = any(cond['type'].lower() == 'ready' and cond['status'] == 'True' for cond in status.get('conditions') or [])
+    return dict(
+        nodes=1,
+        nodes_ready=1 if ready else 0,
+        capacity_cpu=to_number(capacity.get('cpu')),
+        capacity_memory=to_number(capacity.get('memory')),
+        allocatable_cpu=to_number(allocatable.get('cpu')),
+        allocatable_memory=to_number(allocatable.get('memory')),
+        allocatable_pods=to_number(allocatable.get('pods')),
+    )
+
+
+def get_pod_contribution(pod):
+    spec = pod.data.get('spec')
+    if not spec:
+        # metadata only watch
+        return None
+    if (pod.data.get('status') or {}).get('phase') in FINISHED_POD_PHASES:
+        return None
+    result = dict(pods=1, requests_cpu=0, requests_memory=0, limits_cpu=0, limits_memory=0)
+    for container in spec.get('containers') or []:
+        resources = container.get('resources') or {}
+        for kind in ['requests', 'limits']:
+            values = resources.get(kind) or {}
+            result[kind + '_cpu'] += to_number(values.get('cpu'))
+            result[kind + '_memory'] += to_number(values.get('memory'))
+    return result
+
+
+CONTRIBUTIONS = dict(nodes=get_node_contribution, pods=get_pod_contribution)
+
+
+class Rollups:
+    """ cluster and per namespace totals of nodes and pods
+
+        the contribution of every object is remembered, a add, modify or delete only subtracts the old
+        and adds the new contribution, the totals never require a rescan of all objects
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (resource, uid) -> (name_space, contribution)
+        self.contributions = dict()
+        self.cluster = dict((metric, 0) for metric in NODE_METRICS + POD_METRICS)
+        self.namespaces = dict()
+
+    def apply(self, name_space, contribution, sign):
+        for metric, value in contribution.items():
+            self.cluster[metric] += sign * value
+        if name_space is None:
+            return
+        totals = self.namespaces.setdefault(name_space, dict((metric, 0) for metric in NAMESPACE_METRICS))
+        for metric, value in contribution.items():
+            totals[metric] += sign * value
+        if totals['pods'] == 0:
+            del self.namespaces[name_space]
+
+    def handle(self, notification):
+        """ subscriber of the node and pod managers """
+        self.update(notification.resource, notification.uid, notification.new)
+
+    def update(self, resource, uid, obj):
+        """ obj is None if the object was deleted """
+        contribution = None
+        name_space = None
+        if obj is not None:
+            contribution = CONTRIBUTIONS[resource](obj)
+            if resource == 'pods':
+                name_space = obj.name_space
+
+        with self.lock:
+            old = self.contributions.pop((resource, uid), None)
+            if old is not None:
+                self.apply(old[0], old[1], -1)
+            if contribution is not None:
+                self.contributions[(resource, uid)] = (name_space, contribution)
+                self.apply(name_space, contribution, 1)
+
+    def get_cluster_totals(self):
+        with self.lock:
+            result = dict(self.cluster)
+        for ratio, (numerator, denominator) in RATIO_METRICS.items():
+            result[ratio] = result[numerator] / float(result[denominator]) if result[denominator] else 0.0
+        # cpu values are fractions of cores, avoid float noise of the incremental sums
+        return dict((metric, round(value, 3) if isinstance(value, float) else value) for metric, value in result.items())
+
+    def get_namespace_totals(self):
+        with self.lock:
+            return dict((name_space, dict((metric, round(value, 3) if isinstance(value, float) else value)
+                                          for metric, value in totals.items()))
+                        for name_space, totals in self.namespaces.items())
@@ -5,27 +5,28 @@ import datetime
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 
-from pyzabbix import ZabbixMetric
-from .k8sobject import K8sObject, transform_value
+from .k8sobject import K8sObject, ZabbixValue, get_item_key, transform_value
 
 logger = logging.getLogger(__name__)
 
 
 class Secret(K8sObject):
     object_type = 'secret'
+    needs_full_data = True
 
     @property
     def resource_data(self):
         data = super().resource_data
 
-        if 'data' not in self.data or not self.data['data']:
-            logger.debug('No data for tls_cert "' + self.name_space + '/' + self.name + '"', self.data)
+        full_data = self.full_data
+        if 'data' not in full_data or not full_data['data']:
+            logger.debug('No data for tls_cert "' + self.name_space + '/' + self.name + '"', full_data)
             return data
 
-        if "tls.crt" not in self.data["data"]:
+        if "tls.crt" not in full_data["data"]:
             return data
 
-        base64_decode = base64.b64decode(self.data["data"]["tls.crt"])
+        base64_decode = base64.b64decode(full_data["data"]["tls.crt"])
         cert = x509.load_pem_x509_certificate(base64_decode, default_backend())
         data['valid_days'] = (cert.not_valid_after - datetime.datetime.now()).days
         return data
@@ -36,13 +37,13 @@ class Secret(K8sObject):
         if 'valid_days' not in data:
             return data_to_send
 
-        data_to_send.append(ZabbixMetric(
-            self.zabbix_host, 'check_kubernetesd[get,secret,' + self.name_space + ',' + self.name + ',valid_days]',
+        data_to_send.append(ZabbixValue(
+            self.zabbix_host, get_item_key('get', 'secret', self.name_space, self.name, 'valid_days'),
             data['valid_days'])
         )
         return data_to_send
 
     def get_zabbix_discovery_data(self):
-        if self.data["data"] is not None and "tls.crt" in dict(self.data["data"]):
+        if self.full_data["data"] is not None and "tls.crt" in dict(self.full_data["data"]):
             return super().get_zabbix_discovery_data()
         return ''
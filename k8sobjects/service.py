@@ -1,6 +1,5 @@
 import logging
 
-from pyzabbix import ZabbixMetric
 from .k8sobject import K8sObject, transform_value
 
 logger = logging.getLogger(__name__)
@@ -8,12 +7,13 @@ logger = logging.getLogger(__name__)
 
 class Service(K8sObject):
     object_type = 'service'
+    needs_full_data = True
 
     @property
     def resource_data(self):
         data = super().resource_data
         data['is_ingress'] = False
-        if self.data["status"]["load_balancer"]["ingress"] is not None:
+        if self.full_data["status"]["load_balancer"]["ingress"] is not None:
             data['is_ingress'] = True
         return data
 